@@ -0,0 +1,75 @@
+# ================================================
+# FILE: benchmarks/bench_allocator.py
+# PURPOSE: Times the tier budget allocator on large synthetic discovery pools
+# USAGE: python benchmarks/bench_allocator.py [--sizes 10000 50000 100000] [--repeat 5]
+# ================================================
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from plan import allocate_budget_cascading_tiers
+from common.utils import convert_eur_to_local
+
+def reference_allocator(gold, silver, bronze, budget, cac=50, market='France'):
+    """The previous per-influencer loop, used as the baseline and for the parity check."""
+    recs, allocated = [], 0.0
+    tier_breakdown = {'Gold': [], 'Silver': [], 'Bronze': []}
+    for name, influencers in [('Gold', gold), ('Silver', silver), ('Bronze', bronze)]:
+        if allocated >= budget * 0.98: break
+        for inf in influencers:
+            count = inf.get('campaigns', 1) or 1
+            spend = float(inf.get('total_spend_eur', 0.0) or 0.0)
+            inf['averageSpendPerCampaign'] = spend / count if count > 0 else 0.0
+        for inf in sorted(influencers, key=lambda x: x.get('averageSpendPerCampaign', 0) or 0):
+            spend_eur = inf.get('averageSpendPerCampaign', 0) or 0
+            if spend_eur <= 0: continue
+            spend_local = convert_eur_to_local(spend_eur, market)
+            if allocated + spend_local <= budget:
+                rec = {'influencer_name': inf.get('influencer_name', 'Unknown'), 'allocated_budget': spend_local, 'predicted_conversions': int(spend_local / cac) if cac > 0 else 0, 'effective_cac': float(cac), 'tier': name, 'market': market}
+                recs.append(rec)
+                tier_breakdown[name].append(rec)
+                allocated += spend_local
+                if allocated >= budget * 0.98: break
+    return recs, allocated, tier_breakdown
+
+def make_tiers(size, seed=42):
+    rng = random.Random(seed)
+    per_tier = size // 3
+    return [[{"influencer_name": f"{tier}-{i}", "total_spend_eur": rng.uniform(50, 20000), "campaigns": rng.randint(1, 12), "total_conversions": rng.randint(0, 800)} for i in range(per_tier)] for tier in ("gold", "silver", "bronze")]
+
+def best_of(fn, repeat, setup=lambda: ()):
+    """Best wall time of fn(*setup()) over repeat runs; setup is not timed."""
+    timings = []
+    for _ in range(repeat):
+        fn_args = setup()
+        start = time.perf_counter()
+        result = fn(*fn_args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the vectorized allocator with the previous loop.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--market", default="Sweden")
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} {'budget':>12} {'loop ms':>9} {'vector ms':>10} {'speedup':>8} {'picks':>7} parity")
+    for size in args.sizes:
+        tiers = make_tiers(size)
+        for budget in (50_000, 5_000_000, 500_000_000):
+            loop_s, expected = best_of(lambda *t: reference_allocator(*t, budget, 50, args.market), args.repeat, setup=lambda: copy.deepcopy(tiers))
+            vector_s, actual = best_of(lambda: allocate_budget_cascading_tiers(*tiers, budget, 50, args.market), args.repeat)
+            parity = actual == expected
+            print(f"{size:>10} {budget:>12} {loop_s * 1000:>9.1f} {vector_s * 1000:>10.1f} {loop_s / vector_s:>7.1f}x {len(actual[0]):>7} {'ok' if parity else 'MISMATCH'}")
+            if not parity:
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# ================================================
+# FILE: benchmarks/bench_bot.py
+# PURPOSE: End-to-end latency, throughput and memory benchmark of the bot's listeners, fully offline
+# USAGE: python benchmarks/bench_bot.py [--requests 40] [--concurrency 8] [--scenarios mention thread plan] [--cold] [--stages]
+# ================================================
+import argparse
+import contextvars
+import importlib
+import itertools
+import math
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fakes import FakeLyraServer, FakeGeminiModel, RecordingClient, RecordingSay
+
+CHANNEL = "CBENCH"
+# Mention queries and the routing decision the fake router returns for each.
+MENTION_ROUTES = {
+    "monthly review UK June 2025": {"tool_name": "monthly-review", "parameters": {"market": "UK", "month_abbr": "Jun", "month_full": "June", "year": 2025}},
+    "how did Sweden do in week 23": {"tool_name": "weekly-review-by-number", "parameters": {"market": "Sweden", "week_number": 23, "year": 2025}},
+    "top influencers in France": {"tool_name": "influencer-trend", "parameters": {"market": "France"}},
+    "plan for UK July 2025": {"tool_name": "plan", "parameters": {"market": "UK", "month_abbr": "Jul", "month_full": "July", "year": 2025}},
+}
+THREAD_QUESTIONS = ["Which influencer had the best CAC?", "What was the total spend?", "Who drove the most conversions?"]
+# Slash command scenarios: (listener name, command text).
+SLASH_COMMANDS = {
+    "monthly-review": ("route_monthly_review", "UK-June-2025"),
+    "weekly-review": ("route_weekly_review", "UK week 23"),
+    "analyse-influencer": ("route_analyse_influencer", "Creator 00001"),
+    "influencer-trend": ("route_influencer_trend", "UK"),
+    "plan": ("route_plan", "UK-June-2025"),
+}
+SCENARIOS = ("mention", "thread", *SLASH_COMMANDS)
+
+_ts = itertools.count(1)
+
+def next_ts() -> str:
+    return f"1700000000.{next(_ts):06d}"
+
+def listener(main, name):
+    """The undecorated listener: requests run on the benchmark's own pool instead of the job runner."""
+    fn = getattr(main, name)
+    return getattr(fn, "__wrapped__", fn)
+
+def make_requests(main, scenario, client, count, concurrency):
+    """Returns `count` zero-argument callables, each issuing one request of the scenario."""
+    say = RecordingSay(client, CHANNEL)
+    if scenario == "mention":
+        handle = listener(main, "handle_app_mention")
+        queries = itertools.cycle(MENTION_ROUTES)
+        return [lambda q=next(queries): handle(event={"type": "app_mention", "channel": CHANNEL, "ts": next_ts(), "text": f"<@UNOVA> {q}"}, say=say, client=client) for _ in range(count)]
+    if scenario == "thread":
+        # One seeded thread per worker. Replies skip the job runner, which would run a thread's
+        # messages one at a time, and go straight to the handler.
+        mention, reply = listener(main, "handle_app_mention"), main.handle_thread_message
+        threads = []
+        for _ in range(concurrency):
+            ts = next_ts()
+            mention(event={"type": "app_mention", "channel": CHANNEL, "ts": ts, "text": "<@UNOVA> monthly review UK June 2025"}, say=say, client=client)
+            threads.append(ts)
+        pairs = zip(itertools.cycle(threads), itertools.cycle(THREAD_QUESTIONS))
+        return [lambda p=next(pairs): reply({"type": "message", "channel": CHANNEL, "ts": next_ts(), "thread_ts": p[0], "text": p[1]}, say, client, p[0]) for _ in range(count)]
+    name, text = SLASH_COMMANDS[scenario]
+    handle = listener(main, name)
+    command = {"command": f"/{scenario}", "text": text, "channel_id": CHANNEL}
+    extra = {"client": client} if name == "route_plan" else {}
+    return [lambda: handle(ack=lambda: None, say=say, command=command, **extra) for _ in range(count)]
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)] if ordered else 0.0
+
+def run_scenario(requests, concurrency, before_each=None):
+    """Runs the requests on `concurrency` threads; returns (sorted latencies, errors, wall seconds)."""
+    def timed_request(request):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        try:
+            request()
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        # Each request gets its own context, as job runner jobs do, so metric labels stay per request.
+        results = list(pool.map(lambda r: contextvars.copy_context().run(timed_request, r), requests))
+    wall = time.perf_counter() - start
+    return sorted(latency for latency, _ in results), sum(1 for _, error in results if error), wall
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot's listeners against local Lyra, Gemini and Slack fakes.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=40, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--lyra-latency", type=float, default=0.08, help="seconds per Lyra query")
+    parser.add_argument("--lyra-jitter", type=float, default=0.02)
+    parser.add_argument("--lyra-rows", type=int, default=300, help="records per list in Lyra responses")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.25)
+    parser.add_argument("--report-tokens", type=int, default=300)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of Gemini calls failing with 429")
+    parser.add_argument("--slack-latency", type=float, default=0.02)
+    parser.add_argument("--cold", action="store_true", help="clear the Lyra and routing caches before every request (concurrent identical queries still coalesce)")
+    parser.add_argument("--stages", action="store_true", help="print the per-stage latency summary as well")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    lyra = FakeLyraServer(latency=args.lyra_latency, jitter=args.lyra_jitter, rows=args.lyra_rows).start()
+    # Configuration is read at import, so the fakes' addresses are set before the bot is imported.
+    os.environ["BASE_API_URL"] = lyra.url
+    for name, value in (("GOOGLE_API_KEY", "benchmark"), ("SLACK_BOT_TOKEN", "xoxb-benchmark"), ("SLACK_APP_TOKEN", "xapp-benchmark")):
+        os.environ.setdefault(name, value)
+
+    from common import config
+    from common.config import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    bot = importlib.import_module("main")
+    from common.metrics import registry, format_summary
+    from common.utils import response_cache
+
+    gemini = FakeGeminiModel(MENTION_ROUTES, tokens_per_second=args.tokens_per_second, first_token_latency=args.first_token_latency, report_tokens=args.report_tokens, error_rate=args.gemini_error_rate)
+    config._gemini_model = gemini  # where get_gemini_model() looks first, so the SDK is never imported
+    for module in ("month", "weekly", "influencer", "trend", "plan"):
+        importlib.import_module(module)  # import cost is a start-up concern, not a request one
+
+    def clear_caches():
+        response_cache.clear()
+        bot.routing_cache.clear()
+
+    client = RecordingClient(latency=args.slack_latency)
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, Lyra {args.lyra_latency * 1000:.0f}ms x {args.lyra_rows} rows, "
+          f"Gemini {args.tokens_per_second:.0f} tok/s, caches {'cold' if args.cold else 'warm'}")
+    print(f"{'scenario':<20} {'n':>4} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7}")
+    for scenario in args.scenarios:
+        requests = make_requests(bot, scenario, client, args.requests, args.concurrency)
+        registry.reset()
+        latencies, errors, wall = run_scenario(requests, args.concurrency, clear_caches if args.cold else None)
+        print(f"{scenario:<20} {len(latencies):>4} {errors:>4} {percentile(latencies, 0.50) * 1000:>8.0f} {percentile(latencies, 0.95) * 1000:>8.0f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.0f} {len(latencies) / wall:>7.1f}")
+        if args.stages and (summary := format_summary()):
+            print("  " + summary.replace("\n", "\n  "))
+
+    print(f"peak RSS {peak_rss_mb():.0f} MB | Lyra requests {lyra.requests} | Gemini calls {gemini.calls} | "
+          f"Slack calls {len(client.calls)} | uploaded {client.uploaded_bytes / 1024:.0f} KB")
+    lyra.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# ================================================
+# FILE: benchmarks/bench_excel.py
+# PURPOSE: Compares time and peak Python memory of the plan Excel export against the old pandas path
+# USAGE: python benchmarks/bench_excel.py [--sizes 1000 10000 50000]
+# ================================================
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+import pandas as pd
+from plan import create_excel_report
+from common.utils import format_currency, convert_eur_to_local
+
+def pandas_excel_report(recs, market, month, year, target_budget, actual_spend, remaining_budget, total_allocated, booked_influencers):
+    """The previous DataFrame-based export, followed by the getvalue() copy made before uploading."""
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        budget_data = {'Metric': ['Target Budget', 'Actual Spend', 'Remaining Budget', 'Recommended Allocation'],
+                       'Amount': [format_currency(v, market) for v in (target_budget, actual_spend, remaining_budget, total_allocated)]}
+        pd.DataFrame(budget_data).to_excel(writer, sheet_name='Budget Summary', index=False)
+        pd.DataFrame(recs).to_excel(writer, sheet_name='All Recommendations', index=False)
+        booked_data = [{'Influencer Name': inf.get('influencer_name', 'Unknown'), 'Spent Budget (Local)': format_currency(convert_eur_to_local(inf.get('total_spend_eur', 0), market), market)} for inf in booked_influencers]
+        pd.DataFrame(booked_data).to_excel(writer, sheet_name='Booked Influencers', index=False)
+    return buffer.getvalue()
+
+def streaming_excel_report(*args):
+    with create_excel_report(*args) as report:
+        return report.read()  # what files_upload_v2 does with a file object
+
+def make_inputs(size, market="Sweden", seed=1):
+    rng = random.Random(seed)
+    recs = [{'influencer_name': f"influencer-{i}", 'allocated_budget': rng.uniform(500, 50000), 'predicted_conversions': rng.randint(0, 900), 'effective_cac': 50.0, 'tier': rng.choice(['Gold', 'Silver', 'Bronze']), 'market': market} for i in range(size)]
+    booked = [{'influencer_name': f"booked-{i}", 'total_spend_eur': rng.uniform(100, 9000)} for i in range(size)]
+    return (recs, market, "June", 2025, 5_000_000, 1_000_000, 4_000_000, sum(r['allocated_budget'] for r in recs), booked)
+
+def measure(fn, args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the write-only Excel export with the old pandas export.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'pandas s':>9} {'pandas MB':>10} {'stream s':>9} {'stream MB':>10} {'xlsx KB':>8}")
+    for size in args.sizes:
+        inputs = make_inputs(size)
+        old_s, old_peak, _ = measure(pandas_excel_report, inputs)
+        new_s, new_peak, new_len = measure(streaming_excel_report, inputs)
+        print(f"{size:>7} {old_s:>9.2f} {old_peak / 2**20:>10.1f} {new_s:>9.2f} {new_peak / 2**20:>10.1f} {new_len / 1024:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# ================================================
+# FILE: benchmarks/fakes.py
+# PURPOSE: Offline stand-ins for Lyra, Gemini and Slack used by the end-to-end benchmark
+# ================================================
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Lyra ---
+def _influencer(rng, i, market):
+    spend = rng.uniform(200, 20000)
+    conversions = rng.randint(0, 600)
+    return {"influencer_name": f"Creator {i:05d}", "market": market, "campaigns": rng.randint(1, 6),
+            "total_spend_eur": round(spend, 2), "total_conversions": conversions,
+            "effective_cac_eur": round(spend / conversions, 2) if conversions else 0.0,
+            "ctr": round(rng.uniform(0.2, 4.0), 2)}
+
+def lyra_response(payload: dict, rows: int) -> dict:
+    """A response shaped like the Lyra view the payload asks for, with `rows` records per list."""
+    filters = payload.get("filters") or {}
+    market = filters.get("market", "UK")
+    rng = random.Random(json.dumps(payload, sort_keys=True))
+    influencers = [_influencer(rng, i, market) for i in range(rows)]
+    summary = {"total_spend_eur": round(sum(r["total_spend_eur"] for r in influencers[:rows // 4]), 2),
+               "total_conversions": sum(r["total_conversions"] for r in influencers[:rows // 4])}
+
+    if payload.get("source") == "dashboard":
+        months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+        return {"market": market, "monthly_detail": [{"month": m, "target_budget_clean": rng.uniform(2e6, 5e6)} for m in months]}
+    view = payload.get("view")
+    if view == "discovery_tiers":
+        third = max(1, rows // 3)
+        return {"gold": influencers[:third], "silver": influencers[third:2 * third], "bronze": influencers[2 * third:]}
+    if view == "influencer_performance":
+        return {"campaigns": [{"campaign_name": f"Campaign {i}", "market": market, "currency": "EUR",
+                               "total_budget_clean": r["total_spend_eur"], "actual_conversions_clean": r["total_conversions"],
+                               "ctr": r["ctr"]} for i, r in enumerate(influencers)]}
+    if view == "monthly_breakdown":
+        return {"monthly_data": [{"month": filters.get("month"), "summary": summary, "details": influencers[:rows // 4]}]}
+    return {"summary": summary, "details": influencers}  # custom_range_breakdown, weekly_breakdown_by_number
+
+class FakeLyraServer:
+    """Serves POST /api/influencer/query on 127.0.0.1 after `latency` (+/- `jitter`) seconds."""
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, rows: int = 200):
+        self.latency, self.jitter, self.rows = latency, jitter, rows
+        self.requests = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, as the real API behind a load balancer
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+                body = json.dumps(lyra_response(payload, fake.rows)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-lyra", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+# --- Gemini ---
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeQuotaError(Exception):
+    code = 429  # as google.api_core.exceptions.ResourceExhausted
+
+class FakeGeminiModel:
+    """Mimics GenerativeModel.generate_content, emitting `tokens_per_second` after `first_token_latency`.
+
+    Router prompts are answered from `routes` ({query: routing decision}); thread intent prompts
+    answer follow-up; anything else gets a `report_tokens`-long report. A share `error_rate` of
+    calls fails with a 429 after the first-token delay.
+    """
+    def __init__(self, routes: dict, tokens_per_second: float = 200.0, first_token_latency: float = 0.3, report_tokens: int = 400, chunk_tokens: int = 20, error_rate: float = 0.0):
+        self.routes, self.error_rate = routes, error_rate
+        self.tokens_per_second, self.first_token_latency = tokens_per_second, first_token_latency
+        self.report_tokens, self.chunk_tokens = report_tokens, chunk_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, prompt: str) -> str:
+        if "expert routing assistant" in prompt:
+            query = re.search(r'\*\*USER QUERY:\*\* "(.*)"', prompt).group(1)
+            return json.dumps(self.routes.get(query, {"tool_name": "clarify-market", "parameters": {"original_query": query}}))
+        if "intent detection and routing expert" in prompt:
+            return json.dumps({"intent": "follow-up"})
+        return " ".join(f"**insight-{i}**" if i % 25 == 0 else f"word{i}" for i in range(self.report_tokens))
+
+    def generate_content(self, prompt, stream: bool = False, request_options=None):
+        with self._lock:
+            self.calls += 1
+        tokens = self._answer(str(prompt)).split(" ")
+        time.sleep(self.first_token_latency)
+        if random.random() < self.error_rate:
+            raise FakeQuotaError("429 Resource has been exhausted (fake)")
+        if not stream:
+            time.sleep(len(tokens) / self.tokens_per_second)
+            return FakeResponse(" ".join(tokens))
+        return self._stream(tokens)
+
+    def _stream(self, tokens):
+        for start in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[start:start + self.chunk_tokens]
+            time.sleep(len(chunk) / self.tokens_per_second)
+            yield FakeResponse(" ".join(chunk) + " ")
+
+# --- Slack ---
+class RecordingClient:
+    """Records Slack Web API calls; every call takes `latency` seconds and returns {"ok", "ts", "channel"}."""
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.calls = []
+        self.uploaded_bytes = 0
+        self._ts = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _record(self, method, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls.append((method, kwargs.get("thread_ts")))
+            ts = f"{time.time():.0f}.{next(self._ts):06d}"
+        return {"ok": True, "ts": ts, "channel": kwargs.get("channel")}
+
+    def chat_postMessage(self, channel, text=None, thread_ts=None, **kwargs):
+        return self._record("chat_postMessage", channel=channel, thread_ts=thread_ts)
+
+    def chat_update(self, channel, ts, text=None, **kwargs):
+        return self._record("chat_update", channel=channel, ts=ts)
+
+    def files_upload_v2(self, channel=None, file=None, thread_ts=None, **kwargs):
+        size = len(file.read() if hasattr(file, "read") else file)
+        with self._lock:
+            self.uploaded_bytes += size
+        return self._record("files_upload_v2", channel=channel, thread_ts=thread_ts)
+
+class RecordingSay:
+    """Bolt's `say` bound to one channel: posts through the recording client."""
+    def __init__(self, client: RecordingClient, channel: str):
+        self.client, self.channel = client, channel
+
+    def __call__(self, text=None, thread_ts=None, **kwargs):
+        return self.client.chat_postMessage(channel=self.channel, text=text, thread_ts=thread_ts, **kwargs)
@@ -0,0 +1,131 @@
+# ================================================
+# FILE: common/cache.py
+# PURPOSE: Thread-safe TTL + LRU cache with single-flight loading
+# ================================================
+import collections
+import json
+import threading
+import time
+
+def canonical_key(payload) -> str:
+    """Serializes a payload so that logically equal payloads produce the same key."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+
+class _Flight:
+    """A load in progress that concurrent callers for the same key wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """LRU cache bounded by total entry size, with a TTL per entry.
+
+    get_or_load() is single-flight: while one caller is loading a key, other callers
+    asking for that key wait for its result instead of issuing their own load.
+    """
+    def __init__(self, max_bytes: int, name: str = "cache", clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.name = name
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> (value, size, expires_at)
+        self._inflight = {}
+        self._bytes = 0
+        self._stats = collections.Counter()
+
+    def get(self, key):
+        """Returns the cached value for key, or None when it is missing or expired."""
+        with self._lock:
+            return self._get_locked(key)
+
+    def set(self, key, value, ttl: float, size: int = None):
+        """Stores value under key for ttl seconds; size defaults to len(key) + len(value)."""
+        size = size if size is not None else len(key) + len(value)
+        with self._lock:
+            self._pop_locked(key)
+            if ttl <= 0 or size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, self._clock() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key, loader, ttl: float, cacheable=None):
+        """Returns the cached value for key, calling loader() once on a miss even under concurrency.
+
+        A loaded value is only stored when cacheable(value) is true (or no predicate is given).
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._stats["shared_loads"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            if cacheable is None or cacheable(flight.value):
+                self.set(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop_locked(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats.clear()
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            hits, misses = self._stats["hits"], self._stats["misses"]
+            return {
+                "name": self.name, "hits": hits, "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "evictions": self._stats["evictions"], "expirations": self._stats["expirations"],
+                "shared_loads": self._stats["shared_loads"],
+                "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+            }
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        value, _, expires_at = entry
+        if expires_at <= self._clock():
+            self._pop_locked(key)
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return value
+
+    def _pop_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
@@ -4,30 +4,191 @@
 # ================================================
 import os
 import sys
+import json
+import threading
 from dotenv import load_dotenv
 from loguru import logger
-import google.generativeai as genai
 
 # --- Loguru Configuration ---
 logger.remove()
 logger.add(sys.stderr, format="<yellow>{time:YYYY-MM-DD HH:mm:ss}</yellow> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>", colorize=True)
 
+def _json_env(name: str, default):
+    """Reads a JSON environment variable; a malformed or wrongly typed value is logged and the default used."""
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        value = json.loads(raw)
+    except ValueError as e:
+        logger.error(f"Ignoring malformed {name} ({e}); using the defaults.")
+        return default
+    if not isinstance(value, type(default)):
+        logger.error(f"Ignoring {name}: expected a JSON {type(default).__name__}; using the defaults.")
+        return default
+    return value
+
 # --- Environment & Client Initialization ---
+# The Gemini SDK is slow to import, so it is loaded and configured on first use.
 load_dotenv()
-try:
-    GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]
-    genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
-    logger.success("Shared Gemini client initialized successfully.")
-except KeyError as e:
-    logger.critical(f"FATAL: Missing GOOGLE_API_KEY. Please check .env file.")
-    sys.exit(1)
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+def get_gemini_model():
+    """Returns the shared Gemini model, importing and configuring the SDK on first call."""
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                if not GOOGLE_API_KEY:
+                    raise RuntimeError("Missing GOOGLE_API_KEY. Please check .env file.")
+                import google.generativeai as genai
+                genai.configure(api_key=GOOGLE_API_KEY)
+                _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                logger.success("Shared Gemini client initialized successfully.")
+    return _gemini_model
+
+class _LazyGeminiModel:
+    """Stands in for the model; the real client is created on first attribute access."""
+    def __getattr__(self, name):
+        return getattr(get_gemini_model(), name)
+
+gemini_model = _LazyGeminiModel()
 
 # --- API Constants ---
 BASE_API_URL = os.getenv("BASE_API_URL", "http://127.0.0.1:10000")
 UNIFIED_API_URL = f"{BASE_API_URL}/api/influencer/query"
 
+# --- HTTP Connection Pool ---
+# pool_connections is the number of per-host pools kept alive; pool_maxsize caps connections per host.
+API_POOL_CONNECTIONS = int(os.getenv("API_POOL_CONNECTIONS", 4))
+API_POOL_MAXSIZE = int(os.getenv("API_POOL_MAXSIZE", 10))
+API_POOL_BLOCK = os.getenv("API_POOL_BLOCK", "false").lower() == "true"
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", 5))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", 60))
+
+# --- Lyra Query Resilience ---
+# One deadline covers all attempts of a query; each attempt's timeouts are capped by the time left.
+API_QUERY_DEADLINE = float(os.getenv("API_QUERY_DEADLINE", 20))
+API_RETRY_ATTEMPTS = int(os.getenv("API_RETRY_ATTEMPTS", 3))
+API_RETRY_BASE_DELAY = float(os.getenv("API_RETRY_BASE_DELAY", 0.25))
+API_RETRY_MAX_DELAY = float(os.getenv("API_RETRY_MAX_DELAY", 2.0))
+def _valid_retry_policies(overrides: dict) -> dict:
+    """Keeps the API_RETRY_POLICIES entries that are objects of non-negative numbers with attempts >= 1."""
+    valid = {}
+    for endpoint, settings in overrides.items():
+        ok = isinstance(settings, dict) and set(settings) <= {"attempts", "base_delay", "max_delay", "deadline"} and all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0 for v in settings.values())
+        if ok and "attempts" in settings:
+            ok = float(settings["attempts"]).is_integer() and settings["attempts"] >= 1
+        if ok and "deadline" in settings:
+            ok = settings["deadline"] > 0
+        if not ok:
+            logger.error(f"Ignoring API_RETRY_POLICIES entry {endpoint!r}: {settings!r}; expected an object with numeric attempts (>= 1), base_delay, max_delay and deadline.")
+            continue
+        valid[endpoint] = {**settings, "attempts": int(settings["attempts"])} if "attempts" in settings else settings
+    return valid
+
+# Per "source/view" (or "source") overrides of attempts, deadline, base_delay and max_delay. The query
+# views below are read-only, so they are retried; endpoints not listed get a single attempt.
+API_RETRY_POLICIES = {
+    "dashboard": {},
+    "influencer_analytics/monthly_breakdown": {},
+    "influencer_analytics/discovery_tiers": {"deadline": 30},
+    "influencer_analytics/influencer_performance": {},
+    "influencer_analytics/custom_range_breakdown": {},
+    "influencer_analytics/weekly_breakdown_by_number": {},
+    **_valid_retry_policies(_json_env("API_RETRY_POLICIES", {})),
+}
+# Per source/view: after this many consecutive failures, queries fail fast for API_BREAKER_RESET seconds.
+API_BREAKER_FAILURES = int(os.getenv("API_BREAKER_FAILURES", 5))
+API_BREAKER_RESET = float(os.getenv("API_BREAKER_RESET", 30))
+
+# --- Lyra Response Cache ---
+# TTLs in seconds, keyed by "source" or "source/view". 0 disables caching for that query.
+API_CACHE_ENABLED = os.getenv("API_CACHE_ENABLED", "true").lower() == "true"
+API_CACHE_MAX_BYTES = int(os.getenv("API_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+API_CACHE_DEFAULT_TTL = int(os.getenv("API_CACHE_DEFAULT_TTL", 300))
+API_CACHE_TTLS = {
+    "dashboard": 900,
+    "influencer_analytics/monthly_breakdown": 600,
+    "influencer_analytics/discovery_tiers": 600,
+    "influencer_analytics/influencer_performance": 600,
+    "influencer_analytics/custom_range_breakdown": 300,
+    "influencer_analytics/weekly_breakdown_by_number": 300,
+    **_json_env("API_CACHE_TTLS", {}),
+}
+
+# --- LLM Routing Cache ---
+ROUTING_CACHE_MAX_BYTES = int(os.getenv("ROUTING_CACHE_MAX_BYTES", 1024 * 1024))
+ROUTING_CACHE_TTL = int(os.getenv("ROUTING_CACHE_TTL", 3600))
+
+# --- LLM Output Streaming ---
+STREAM_LLM_RESPONSES = os.getenv("STREAM_LLM_RESPONSES", "true").lower() == "true"
+STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", 1.0))
+
+# --- Prompt Size ---
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 6000))
+FOLLOW_UP_DIGEST_TOKEN_BUDGET = int(os.getenv("FOLLOW_UP_DIGEST_TOKEN_BUDGET", 1500))
+
+# --- LLM Gateway ---
+# Prompts estimated above LLM_MAX_PROMPT_TOKENS are cut in the middle ("truncate") or refused ("reject").
+LLM_MAX_PROMPT_TOKENS = int(os.getenv("LLM_MAX_PROMPT_TOKENS", 24000))
+LLM_OVERSIZE_PROMPTS = os.getenv("LLM_OVERSIZE_PROMPTS", "truncate").lower()
+# Budgets (0 disables a limit): calls are counted over the last minute, input + output tokens over the last hour.
+LLM_USER_CALLS_PER_MINUTE = int(os.getenv("LLM_USER_CALLS_PER_MINUTE", 0))
+LLM_USER_TOKENS_PER_HOUR = int(os.getenv("LLM_USER_TOKENS_PER_HOUR", 0))
+LLM_GLOBAL_CALLS_PER_MINUTE = int(os.getenv("LLM_GLOBAL_CALLS_PER_MINUTE", 0))
+LLM_GLOBAL_TOKENS_PER_HOUR = int(os.getenv("LLM_GLOBAL_TOKENS_PER_HOUR", 0))
+# USD per million tokens, used for cost estimates (defaults are Gemini 1.5 Flash list prices).
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", 0.075))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", 0.30))
+
+# --- LLM Resilience ---
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))  # Gemini requests in flight at once, streams included
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", 90))  # seconds per call, shared by queueing, attempts and backoff
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1.0))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 10.0))
+# After this many consecutive 429/5xx/timeout failures, calls fail fast for LLM_BREAKER_RESET seconds.
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+
+# --- Thread Context Store ---
+CONTEXT_STORE_BACKEND = os.getenv("CONTEXT_STORE_BACKEND", "memory").lower()
+CONTEXT_STORE_MAX_BYTES = int(os.getenv("CONTEXT_STORE_MAX_BYTES", 64 * 1024 * 1024))
+CONTEXT_STORE_PATH = os.getenv("CONTEXT_STORE_PATH", "data/thread_contexts.db")
+CONTEXT_LARGE_FIELD_BYTES = int(os.getenv("CONTEXT_LARGE_FIELD_BYTES", 2048))
+
+# --- Shared State (multi-process mode) ---
+# When set, thread contexts, the Lyra response cache, the routing cache and per-thread locks live in
+# this SQLite file so several bot processes on one host can serve the same workspace.
+SHARED_STATE_PATH = os.getenv("NOVA_SHARED_STATE_PATH", "")
+THREAD_LOCK_RETRY_INTERVAL = float(os.getenv("THREAD_LOCK_RETRY_INTERVAL", 1))
+THREAD_LOCK_LEASE = float(os.getenv("THREAD_LOCK_LEASE", 600))
+
+# --- Concurrency ---
+PLAN_FETCH_WORKERS = int(os.getenv("PLAN_FETCH_WORKERS", 3))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 8))
+JOB_PER_CHANNEL_LIMIT = int(os.getenv("JOB_PER_CHANNEL_LIMIT", 2))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", 50))
+
+# --- Metrics ---
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 disables the HTTP endpoint
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", 0))  # seconds; 0 disables the periodic log summary
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 1024))  # recent samples kept per series for percentiles
+
+# --- Start-up ---
+# Import feature modules and create the Gemini client right after connecting, instead of on the first request.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
 # --- Business Logic Constants ---
+DEFAULT_YEAR = int(os.getenv("DEFAULT_YEAR", 2025))
+PLAN_ALLOCATION_STRATEGY = os.getenv("PLAN_ALLOCATION_STRATEGY", "cascade")
+# Optional per-tier [min_share, max_share] of the budget for the optimal strategy, e.g. {"Gold": [0.3, 0.7]}
+PLAN_TIER_SHARES = _json_env("PLAN_TIER_SHARES", {})
 MARKET_CURRENCY_CONFIG = {
     'SWEDEN': {'rate': 11.30, 'symbol': 'SEK', 'name': 'SEK'},
     'NORWAY': {'rate': 11.50, 'symbol': 'NOK', 'name': 'NOK'},
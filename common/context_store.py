@@ -0,0 +1,208 @@
+# ================================================
+# FILE: common/context_store.py
+# PURPOSE: Size-bounded thread context storage with in-memory and SQLite backends
+# ================================================
+import abc
+import collections
+import collections.abc
+import json
+import threading
+import time
+import zlib
+from .config import logger, CONTEXT_STORE_BACKEND, CONTEXT_STORE_MAX_BYTES, CONTEXT_STORE_PATH, CONTEXT_LARGE_FIELD_BYTES, SHARED_STATE_PATH
+from .shared_state import SQLiteBackend, ensure_parent_dir
+
+def encode_context(context, large_field_bytes: int = CONTEXT_LARGE_FIELD_BYTES):
+    """Splits a context into small fields (kept as-is) and large fields (zlib-compressed JSON).
+
+    Returns (small, blobs, size) where size estimates the stored footprint in bytes.
+    """
+    small, blobs = {}, {}
+    for key, value in context.items():
+        encoded = json.dumps(value, separators=(",", ":"), default=str)
+        if len(encoded) > large_field_bytes:
+            blobs[key] = zlib.compress(encoded.encode(), 6)
+        else:
+            small[key] = value
+    size = len(json.dumps(small, default=str)) + sum(len(k) + len(b) for k, b in blobs.items())
+    return small, blobs, size
+
+class LazyContext(collections.abc.Mapping):
+    """Read-only view of a stored context; large fields are loaded and decompressed on first access."""
+    def __init__(self, small: dict, blob_keys, load_blob):
+        self._small = small
+        self._blob_keys = set(blob_keys)
+        self._load_blob = load_blob
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        if key in self._small:
+            return self._small[key]
+        if key not in self._blob_keys:
+            raise KeyError(key)
+        if key not in self._loaded:
+            self._loaded[key] = json.loads(zlib.decompress(self._load_blob(key)))
+        return self._loaded[key]
+
+    def __iter__(self):
+        yield from self._small
+        yield from self._blob_keys
+
+    def __len__(self):
+        return len(self._small) + len(self._blob_keys)
+
+    def __repr__(self):
+        return f"LazyContext(type={self._small.get('type')!r}, fields={sorted(self)})"
+
+class ContextStore(collections.abc.MutableMapping, abc.ABC):
+    """Thread context storage keyed by thread_ts.
+
+    Reads return LazyContext views; writes replace the whole context. move_to_end() marks a
+    context as recently used so it is evicted last.
+    """
+    @abc.abstractmethod
+    def move_to_end(self, thread_ts):
+        """Marks the thread's context as the most recently used."""
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        """Returns entry, byte and eviction counts for the status report."""
+
+class MemoryContextStore(ContextStore):
+    """In-process LRU store bounded by the estimated bytes of its (compressed) contexts."""
+    def __init__(self, max_bytes: int = CONTEXT_STORE_MAX_BYTES, large_field_bytes: int = CONTEXT_LARGE_FIELD_BYTES):
+        self.max_bytes = max_bytes
+        self.large_field_bytes = large_field_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # thread_ts -> (small, blobs, size)
+        self._bytes = 0
+        self._evictions = 0
+
+    def __setitem__(self, thread_ts, context):
+        entry = encode_context(context, self.large_field_bytes)
+        with self._lock:
+            self._pop_locked(thread_ts)
+            self._entries[thread_ts] = entry
+            self._bytes += entry[2]
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_ts, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+                logger.info(f"Evicted thread context {evicted_ts} (store at {self._bytes} bytes)")
+
+    def __getitem__(self, thread_ts):
+        with self._lock:
+            small, blobs, _ = self._entries[thread_ts]
+        return LazyContext(small, blobs, blobs.__getitem__)
+
+    def __delitem__(self, thread_ts):
+        with self._lock:
+            if not self._pop_locked(thread_ts):
+                raise KeyError(thread_ts)
+
+    def __contains__(self, thread_ts):
+        with self._lock:
+            return thread_ts in self._entries
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def move_to_end(self, thread_ts):
+        with self._lock:
+            if thread_ts in self._entries:
+                self._entries.move_to_end(thread_ts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes, "evictions": self._evictions}
+
+    def _pop_locked(self, thread_ts) -> bool:
+        entry = self._entries.pop(thread_ts, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+        return entry is not None
+
+class SQLiteContextStore(SQLiteBackend, ContextStore):
+    """Persistent store in a SQLite file; survives restarts, can be shared by several bot processes,
+    and evicts least-recently-used threads by size."""
+    def __init__(self, path: str = CONTEXT_STORE_PATH, max_bytes: int = CONTEXT_STORE_MAX_BYTES, large_field_bytes: int = CONTEXT_LARGE_FIELD_BYTES):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.large_field_bytes = large_field_bytes
+        self._evictions = 0
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS contexts (thread_ts TEXT PRIMARY KEY, small TEXT NOT NULL, blob_keys TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS context_fields (thread_ts TEXT NOT NULL, key TEXT NOT NULL, blob BLOB NOT NULL, PRIMARY KEY (thread_ts, key))")
+            db.execute("CREATE INDEX IF NOT EXISTS contexts_last_access ON contexts (last_access)")
+
+    def __setitem__(self, thread_ts, context):
+        small, blobs, size = encode_context(context, self.large_field_bytes)
+        with self._transaction() as db:
+            db.execute("DELETE FROM context_fields WHERE thread_ts = ?", (thread_ts,))
+            db.execute("INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?, ?)", (thread_ts, json.dumps(small, default=str), json.dumps(list(blobs)), size, time.time()))
+            db.executemany("INSERT INTO context_fields VALUES (?, ?, ?)", [(thread_ts, key, blob) for key, blob in blobs.items()])
+            self._evict(db, keep=thread_ts)
+
+    def __getitem__(self, thread_ts):
+        row = self._connect().execute("SELECT small, blob_keys FROM contexts WHERE thread_ts = ?", (thread_ts,)).fetchone()
+        if row is None:
+            raise KeyError(thread_ts)
+        return LazyContext(json.loads(row[0]), json.loads(row[1]), lambda key: self._load_blob(thread_ts, key))
+
+    def _load_blob(self, thread_ts, key) -> bytes:
+        row = self._connect().execute("SELECT blob FROM context_fields WHERE thread_ts = ? AND key = ?", (thread_ts, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def __delitem__(self, thread_ts):
+        with self._transaction() as db:
+            if not db.execute("DELETE FROM contexts WHERE thread_ts = ?", (thread_ts,)).rowcount:
+                raise KeyError(thread_ts)
+            db.execute("DELETE FROM context_fields WHERE thread_ts = ?", (thread_ts,))
+
+    def __contains__(self, thread_ts):
+        return self._connect().execute("SELECT 1 FROM contexts WHERE thread_ts = ?", (thread_ts,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self._connect().execute("SELECT thread_ts FROM contexts ORDER BY last_access")])
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+
+    def move_to_end(self, thread_ts):
+        self._connect().execute("UPDATE contexts SET last_access = ? WHERE thread_ts = ?", (time.time(), thread_ts))
+
+    def stats(self) -> dict:
+        entries, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM contexts").fetchone()
+        return {"backend": "sqlite", "path": self.path, "entries": entries, "bytes": total, "max_bytes": self.max_bytes, "evictions": self._evictions}
+
+    def _evict(self, db, keep):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM contexts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for thread_ts, size in db.execute("SELECT thread_ts, size FROM contexts WHERE thread_ts != ? ORDER BY last_access", (keep,)).fetchall():
+            db.execute("DELETE FROM contexts WHERE thread_ts = ?", (thread_ts,))
+            db.execute("DELETE FROM context_fields WHERE thread_ts = ?", (thread_ts,))
+            self._evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+def create_context_store() -> ContextStore:
+    """Builds the store selected by CONTEXT_STORE_BACKEND ('memory' or 'sqlite').
+
+    In shared-state mode (NOVA_SHARED_STATE_PATH set) contexts always go to the shared SQLite file.
+    """
+    if SHARED_STATE_PATH:
+        ensure_parent_dir(SHARED_STATE_PATH)
+        return SQLiteContextStore(SHARED_STATE_PATH)
+    if CONTEXT_STORE_BACKEND == "sqlite":
+        ensure_parent_dir(CONTEXT_STORE_PATH)
+        logger.info(f"Using SQLite thread context store at {CONTEXT_STORE_PATH}")
+        return SQLiteContextStore(CONTEXT_STORE_PATH)
+    return MemoryContextStore()
@@ -0,0 +1,148 @@
+# ================================================
+# FILE: common/data_context.py
+# PURPOSE: Compact, token-budgeted serialization of API data for LLM prompts
+# ================================================
+import csv
+import io
+import re
+import json
+from .config import PROMPT_TOKEN_BUDGET, FOLLOW_UP_DIGEST_TOKEN_BUDGET
+from .metrics import timed
+
+# Row ranking for truncated tables: the first key present in a table wins.
+RANK_KEYS = ("total_spend_eur", "spend_eur", "total_budget_clean", "budget_eur", "total_conversions", "actual_conversions_clean", "conversions")
+MIN_TABLE_ROWS = 5
+# Fields that name a row, used to spot follow-up questions about specific rows.
+ROW_LABEL_KEYS = ("influencer_name", "campaign_name", "name")
+# Explicit requests for every row ("full list", "all influencers", "complete data"); a bare "all" or "each" is not one.
+_FULL_DETAIL_RE = re.compile(r"\b(?:(?:full|complete|entire|whole) (?:list|data(?:set)?|details?|table|breakdown)|(?:all|every) (?:(?:of )?the )?(?:rows?|influencers?|creators?|campaigns?|records?|entries|data))\b", re.IGNORECASE)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def round_values(obj, digits: int = 2):
+    """Recursively rounds floats so prompts do not carry long binary fractions."""
+    if isinstance(obj, float):
+        return round(obj, digits)
+    if isinstance(obj, dict):
+        return {k: round_values(v, digits) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [round_values(v, digits) for v in obj]
+    return obj
+
+def compact_json(obj) -> str:
+    return json.dumps(round_values(obj), separators=(",", ":"), ensure_ascii=False, default=str)
+
+def _is_table(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(row, dict) and not any(isinstance(v, (dict, list)) for v in row.values()) for row in value)
+
+def _numeric(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class _Table:
+    def __init__(self, name: str, rows: list):
+        self.name = name
+        self.columns = list(dict.fromkeys(col for row in rows for col in row))
+        self.rank_key = next((k for k in RANK_KEYS if k in self.columns), None)
+        self.rows = sorted(rows, key=lambda r: _numeric(r.get(self.rank_key)), reverse=True) if self.rank_key else rows
+        self.header = self._csv_line(self.columns)
+        self.lines = [self._csv_line([round_values(row.get(col, "")) for col in self.columns]) for row in self.rows]
+        self.limit = len(self.lines)
+
+    @staticmethod
+    def _csv_line(values) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="").writerow(values)
+        return buffer.getvalue()
+
+    def tokens(self) -> int:
+        # The fixed 40 covers the title and summary lines.
+        return estimate_tokens(self.header) + sum(estimate_tokens(line) + 1 for line in self.lines[:self.limit]) + 40
+
+    def trim(self, tokens: int):
+        """Drops the lowest-ranked rows until about `tokens` tokens are saved, keeping MIN_TABLE_ROWS."""
+        saved = 0
+        while self.limit > MIN_TABLE_ROWS and saved < tokens:
+            self.limit -= 1
+            saved += estimate_tokens(self.lines[self.limit]) + 1
+
+    def render(self) -> str:
+        shown = self.lines[:self.limit]
+        title = f"[table {self.name}: {len(self.rows)} rows"
+        title += f", top {self.limit} by {self.rank_key}]" if self.limit < len(self.rows) else "]"
+        parts = [title, self.header, *shown]
+        if rest := self.rows[self.limit:]:
+            sums = {col: round_values(sum(r.get(col, 0) for r in rest)) for col in self.columns if all(isinstance(r.get(col, 0), (int, float)) for r in rest)}
+            parts.append(f"[{len(rest)} more rows summarized] totals: {compact_json(sums)}")
+        return "\n".join(parts)
+
+def _extract_tables(obj, tables: list, path: str = ""):
+    """Replaces flat lists of records with table references, collecting the tables."""
+    if isinstance(obj, dict):
+        return {k: _extract_tables(v, tables, f"{path}.{k}" if path else k) for k, v in obj.items()}
+    if _is_table(obj):
+        tables.append(_Table(path or "rows", obj))
+        return f"<table {path or 'rows'}>"
+    if isinstance(obj, list):
+        return [_extract_tables(v, tables, f"{path}[{i}]") for i, v in enumerate(obj)]
+    return obj
+
+@timed("prompt.build")
+def build_data_context(data, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Serializes data for a prompt: compact JSON for the structure, CSV tables for record lists.
+
+    If the result would exceed token_budget, the largest tables are cut down to their top rows
+    (ranked by spend or conversions) and the remaining rows are summarized as column totals.
+    """
+    tables = []
+    skeleton = compact_json(_extract_tables(data, tables))
+    available = token_budget - estimate_tokens(skeleton)
+
+    while (excess := sum(t.tokens() for t in tables) - available) > 0:
+        trimmable = [t for t in tables if t.limit > MIN_TABLE_ROWS]
+        if not trimmable:
+            break
+        max(trimmable, key=lambda t: t.tokens()).trim(excess)
+
+    return "\n".join([skeleton, *(t.render() for t in tables)])
+
+def build_digest(data) -> dict:
+    """Builds the compact digest stored with a thread context, along with its token estimate."""
+    digest = build_data_context(data, FOLLOW_UP_DIGEST_TOKEN_BUDGET)
+    return {"digest": digest, "digest_tokens": estimate_tokens(digest)}
+
+def _labelled_rows(obj):
+    if isinstance(obj, dict):
+        if any(isinstance(obj.get(k), str) for k in ROW_LABEL_KEYS) and not any(isinstance(v, (dict, list)) for v in obj.values()):
+            yield obj
+        else:
+            for value in obj.values():
+                yield from _labelled_rows(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _labelled_rows(value)
+
+def rows_mentioned(data, text: str) -> list:
+    """Returns the records whose name (influencer, campaign, ...) appears in text."""
+    def named(row):
+        labels = (row.get(k) for k in ROW_LABEL_KEYS)
+        return any(len(label) >= 3 and re.search(rf"(?<!\w){re.escape(label)}(?!\w)", text, re.IGNORECASE) for label in labels if isinstance(label, str))
+    return [row for row in _labelled_rows(data) if named(row)]
+
+def follow_up_context(context: dict, data, user_message: str) -> str:
+    """Chooses the data to send with a follow-up question.
+
+    Normally this is the digest precomputed when the analysis finished. Questions that ask for
+    everything get the full (budgeted) data; questions naming specific rows get the digest plus
+    those rows in full.
+    """
+    if _FULL_DETAIL_RE.search(user_message):
+        return build_data_context(data)
+    digest = context.get("digest") or build_digest(data)["digest"]
+    if rows := rows_mentioned(data, user_message):
+        return f"{digest}\n[rows referenced in the question]\n{build_data_context(rows)}"
+    return digest
@@ -0,0 +1,77 @@
+# ================================================
+# FILE: common/http.py
+# PURPOSE: Shared keep-alive HTTP session for calls to the Lyra backend
+# ================================================
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from .config import logger, API_POOL_CONNECTIONS, API_POOL_MAXSIZE, API_POOL_BLOCK, API_CONNECT_TIMEOUT, API_READ_TIMEOUT
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_pool_stats = {"checkouts": 0, "new_connections": 0}
+
+def _record(counter: str):
+    with _stats_lock:
+        _pool_stats[counter] += 1
+
+class _CountingPoolMixin:
+    """Counts connection checkouts and fresh connections so reuse can be reported."""
+    def _get_conn(self, timeout=None):
+        _record("checkouts")
+        return super()._get_conn(timeout)
+
+    def _new_conn(self):
+        _record("new_connections")
+        return super()._new_conn()
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools report hit/miss counters."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _CountingHTTPConnectionPool, "https": _CountingHTTPSConnectionPool}
+
+def get_session() -> requests.Session:
+    """Returns the process-wide keep-alive session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = PooledAdapter(pool_connections=API_POOL_CONNECTIONS, pool_maxsize=API_POOL_MAXSIZE, pool_block=API_POOL_BLOCK)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+                logger.info(f"HTTP session initialized (pools={API_POOL_CONNECTIONS}, per-host max={API_POOL_MAXSIZE}, block={API_POOL_BLOCK})")
+    return _session
+
+def get_timeout(limit: float = None) -> tuple:
+    """Returns the (connect, read) timeout pair used for backend requests, each capped at `limit` seconds if given."""
+    if limit is None:
+        return (API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+    return (min(API_CONNECT_TIMEOUT, limit), min(API_READ_TIMEOUT, limit))
+
+def get_pool_stats() -> dict:
+    """Returns connection pool counters: a hit is a request served on an already-open connection."""
+    with _stats_lock:
+        checkouts, misses = _pool_stats["checkouts"], _pool_stats["new_connections"]
+    return {"requests": checkouts, "pool_hits": max(checkouts - misses, 0), "pool_misses": misses}
+
+def reset_session():
+    """Closes the shared session and clears counters (used on shutdown and in tests)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    with _stats_lock:
+        for key in _pool_stats:
+            _pool_stats[key] = 0
@@ -0,0 +1,149 @@
+# ================================================
+# FILE: common/jobs.py
+# PURPOSE: Bounded worker pool that runs bot requests off the Slack listener threads
+# ================================================
+import collections
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .config import logger
+
+class RetryLater(Exception):
+    """Raised by a job to run again after `delay` seconds; no worker is held in the meantime."""
+    def __init__(self, delay: float):
+        super().__init__(f"retry in {delay}s")
+        self.delay = delay
+
+class JobRunner:
+    """Runs jobs on a fixed pool of workers with a per-channel concurrency limit.
+
+    Jobs that cannot start immediately (all workers busy, or their channel already at its
+    limit) wait in per-channel FIFO queues that are drained round-robin, so one busy channel
+    cannot starve the others. Jobs sharing a serial key (a Slack thread) run one at a time, in
+    order: later ones wait in a per-key FIFO until the earlier one finishes. When the total
+    backlog reaches max_queue, new jobs are rejected.
+    """
+    def __init__(self, max_workers: int, per_channel_limit: int, max_queue: int, name: str = "jobs"):
+        self.max_workers = max_workers
+        self.per_channel_limit = per_channel_limit
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._active = collections.Counter()
+        self._pending = collections.OrderedDict()  # channel -> deque of jobs
+        self._serial = {}  # serial key with a job queued or running -> deque of (channel, job) behind it
+        self._queued = 0
+        self._running = 0
+        self._stats = collections.Counter()
+
+    def submit(self, channel: str, fn, *args, on_queued=None, serial_key=None, **kwargs) -> bool:
+        """Starts or queues fn(*args, **kwargs); returns False if the backlog is full.
+
+        on_queued(position) is called, outside the lock, when the job has to wait. Jobs with the
+        same serial_key run one after another in submission order.
+        """
+        job = (fn, args, kwargs, contextvars.copy_context(), serial_key)
+        with self._lock:
+            behind_key = serial_key is not None and serial_key in self._serial
+            if not behind_key and self._can_start_locked(channel):
+                self._claim_locked(serial_key)
+                self._start_locked(channel, job)
+                return True
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                logger.warning(f"Job queue full ({self._queued} waiting); rejecting job for channel {channel}")
+                return False
+            if behind_key:
+                self._serial[serial_key].append((channel, job))
+            else:
+                self._claim_locked(serial_key)
+                self._pending.setdefault(channel, collections.deque()).append(job)
+            self._queued += 1
+            self._stats["queued"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queued)
+            position = self._queued
+        logger.info(f"Job for channel {channel} queued at position {position}")
+        if on_queued:
+            on_queued(position)
+        return True
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._queued
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"running": self._running, "queued": self._queued, "workers": self.max_workers, **self._stats}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _claim_locked(self, serial_key):
+        if serial_key is not None:
+            self._serial[serial_key] = collections.deque()
+
+    def _release_locked(self, serial_key):
+        """Hands the key to the next job waiting on it, at the front of its channel's queue."""
+        if serial_key is None:
+            return
+        waiting = self._serial[serial_key]
+        if not waiting:
+            del self._serial[serial_key]
+            return
+        channel, job = waiting.popleft()
+        self._pending.setdefault(channel, collections.deque()).appendleft(job)
+
+    def _retry(self, channel, job):
+        with self._lock:
+            self._pending.setdefault(channel, collections.deque()).appendleft(job)
+            self._queued += 1
+            self._drain_locked()
+
+    def _can_start_locked(self, channel) -> bool:
+        return self._running < self.max_workers and self._active[channel] < self.per_channel_limit
+
+    def _start_locked(self, channel, job):
+        self._active[channel] += 1
+        self._running += 1
+        self._executor.submit(self._run, channel, job)
+
+    def _run(self, channel, job):
+        fn, args, kwargs, ctx, serial_key = job
+        retry = None
+        try:
+            ctx.run(fn, *args, **kwargs)
+            self._record("completed")
+        except RetryLater as e:
+            # The job keeps its serial key, so later jobs on the key stay behind it.
+            self._record("retried")
+            retry = threading.Timer(e.delay, self._retry, (channel, job))
+            retry.daemon = True
+            retry.start()
+        except Exception as e:
+            self._record("failed")
+            logger.error(f"Job {getattr(fn, '__name__', fn)} failed for channel {channel}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._active[channel] -= 1
+                if not self._active[channel]:
+                    del self._active[channel]
+                self._running -= 1
+                if retry is None:
+                    self._release_locked(serial_key)
+                self._drain_locked()
+
+    def _drain_locked(self):
+        for channel in list(self._pending):
+            if self._running >= self.max_workers:
+                return
+            if self._active[channel] >= self.per_channel_limit:
+                continue
+            queue = self._pending.pop(channel)
+            self._queued -= 1
+            self._start_locked(channel, queue.popleft())
+            if queue:
+                self._pending[channel] = queue  # re-inserted at the end for round-robin fairness
+
+    def _record(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
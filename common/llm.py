@@ -0,0 +1,331 @@
+# ================================================
+# FILE: common/llm.py
+# PURPOSE: Gemini text generation and delivery of generated text to Slack threads
+# ================================================
+import collections
+import contextvars
+import threading
+import time
+from . import config
+from .config import (logger, STREAM_LLM_RESPONSES, STREAM_UPDATE_INTERVAL, LLM_MAX_PROMPT_TOKENS, LLM_OVERSIZE_PROMPTS,
+                     LLM_USER_CALLS_PER_MINUTE, LLM_USER_TOKENS_PER_HOUR, LLM_GLOBAL_CALLS_PER_MINUTE, LLM_GLOBAL_TOKENS_PER_HOUR,
+                     LLM_INPUT_COST_PER_MTOK, LLM_OUTPUT_COST_PER_MTOK, LLM_MAX_CONCURRENCY, LLM_CALL_DEADLINE,
+                     LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+from .utils import split_message_for_slack
+from .data_context import estimate_tokens
+from .metrics import span, observe, increment, current_labels
+from .resilience import (RETRYABLE_STATUSES, error_status, Deadline, DeadlineExceeded, RetryPolicy, CircuitBreaker,
+                         CircuitOpenError, call_with_retries)
+
+SLACK_MESSAGE_LIMIT = 2800
+
+# --- Gateway ---
+# The Slack user whose request is running, for per-user budgets and usage. Set once per job.
+_llm_user = contextvars.ContextVar("llm_user", default="")
+
+def set_llm_user(user_id):
+    _llm_user.set(user_id or "")
+
+class LLMError(RuntimeError):
+    """An LLM failure whose message is meant for the user."""
+
+class LLMBudgetExceeded(LLMError):
+    """Raised instead of calling Gemini when a budget or the prompt size limit would be broken."""
+
+class LLMUnavailable(LLMError):
+    """Raised when Gemini is failing, overloaded or too slow; the circuit breaker raises it without calling."""
+
+STREAM_FAILED_MESSAGE = "⚠️ Something went wrong while writing this response."
+DEGRADED_MESSAGE = "⚠️ The AI service is having trouble right now, so I couldn't write this analysis. Please try again in a few minutes."
+
+def is_retryable_llm_error(error) -> bool:
+    return error_status(error) in RETRYABLE_STATUSES or isinstance(error, (TimeoutError, ConnectionError))
+
+class _Usage:
+    """Calls in the last minute and tokens in the last hour for one budget holder."""
+    def __init__(self):
+        self.calls = collections.deque()
+        self.tokens = collections.deque()
+        self.token_total = 0
+
+    def totals(self, now: float):
+        while self.calls and self.calls[0] <= now - 60:
+            self.calls.popleft()
+        while self.tokens and self.tokens[0][0] <= now - 3600:
+            self.token_total -= self.tokens.popleft()[1]
+        return len(self.calls), self.token_total
+
+    def add(self, now: float, tokens: int, call: bool = False):
+        if call:
+            self.calls.append(now)
+        self.tokens.append((now, tokens))
+        self.token_total += tokens
+
+def _usage_count(response, field: str, fallback: int) -> int:
+    """Token count reported by the API (response.usage_metadata), or our estimate when it is missing."""
+    count = getattr(getattr(response, "usage_metadata", None), field, None)
+    return count if isinstance(count, int) and count > 0 else fallback
+
+def _text_of(response) -> str:
+    try:
+        return response.text or ""
+    except ValueError:  # responses without text parts (e.g. safety blocks)
+        return ""
+
+class LLMGateway:
+    """The single path to Gemini: prompt size limits, per-user and global budgets, usage accounting and resilience.
+
+    Usage (calls, input/output tokens, estimated cost) is kept per (call site, tool, user) and also
+    exported as llm.* counters. Budgets are checked with the prompt's estimated size before the call;
+    the output tokens are charged when the call finishes.
+
+    At most `max_concurrency` requests are in flight. Each call has one deadline covering the wait for
+    a slot, every attempt and the backoff between them; 429/5xx/timeouts are retried with jittered
+    backoff and feed a circuit breaker, which makes calls fail fast with LLMUnavailable while open.
+    """
+    def __init__(self, max_prompt_tokens: int = LLM_MAX_PROMPT_TOKENS, oversize: str = LLM_OVERSIZE_PROMPTS,
+                 user_limits=(LLM_USER_CALLS_PER_MINUTE, LLM_USER_TOKENS_PER_HOUR),
+                 global_limits=(LLM_GLOBAL_CALLS_PER_MINUTE, LLM_GLOBAL_TOKENS_PER_HOUR),
+                 costs_per_mtok=(LLM_INPUT_COST_PER_MTOK, LLM_OUTPUT_COST_PER_MTOK), max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 deadline: float = LLM_CALL_DEADLINE, retry_policy: RetryPolicy = None, breaker: CircuitBreaker = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_prompt_tokens, self.oversize = max_prompt_tokens, oversize
+        self.user_limits, self.global_limits, self.costs_per_mtok = user_limits, global_limits, costs_per_mtok
+        self.deadline = deadline
+        self.retry_policy = retry_policy or RetryPolicy(LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+        self.breaker = breaker or CircuitBreaker("gemini", LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._clock, self._sleep = clock, sleep
+        self._lock = threading.Lock()
+        self._global = _Usage()
+        self._users = collections.defaultdict(_Usage)
+        self._totals = {}
+
+    def fit_prompt(self, prompt: str) -> str:
+        """Returns the prompt, cut in the middle (where the data sits) if it is over the size limit."""
+        tokens = estimate_tokens(prompt)
+        if tokens <= self.max_prompt_tokens:
+            return prompt
+        if self.oversize == "reject":
+            increment("llm.rejected", reason="prompt_size")
+            raise LLMBudgetExceeded(f"That request needs more data than I can analyse in one go (about {tokens:,} tokens; the limit is {self.max_prompt_tokens:,}). Please narrow it down, e.g. to one market or month.")
+        keep = self.max_prompt_tokens * 2  # characters kept from each end, ~4 characters per token
+        logger.warning(f"Prompt of ~{tokens:,} tokens exceeds LLM_MAX_PROMPT_TOKENS ({self.max_prompt_tokens:,}); truncating.")
+        increment("llm.truncated_prompts")
+        return f"{prompt[:keep]}\n[... {len(prompt) - 2 * keep:,} characters of data omitted ...]\n{prompt[-keep:]}"
+
+    def _holders(self, user: str):
+        holders = [(self._global, self.global_limits, "The team's")]
+        if user:
+            holders.append((self._users[user], self.user_limits, "Your"))
+        return holders
+
+    def _admit(self, user: str, tokens: int):
+        now = self._clock()
+        with self._lock:
+            holders = self._holders(user)
+            for usage, (max_calls, max_tokens), whose in holders:
+                calls, used = usage.totals(now)
+                if max_calls and calls >= max_calls:
+                    increment("llm.rejected", reason="rate")
+                    raise LLMBudgetExceeded(f"{whose} AI request limit ({max_calls} per minute) has been reached. Please try again in a minute.")
+                if max_tokens and used + tokens > max_tokens:
+                    increment("llm.rejected", reason="tokens")
+                    raise LLMBudgetExceeded(f"{whose} hourly AI usage budget ({max_tokens:,} tokens) has been used up. Please try again later.")
+            for usage, _, _ in holders:
+                usage.add(now, tokens, call=True)
+
+    def _record(self, site: str, tool: str, user: str, admitted: int, input_tokens: int, output_tokens: int):
+        in_cost, out_cost = self.costs_per_mtok
+        cost = (input_tokens * in_cost + output_tokens * out_cost) / 1_000_000
+        now = self._clock()
+        with self._lock:
+            for usage, _, _ in self._holders(user):
+                usage.add(now, input_tokens - admitted + output_tokens)
+            totals = self._totals.setdefault((site, tool, user), {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            totals["cost_usd"] += cost
+        increment("llm.calls", site=site)
+        increment("llm.input_tokens", input_tokens, site=site)
+        increment("llm.output_tokens", output_tokens, site=site)
+        increment("llm.cost_usd", cost, site=site)
+        logger.info(f"LLM call at {site} (tool {tool or '-'}, user {user or '-'}): {input_tokens:,} input + {output_tokens:,} output tokens, ~${cost:.5f}")
+
+    def generate(self, prompt: str, site: str, stream: bool = False):
+        """Sends the prompt to Gemini after the size and budget checks.
+
+        Returns the response, or with stream=True an iterator over its chunks; usage is recorded when
+        the stream is exhausted or closed. Raises LLMBudgetExceeded before calling when over a limit.
+        """
+        user, tool = _llm_user.get(), current_labels().get("tool", "")
+        prompt = self.fit_prompt(prompt)
+        admitted = estimate_tokens(prompt)
+        self._admit(user, admitted)
+        response = self._send(prompt, stream)
+        if not stream:
+            self._slots.release()
+            self._record(site, tool, user, admitted, _usage_count(response, "prompt_token_count", admitted),
+                         _usage_count(response, "candidates_token_count", estimate_tokens(_text_of(response))))
+            return response
+        chunks = self._accounted_stream(response, site, tool, user, admitted)
+        next(chunks)  # start the generator, so closing or dropping it always runs its cleanup
+        return chunks
+
+    def _send(self, prompt: str, stream: bool):
+        """Starts the request under the concurrency limit, deadline, retry policy and breaker; the caller must release the slot."""
+        if self.breaker.state == "open":
+            increment("llm.rejected", reason="circuit_open")
+            raise LLMUnavailable(DEGRADED_MESSAGE)
+        deadline = Deadline(self.deadline, self._clock)
+        with span("llm.slot_wait"):
+            acquired = self._slots.acquire(timeout=deadline.remaining())
+        if not acquired:
+            increment("llm.rejected", reason="busy")
+            raise LLMUnavailable(DEGRADED_MESSAGE)
+        options = {"stream": True} if stream else {}
+        try:
+            return call_with_retries(lambda timeout: config.gemini_model.generate_content(prompt, **options, request_options={"timeout": timeout}),
+                                     self.retry_policy, deadline, is_retryable_llm_error, self.breaker, name="gemini", sleep=self._sleep)
+        except Exception as e:
+            self._slots.release()
+            if isinstance(e, (CircuitOpenError, DeadlineExceeded)) or is_retryable_llm_error(e):
+                logger.error(f"Gemini call failed: {e}")
+                raise LLMUnavailable(DEGRADED_MESSAGE) from e
+            raise
+
+    def _accounted_stream(self, chunks, site, tool, user, admitted):
+        text_length, last = 0, None
+        try:
+            yield  # priming point, see generate()
+            for chunk in chunks:
+                last = chunk
+                text_length += len(_text_of(chunk))
+                yield chunk
+        except Exception as e:
+            logger.error(f"Gemini stream failed: {e}")
+            if not is_retryable_llm_error(e):
+                raise LLMError(STREAM_FAILED_MESSAGE) from e  # e.g. a blocked or malformed chunk; not a service fault
+            self.breaker.record_failure()
+            raise LLMUnavailable(DEGRADED_MESSAGE) from e
+        finally:
+            self._slots.release()
+            self._record(site, tool, user, admitted, _usage_count(last, "prompt_token_count", admitted),
+                         _usage_count(last, "candidates_token_count", text_length // 4 + 1))
+
+    def usage(self, by=("site", "tool", "user")) -> list:
+        """Usage totals grouped by any of "site", "tool" and "user", most expensive first."""
+        grouped = {}
+        with self._lock:
+            for (site, tool, user), totals in self._totals.items():
+                group = {field: value for field, value in (("site", site), ("tool", tool), ("user", user)) if field in by}
+                row = grouped.setdefault(tuple(group.values()), {**group, "calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+                for name, value in totals.items():
+                    row[name] += value
+        return sorted(grouped.values(), key=lambda row: -row["cost_usd"])
+
+gateway = LLMGateway()
+
+# --- Generation ---
+def generate_text(prompt: str, site: str = "report") -> str:
+    """Runs a single, non-streaming generation and returns its text."""
+    with span("llm.generate", site=site):
+        return gateway.generate(prompt, site=site).text
+
+def _stream_chunks(prompt: str, site: str = "report"):
+    start, first = time.perf_counter(), True
+    with span("llm.stream", site=site):
+        for chunk in gateway.generate(prompt, site=site, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:  # chunks without text parts (e.g. safety metadata)
+                continue
+            if text:
+                if first:
+                    observe("llm.first_token", time.perf_counter() - start, site=site)
+                    first = False
+                yield text
+
+class SlackStreamWriter:
+    """Shows text in Slack as it arrives.
+
+    A placeholder message is posted first and then grown with chat_update, at most once per
+    min_interval seconds to stay inside Slack's rate limits. When a message passes max_length,
+    the text rolls over into a new message at its last newline (or mid-line if there is none).
+    """
+    def __init__(self, say, thread_ts, prefix: str = "", max_length: int = SLACK_MESSAGE_LIMIT, min_interval: float = STREAM_UPDATE_INTERVAL, clock=time.monotonic):
+        self.say, self.client, self.thread_ts = say, say.client, thread_ts
+        self.prefix, self.max_length, self.min_interval, self._clock = prefix, max_length, min_interval, clock
+        self.text = ""
+        self._current = ""
+        self._dirty = False
+        self._message = self._post("✍️ …")
+        self._last_update = self._clock()
+
+    def write(self, delta: str):
+        self.text += delta
+        self._current += delta
+        self._dirty = True
+        limit = self.max_length - len(self.prefix)
+        while len(self._current) > limit:
+            cut = self._current.rfind("\n", 0, limit) + 1 or limit
+            head, self._current = self._current[:cut], self._current[cut:]
+            self._update(head)
+            self._message = self._post(self._current[:limit])
+        if self._dirty and self._clock() - self._last_update >= self.min_interval:
+            self._update(self._current)
+
+    def close(self) -> str:
+        if self._dirty or not self._current:
+            self._update(self._current or "_(no response)_")
+        return self.text
+
+    def fail(self, notice: str):
+        """Ends the stream with notice, so a failed response never leaves the placeholder behind."""
+        try:
+            self._update(f"{self._current}\n\n{notice}" if self._current else notice)
+        except Exception as e:
+            logger.error(f"Could not post the stream failure notice to thread {self.thread_ts}: {e}")
+
+    def _post(self, text: str):
+        response = self.say(text=f"{self.prefix}{text}", thread_ts=self.thread_ts)
+        self._last_update = self._clock()
+        return response
+
+    def _update(self, text: str):
+        self.client.chat_update(channel=self._message['channel'], ts=self._message['ts'], text=f"{self.prefix}{text}")
+        self._last_update = self._clock()
+        self._dirty = False
+
+def can_stream(say) -> bool:
+    return STREAM_LLM_RESPONSES and getattr(say, 'client', None) is not None
+
+def generate_and_post(say, thread_ts, prompt: str, prefix: str = "", site: str = "report") -> str:
+    """Generates a response to prompt, posts it to the thread and returns the full text.
+
+    With streaming enabled (and a Bolt `say` that exposes its client), the reply is shown
+    incrementally; otherwise it is posted in Slack-sized chunks once generation finishes.
+    LLM errors (a spent budget, an unavailable service) are posted as their user-facing message;
+    any other error mid-stream replaces the placeholder with a notice and is re-raised.
+    """
+    if can_stream(say):
+        writer = SlackStreamWriter(say, thread_ts, prefix=prefix)
+        try:
+            for delta in _stream_chunks(prompt, site):
+                writer.write(delta)
+        except LLMError as e:
+            writer.write(f"\n\n{e}" if writer.text else str(e))
+        except Exception:
+            writer.fail(STREAM_FAILED_MESSAGE)
+            raise
+        logger.info(f"Streamed {len(writer.text)} characters to thread {thread_ts}")
+        return writer.close()
+
+    try:
+        text = generate_text(prompt, site)
+    except LLMError as e:
+        text = str(e)
+    for chunk in split_message_for_slack(text):
+        say(text=f"{prefix}{chunk}", thread_ts=thread_ts)
+    return text
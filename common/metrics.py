@@ -0,0 +1,198 @@
+# ================================================
+# FILE: common/metrics.py
+# PURPOSE: Per-stage latency spans, counters and a local metrics endpoint
+# ================================================
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import logger, METRICS_WINDOW
+
+# Labels that apply to every span recorded in the current request (e.g. tool and market).
+# Jobs run in a copy of the submitting context, so labels set in one request never leak into another.
+_request_labels = contextvars.ContextVar("metric_labels", default={})
+
+def set_labels(**labels):
+    """Adds labels (None values are ignored) to all spans recorded later in the current request."""
+    _request_labels.set({**_request_labels.get(), **{k: str(v) for k, v in labels.items() if v is not None}})
+
+def current_labels() -> dict:
+    return dict(_request_labels.get())
+
+class LatencyWindow:
+    """Count, sum and max over all samples, plus a sliding window of recent samples for percentiles."""
+    def __init__(self, window: int):
+        self.count, self.total, self.max = 0, 0.0, 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.recent)
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)] if ordered else 0.0
+        return {"count": self.count, "sum": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99), "max": self.max}
+
+class MetricsRegistry:
+    """Thread-safe store of duration histograms and counters, keyed by name and labels."""
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = collections.Counter()
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, {**current_labels(), **labels})
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = LatencyWindow(self.window)
+            series.add(seconds)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            self._counters[self._key(name, {**current_labels(), **labels})] += amount
+
+    @contextlib.contextmanager
+    def span(self, name: str, **labels):
+        """Times the block as one sample of `name`; failed blocks are recorded with status="error"."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, status=status, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = [{"name": name, "labels": dict(labels), **series.summary()} for (name, labels), series in self._histograms.items()]
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self._counters.items()]
+        return {"histograms": sorted(histograms, key=lambda h: (h["name"], sorted(h["labels"].items()))),
+                "counters": sorted(counters, key=lambda c: (c["name"], sorted(c["labels"].items())))}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text format: histograms as summaries (seconds) with p50/p95/p99 over the recent window."""
+        def metric_name(name):
+            return "nova_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+        def label_str(labels, **extra):
+            items = {**labels, **extra}
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in sorted(items.items())) + "}" if items else ""
+
+        snapshot, lines = self.snapshot(), []
+        for h in snapshot["histograms"]:
+            name = metric_name(h["name"]) + "_seconds"
+            for q in ("p50", "p95", "p99"):
+                lines.append(f'{name}{label_str(h["labels"], quantile="0." + q[1:])} {h[q]:.6f}')
+            lines.append(f'{name}_count{label_str(h["labels"])} {h["count"]}')
+            lines.append(f'{name}_sum{label_str(h["labels"])} {h["sum"]:.6f}')
+        for c in snapshot["counters"]:
+            lines.append(f'{metric_name(c["name"])}_total{label_str(c["labels"])} {c["value"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+registry = MetricsRegistry()
+observe, increment, span = registry.observe, registry.increment, registry.span
+
+def timed(name: str, **labels):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- Slack call instrumentation ---
+class InstrumentedClient:
+    """Wraps a Slack WebClient so every API method call is timed as slack.<method>."""
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with span(f"slack.{name}"):
+                return attr(*args, **kwargs)
+        return call
+
+class InstrumentedSay:
+    """Wraps Bolt's `say` so posts are timed as slack.say; `.client` is instrumented too."""
+    def __init__(self, say):
+        self._say = say
+        client = getattr(say, "client", None)
+        self.client = InstrumentedClient(client) if client is not None else None
+
+    def __call__(self, *args, **kwargs):
+        with span("slack.say"):
+            return self._say(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._say, name)
+
+# --- Export ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves /metrics (Prometheus text) and /metrics.json on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def format_summary() -> str:
+    lines = []
+    for h in registry.snapshot()["histograms"]:
+        labels = ",".join(f"{k}={v}" for k, v in sorted(h["labels"].items()))
+        lines.append(f"{h['name']}[{labels}] n={h['count']} p50={h['p50'] * 1000:.0f}ms p95={h['p95'] * 1000:.0f}ms p99={h['p99'] * 1000:.0f}ms max={h['max'] * 1000:.0f}ms")
+    return "\n".join(lines)
+
+def start_periodic_dump(interval: float) -> threading.Event:
+    """Logs a latency summary every `interval` seconds; set the returned event to stop."""
+    stop = threading.Event()
+    def run():
+        while not stop.wait(interval):
+            if summary := format_summary():
+                logger.info(f"Latency summary:\n{summary}")
+    threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+    return stop
@@ -0,0 +1,345 @@
+# ================================================
+# FILE: common/parsing.py
+# PURPOSE: Market normalization and a deterministic parser for structured slash-command input
+# ================================================
+import re
+import calendar
+from datetime import date
+
+MARKET_MAP = {
+    "uk": "UK",
+    "united kingdom": "UK",
+    "gb": "UK",
+    "great britain": "UK",
+    "france": "France",
+    "fr": "France",
+    "sweden": "Sweden",
+    "se": "Sweden",
+    "norway": "Norway",
+    "no": "Norway",
+    "denmark": "Denmark",
+    "dk": "Denmark",
+    "nordics": "Nordics",
+}
+
+# "jun", "june" -> 6 (plus "sept", which people type more often than "sep")
+MONTHS = {name.lower(): i for i in range(1, 13) for name in (calendar.month_name[i], calendar.month_abbr[i])}
+MONTHS["sept"] = 9
+
+TIER_NAMES = ("gold", "silver", "bronze")
+
+_DATE = r"\d{4}-\d{2}-\d{2}"
+_MARKET = r"[A-Za-z][A-Za-z .]*?"
+_RANGE_RE = re.compile(rf"^(?P<market>{_MARKET})[\s\-]+(?:from\s+)?(?P<start>{_DATE})(?:\s+(?:to|until|-)\s+(?P<end>{_DATE}))?$", re.IGNORECASE)
+_WEEK_RE = re.compile(rf"^(?P<market>{_MARKET})[\s\-]+(?:week|wk)[\s\-]*(?P<week>\d{{1,2}})(?:[\s,\-]+(?P<year>\d{{4}}))?$", re.IGNORECASE)
+_YEAR_RE = re.compile(r"^\d{4}$")
+
+def normalize_market_name(market_name: str) -> str:
+    if not market_name or not isinstance(market_name, str):
+        return market_name
+
+    market_lower = market_name.strip().lower()
+    return MARKET_MAP.get(market_lower, market_name.strip().capitalize())
+
+def month_params(month_token: str) -> dict:
+    """Returns month_abbr/month_full for a month name or abbreviation, or {} if it is not a month."""
+    month = MONTHS.get(month_token.strip().lower())
+    if not month:
+        return {}
+    return {"month_abbr": calendar.month_abbr[month], "month_full": calendar.month_name[month]}
+
+def is_known_market(name: str) -> bool:
+    """True for a MARKET_MAP alias or canonical market name ("uk", "United Kingdom", "Nordics")."""
+    return bool(name) and " ".join(name.split()).lower() in MARKET_MAP
+
+def _is_market_token(tokens: list) -> bool:
+    return bool(tokens) and is_known_market(" ".join(tokens))
+
+def parse_market_month_year(text: str):
+    """Parses `Market-Month-Year` (dashes or spaces, year optional) into routing parameters."""
+    tokens = [t for t in re.split(r"[\s\-]+", text.strip()) if t]
+    month_index = next((i for i, t in enumerate(tokens) if i > 0 and month_params(t)), None)
+    if month_index is None or not _is_market_token(tokens[:month_index]):
+        return None
+    rest = tokens[month_index + 1:]
+    if len(rest) > 1 or (rest and not _YEAR_RE.match(rest[0])):
+        return None
+
+    params = {"market": normalize_market_name(" ".join(tokens[:month_index])), **month_params(tokens[month_index])}
+    if rest:
+        params["year"] = int(rest[0])
+    return params
+
+def parse_weekly_review(text: str):
+    """Parses `UK week 36 [2025]`, `UK from 2025-06-01 to 2025-06-07` or `UK 2025-06-01` into (tool_name, params)."""
+    text = text.strip()
+    if match := _WEEK_RE.match(text):
+        week_number = int(match["week"])
+        if not 1 <= week_number <= 53:
+            return None
+        if not is_known_market(match["market"]):
+            return None
+        params = {"market": normalize_market_name(match["market"]), "week_number": week_number}
+        if match["year"]:
+            params["year"] = int(match["year"])
+        return "weekly-review-by-number", params
+
+    if match := _RANGE_RE.match(text):
+        try:
+            start = date.fromisoformat(match["start"])
+            end = date.fromisoformat(match["end"] or match["start"])
+        except ValueError:
+            return None
+        if end < start or not is_known_market(match["market"]):
+            return None
+        return "weekly-review-by-range", {"market": normalize_market_name(match["market"]), "start_date": start.isoformat(), "end_date": end.isoformat(), "year": start.year}
+    return None
+
+def parse_trend_filters(text: str):
+    """Parses optional `Market[-Month][-Year]` and tier filters for the trend leaderboard."""
+    params, market_tokens = {}, []
+    for token in (t for t in re.split(r"[\s\-]+", text.strip()) if t):
+        if _YEAR_RE.match(token) and "year" not in params:
+            params["year"] = int(token)
+        elif token.lower() in TIER_NAMES and "tier" not in params:
+            params["tier"] = token.lower()
+        elif market_tokens and month_params(token) and "month_full" not in params:
+            params.update(month_params(token))
+        elif token.isalpha() and "month_full" not in params and "year" not in params:
+            market_tokens.append(token)
+        else:
+            return None
+    if market_tokens and not _is_market_token(market_tokens):
+        return None
+    if market_tokens:
+        params["market"] = normalize_market_name(" ".join(market_tokens))
+    return params
+
+def parse_slash_command(command: str, text: str):
+    """Routes structured slash-command input without the LLM.
+
+    Returns a routing decision shaped like the LLM router's ({"tool_name", "parameters"}),
+    or None when the text does not match the command's documented format.
+    """
+    text = (text or "").strip()
+    if command in ("monthly-review", "plan"):
+        params = parse_market_month_year(text)
+        return {"tool_name": command, "parameters": params} if params else None
+    if command == "weekly-review":
+        parsed = parse_weekly_review(text)
+        return {"tool_name": parsed[0], "parameters": parsed[1]} if parsed else None
+    if command == "analyse-influencer":
+        return {"tool_name": "analyse-influencer", "parameters": {"influencer_name": text}} if text else None
+    if command == "influencer-trend":
+        params = parse_trend_filters(text)
+        return {"tool_name": "influencer-trend", "parameters": params} if params is not None else None
+    return None
+
+# --- Thread intent pre-classification ---
+FOLLOW_UP, NEW_COMMAND = "follow-up", "new_command"
+
+_MONTH_RE = re.compile(r"\b(" + "|".join(sorted((m for m in MONTHS if m != "may"), key=len, reverse=True)) + r")\b|\bmay(?=\s+(?:\d{1,2}\b|\d{4}\b))", re.IGNORECASE)
+_WEEK_MENTION_RE = re.compile(r"\b(?:week|wk)\s*#?\s*(\d{1,2})\b", re.IGNORECASE)
+_ISO_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_YEAR_MENTION_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+_DAY_OF_MONTH_RE = re.compile(rf"\b(?:(?:{_MONTH_NAMES})\.?\s+\d{{1,2}}(?:st|nd|rd|th)?\b|\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:{_MONTH_NAMES})\b)", re.IGNORECASE)
+_QUESTION_RE = re.compile(r"\?\s*$|^\s*(?:what|which|who|whom|why|how|where|when|is|are|was|were|do|does|did|can|could|would|should|will|tell|explain|list|show|give|summari[sz]e|break)\b", re.IGNORECASE)
+# Words that suggest a different tool; these are ambiguous on their own and are left to the LLM.
+_TOOL_KEYWORDS = {
+    "strategic_plan": re.compile(r"\b(?:plan|allocat\w*)\b", re.IGNORECASE),
+    "influencer_trend": re.compile(r"\b(?:trends?|leaderboards?)\b", re.IGNORECASE),
+    "influencer_analysis": re.compile(r"\b(?:analy[sz]e|deep[- ]dive)\b", re.IGNORECASE),
+    "monthly_review": re.compile(r"\bmonthly\b", re.IGNORECASE),
+    "weekly_review": re.compile(r"\bweekly\b", re.IGNORECASE),
+}
+
+def extract_markets(text: str, codes: bool = True) -> set:
+    """Finds market mentions. Two-letter codes other than "uk" only count in upper case ("NO", not "no"),
+    and not at all with codes=False, since "NO" or "SE" may just be a shouted word.
+    """
+    found = set()
+    for alias, market in MARKET_MAP.items():
+        flags = re.IGNORECASE if len(alias) > 2 or alias == "uk" else 0
+        if not (flags or codes):
+            continue
+        pattern = alias if flags else alias.upper()
+        if re.search(rf"\b{re.escape(pattern)}\b", text, flags):
+            found.add(market)
+    return found
+
+def extract_months(text: str, abbreviations: bool = True) -> set:
+    """Finds month mentions; with abbreviations=False only full names count ("January", not "Jan", which may be a name)."""
+    months = {month_params(m.group(0).split()[0])["month_full"] for m in _MONTH_RE.finditer(text)}
+    if abbreviations:
+        return months
+    return {m for m in months if re.search(rf"\b{m}\b", text, re.IGNORECASE)}
+
+def extract_week_numbers(text: str) -> set:
+    return {str(int(w)) for w in _WEEK_MENTION_RE.findall(text)}
+
+def mentions_specific_date(text: str) -> bool:
+    return bool(_ISO_DATE_RE.search(text) or _DAY_OF_MONTH_RE.search(text))
+
+def extract_dates(text: str, default_year):
+    """Returns the dates mentioned ("2025-06-03", "June 3", "3rd of June"), or None if one can't be resolved.
+
+    Dates without a year take the single year mentioned in the text, else default_year.
+    """
+    years = set(_YEAR_MENTION_RE.findall(text))
+    year = int(years.pop()) if len(years) == 1 else default_year
+    found = set()
+    try:
+        found.update(date.fromisoformat(d) for d in _ISO_DATE_RE.findall(text))
+        for m in _DAY_OF_MONTH_RE.finditer(text):
+            month = next(MONTHS[t] for t in re.findall(r"[a-z]+", m.group(0).lower()) if t in MONTHS)
+            day = int(re.search(r"\d{1,2}", m.group(0)).group(0))
+            if not year:
+                return None
+            found.add(date(int(year), month, day))
+    except ValueError:
+        return None
+    return found
+
+def _context_dates(params: dict):
+    try:
+        return date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _context_period(params: dict):
+    """The (first, last) day a review covers, from its date range or its month and year."""
+    if dates := _context_dates(params):
+        return dates
+    month, year = MONTHS.get(str(params.get("month_full", "")).lower()), params.get("year")
+    if not (month and year):
+        return None
+    return date(int(year), month, 1), date(int(year), month, calendar.monthrange(int(year), month)[1])
+
+def _week_days(week: str, year):
+    try:
+        start = date.fromisocalendar(int(year), int(week), 1)
+    except (TypeError, ValueError):
+        return None
+    return start, date.fromordinal(start.toordinal() + 6)
+
+def classify_thread_intent(user_message: str, context: dict):
+    """Decides follow-up vs. new command from the message alone when the answer is unambiguous.
+
+    A different market, month, week number, year or date range means a new command; a plain question
+    with none of those means a follow-up. A mention of something the context has no value for (a
+    month in an influencer thread, say) can't be judged locally. Returns None when the LLM should decide.
+    """
+    params = context.get("params") or {}
+    context_type = context.get("type", "")
+    date_range = _context_dates(params)
+    undecided = False
+
+    # Only full market and month names decide locally; a different code ("NO") or abbreviation ("Jan") goes to the LLM.
+    if markets := extract_markets(user_message):
+        current = {normalize_market_name(params.get("market"))} if params.get("market") else None
+        if current is None:
+            undecided = True
+        elif markets != current:
+            if extract_markets(user_message, codes=False) - current:
+                return NEW_COMMAND
+            undecided = True
+    if months := extract_months(user_message):
+        if date_range:
+            current = {calendar.month_name[m] for m in range(date_range[0].month, date_range[1].month + 1)} if date_range[0].year == date_range[1].year else None
+        else:
+            current = {str(params["month_full"]).capitalize()} if params.get("month_full") else None
+        if current is None:
+            undecided = True
+        elif not months <= current:
+            if extract_months(user_message, abbreviations=False) - current:
+                return NEW_COMMAND
+            undecided = True
+    if weeks := extract_week_numbers(user_message):
+        if not params.get("week_number"):
+            # A week outside the period the review covers is a new request; one inside it may be a follow-up.
+            period = _context_period(params)
+            spans = [_week_days(w, period[0].year) for w in weeks] if period else []
+            if spans and all(span and (span[1] < period[0] or span[0] > period[1]) for span in spans):
+                return NEW_COMMAND
+            undecided = True
+        elif weeks != {str(params["week_number"])}:
+            return NEW_COMMAND
+    if years := set(_YEAR_MENTION_RE.findall(user_message)):
+        context_years = {str(d.year) for d in date_range} if date_range else {str(params["year"])} if params.get("year") else set()
+        if not context_years:
+            undecided = True
+        elif not years <= context_years:
+            return NEW_COMMAND
+    if mentions_specific_date(user_message):
+        dates = extract_dates(user_message, date_range[0].year if date_range else params.get("year"))
+        if date_range:
+            if dates is None:
+                undecided = True
+            elif not all(date_range[0] <= d <= date_range[1] for d in dates):
+                return NEW_COMMAND
+        elif dates is None or len(dates) < 2:
+            undecided = True
+        else:
+            return NEW_COMMAND  # a date range asked of a review that has none is a new range review
+    if undecided:
+        return None
+
+    if context_type == "strategic_plan" and parse_scenario_request(user_message):
+        return FOLLOW_UP
+    if any(pattern.search(user_message) for tool_type, pattern in _TOOL_KEYWORDS.items() if not context_type.startswith(tool_type)):
+        return None
+    if _QUESTION_RE.search(user_message):
+        return FOLLOW_UP
+    return None
+
+# --- Plan what-if scenarios ---
+MAX_SCENARIOS = 12
+_SCENARIO_SUBJECT_RE = re.compile(r"\b(budget|cac)\b", re.IGNORECASE)
+_SCENARIO_CUE_RE = re.compile(r"\b(?:what\s+if|what\s+about|how\s+about|suppose|assum\w*|scenarios?|instead|try|if\s+(?:the\s+|our\s+|we\s+had\s+(?:a\s+)?)?(?:budget|cac)|with\s+(?:a\s+)?(?:budget|cac))\b", re.IGNORECASE)
+_AMOUNT = r"[€$£]?\d[\d,]*(?:\.\d+)?(?:\s*[km]\b)?(?![\d.,]|\s*%)"
+_PERCENT = r"[+-]?\d+(?:\.\d+)?\s*%"
+_LIST = r"{0}(?:\s*(?:,|or|and)\s*{0})*"
+# "budget of 50k", "CAC to 40 or 60", "the budget was €2,000,000"
+_SCENARIO_AMOUNT_RE = re.compile(rf"\b(?P<subject>budget|cac)\s+(?:(?:is|was|were|be)\s+(?:(?:of|to|at)\s+)?|(?:of|to|at|=)\s+)(?P<values>{_LIST.format(_AMOUNT)})", re.IGNORECASE)
+# "20% higher", "10% and 25% lower"
+_SCENARIO_PERCENT_DIRECTION_RE = re.compile(rf"(?P<values>{_LIST.format(_PERCENT)})\s+(?:(?P<up>higher|more|bigger|larger|up)|(?P<down>lower|less|smaller|down))\b", re.IGNORECASE)
+# "cut the budget by 10% and 25%", "raise CAC by 5%"
+_SCENARIO_PERCENT_BY_RE = re.compile(rf"\b(?:(?P<up>rais\w*|increas\w*|boost\w*|grow\w*)|(?P<down>cut\w*|reduc\w*|lower\w*|decreas\w*|drop\w*))\s+(?:(?:the|our)\s+)?(?:budget|cac)\s+by\s+(?P<values>{_LIST.format(_PERCENT)})", re.IGNORECASE)
+_YEAR_AMOUNT_RE = re.compile(r"^(?:19|20)\d{2}$")
+
+def _scenario_amount(token: str):
+    """50k -> 50000.0; None for a bare year, which is a date rather than an amount."""
+    number = re.sub(r"[€$£,\s]", "", token).lower()
+    multiplier = {"k": 1e3, "m": 1e6}.get(number[-1], 1)
+    number = number.rstrip("km")
+    if multiplier == 1 and _YEAR_AMOUNT_RE.match(number):
+        return None
+    return float(number) * multiplier
+
+def parse_scenario_request(text: str):
+    """Finds what-if budget and CAC variants, e.g. "what if budget was 20% higher" or "CAC of 40 or 60".
+
+    Only explicit forms count: "budget/CAC of|to|at|was X" (with a what-if cue such as "what if" or
+    "suppose"), "N% higher/lower", and "cut/raise the budget by N%". Other numbers in the message
+    (years, "top 3") are ignored. Percentages go to the nearest "budget"/"cac" mention. Returns
+    {"budget": [...], "cac": [...]} with ("pct", signed_change) or ("abs", value) entries, or None.
+    """
+    subjects = [(m.start(), m.group(1).lower()) for m in _SCENARIO_SUBJECT_RE.finditer(text)]
+    if not subjects:
+        return None
+    nearest = lambda pos: min(subjects, key=lambda item: abs(item[0] - pos))[1]
+
+    variants = {"budget": [], "cac": []}
+    if _SCENARIO_CUE_RE.search(text):
+        for m in _SCENARIO_AMOUNT_RE.finditer(text):
+            amounts = (_scenario_amount(v) for v in re.findall(_AMOUNT, m["values"], re.IGNORECASE))
+            variants[m["subject"].lower()].extend(("abs", a) for a in amounts if a is not None)
+    for pattern in (_SCENARIO_PERCENT_DIRECTION_RE, _SCENARIO_PERCENT_BY_RE):
+        for m in pattern.finditer(text):
+            direction = -1 if m["down"] else 1
+            subject = nearest(m.start("values"))
+            for value in re.findall(r"([+-]?)(\d+(?:\.\d+)?)\s*%", m["values"]):
+                sign = {"-": -1, "+": 1}.get(value[0], direction)
+                variants[subject].append(("pct", sign * float(value[1])))
+    return variants if any(variants.values()) else None
@@ -0,0 +1,131 @@
+# ================================================
+# FILE: common/resilience.py
+# PURPOSE: Deadlines, retries with jittered backoff and circuit breakers for calls to external services
+# ================================================
+import random
+import threading
+import time
+from .config import logger
+from .metrics import increment
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+def error_status(error):
+    """The HTTP status carried by an exception (Google API errors' .code, requests' response), if any."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class Deadline:
+    """A point in time shared by all attempts of one call."""
+    def __init__(self, seconds: float, clock=time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+class RetryPolicy:
+    """Up to `attempts` tries, waiting a random 0..min(max_delay, base_delay * 2**n) between them (full jitter)."""
+    def __init__(self, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0, rng=random.random):
+        self.attempts, self.base_delay, self.max_delay = max(1, attempts), base_delay, max_delay
+        self._rng = rng
+
+    def delay(self, retry: int) -> float:
+        return self._rng() * min(self.max_delay, self.base_delay * 2 ** retry)
+
+class CircuitBreaker:
+    """Fails fast after repeated failures of a dependency.
+
+    Closed: calls go through. After `failure_threshold` consecutive failures the circuit opens and
+    calls are refused for `reset_timeout` seconds. Then it is half-open: one trial call is let
+    through, and its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.name, self.failure_threshold, self.reset_timeout = name, failure_threshold, reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.times_opened = 0
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if self._clock() - self._opened_at < self.reset_timeout else "half_open"
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now. In the half-open state only one trial call is allowed at a time."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit '{self.name}' closed again.")
+            self._failures, self._opened_at, self._trial_running = 0, None, False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at, self._trial_running = self._clock(), False
+                self.times_opened += 1
+                logger.warning(f"Circuit '{self.name}' opened after {self._failures} consecutive failures; failing fast for {self.reset_timeout:.0f}s.")
+                increment("circuit.opened", circuit=self.name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._failures, "times_opened": self.times_opened}
+
+def call_with_retries(fn, policy: RetryPolicy, deadline: Deadline, is_retryable, breaker: CircuitBreaker = None, name: str = "call", sleep=time.sleep):
+    """Calls fn(timeout) until it succeeds, where timeout is the time left before the deadline.
+
+    Retryable errors are retried per the policy while the deadline allows, and count as breaker
+    failures; other errors mean the service answered, so they count as a success and are raised at once.
+    Raises CircuitOpenError when the breaker refuses an attempt and DeadlineExceeded when no time is left.
+    """
+    for attempt in range(policy.attempts):
+        if deadline.expired:
+            raise DeadlineExceeded(f"{name}: deadline exceeded before attempt {attempt + 1}")
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"{name}: circuit '{breaker.name}' is open")
+        try:
+            result = fn(deadline.remaining())
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None:
+                breaker.record_failure() if retryable else breaker.record_success()
+            delay = policy.delay(attempt)
+            if not retryable or attempt + 1 >= policy.attempts or delay >= deadline.remaining():
+                raise
+            logger.warning(f"{name} attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+            increment("retries", call=name)
+            sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -0,0 +1,182 @@
+# ================================================
+# FILE: common/shared_state.py
+# PURPOSE: State shared between bot worker processes: caches and per-thread locks
+# ================================================
+import contextlib
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from .config import logger, SHARED_STATE_PATH, THREAD_LOCK_LEASE
+from .cache import TTLCache
+
+class SQLiteBackend:
+    """Base for SQLite-backed state: one connection per Python thread, WAL mode for concurrent processes."""
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections may not be shared across threads, so each worker thread gets its own.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT/ROLLBACK; takes the write lock up front so concurrent writers queue instead of deadlocking."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+class SQLiteTTLCache(SQLiteBackend, TTLCache):
+    """TTLCache whose entries live in a SQLite file, so every worker process on the host shares them.
+
+    Expiry uses wall-clock time because processes do not share a monotonic clock. Single-flight
+    loading still applies within each process.
+    """
+    def __init__(self, path: str, max_bytes: int, name: str = "cache", clock=time.time):
+        if not re.fullmatch(r"\w+", name):
+            raise ValueError(f"Invalid cache name: {name!r}")
+        SQLiteBackend.__init__(self, path)
+        TTLCache.__init__(self, max_bytes, name=name, clock=clock)
+        self._table = f"cache_{name}"
+        with self._transaction() as db:
+            db.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+
+    def set(self, key, value, ttl: float, size: int = None):
+        size = size if size is not None else len(key) + len(value)
+        with self._lock, self._transaction() as db:
+            db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+            if ttl <= 0 or size > self.max_bytes:
+                return
+            now = self._clock()
+            db.execute(f"INSERT INTO {self._table} VALUES (?, ?, ?, ?, ?)", (key, value, size, now + ttl, now))
+            total = db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self._table}").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            db.execute(f"DELETE FROM {self._table} WHERE expires_at <= ?", (now,))
+            for old_key, old_size in db.execute(f"SELECT key, size FROM {self._table} WHERE key != ? ORDER BY last_access", (key,)).fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute(f"DELETE FROM {self._table} WHERE key = ?", (old_key,))
+                total -= old_size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self._table}")
+            self._stats.clear()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        entries, total = self._connect().execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self._table}").fetchone()
+        return {**stats, "entries": entries, "bytes": total, "backend": "sqlite"}
+
+    def _get_locked(self, key):
+        db = self._connect()
+        row = db.execute(f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+        now = self._clock()
+        if row[1] <= now:
+            db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+        db.execute(f"UPDATE {self._table} SET last_access = ? WHERE key = ?", (now, key))
+        self._stats["hits"] += 1
+        return row[0]
+
+    def _pop_locked(self, key):
+        self._connect().execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+class LocalThreadLocks:
+    """Per-thread locks for a single bot process."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # thread_ts -> [lock, holders + waiters]
+
+    @contextlib.contextmanager
+    def hold(self, thread_ts: str, timeout: float = 0.0):
+        """Holds the lock for thread_ts for the duration of the block; yields False if it timed out."""
+        with self._lock:
+            entry = self._locks.setdefault(thread_ts, [threading.Lock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[thread_ts]
+
+class SQLiteThreadLocks(SQLiteBackend):
+    """Per-thread locks shared by every process using the same SQLite file.
+
+    Locks are leases: if a worker dies while holding one, it expires after `lease` seconds.
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, path: str, lease: float = THREAD_LOCK_LEASE):
+        super().__init__(path)
+        self.lease = lease
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS thread_locks (thread_ts TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _try_acquire(self, thread_ts: str, owner: str) -> bool:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("DELETE FROM thread_locks WHERE thread_ts = ? AND expires_at <= ?", (thread_ts, now))
+            return db.execute("INSERT OR IGNORE INTO thread_locks VALUES (?, ?, ?)", (thread_ts, owner, now + self.lease)).rowcount == 1
+
+    @contextlib.contextmanager
+    def hold(self, thread_ts: str, timeout: float = 0.0):
+        """Holds the lock for thread_ts for the duration of the block; yields False if it timed out."""
+        owner = f"{self.owner_prefix}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + timeout
+        while not (acquired := self._try_acquire(thread_ts, owner)) and time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._connect().execute("DELETE FROM thread_locks WHERE thread_ts = ? AND owner = ?", (thread_ts, owner))
+
+def shared_state_enabled() -> bool:
+    return bool(SHARED_STATE_PATH)
+
+def ensure_parent_dir(path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+def create_cache(max_bytes: int, name: str) -> TTLCache:
+    """Returns a process-local TTLCache, or a SQLite-backed one in shared-state mode."""
+    if shared_state_enabled():
+        ensure_parent_dir(SHARED_STATE_PATH)
+        return SQLiteTTLCache(SHARED_STATE_PATH, max_bytes, name=name)
+    return TTLCache(max_bytes, name=name)
+
+def create_thread_locks():
+    """Returns per-thread locks that span processes in shared-state mode, or local locks otherwise."""
+    if shared_state_enabled():
+        ensure_parent_dir(SHARED_STATE_PATH)
+        logger.info(f"Shared-state mode: thread locks, contexts and caches in {SHARED_STATE_PATH}")
+        return SQLiteThreadLocks(SHARED_STATE_PATH)
+    return LocalThreadLocks()
@@ -0,0 +1,41 @@
+# ================================================
+# FILE: common/startup.py
+# PURPOSE: Deferred imports and a start-up import cost report
+# ================================================
+import importlib
+import sys
+import time
+from .config import logger
+
+def lazy_function(module_name: str, name: str):
+    """Returns a stand-in for module_name.name that imports the module on its first call."""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), name)(*args, **kwargs)
+    call.__name__ = call.__qualname__ = name
+    call.__module__ = module_name
+    return call
+
+def timed_imports(module_names) -> dict:
+    """Imports each module in order and returns {name: milliseconds}.
+
+    Each figure is the module's incremental cost: dependencies already loaded by an earlier
+    module are not counted again. Modules that were already imported cost 0.
+    """
+    timings = {}
+    for name in module_names:
+        if name in sys.modules:
+            timings[name] = 0.0
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Start-up import of {name} failed: {e}")
+            continue
+        timings[name] = (time.perf_counter() - start) * 1000
+    return timings
+
+def log_startup_report(ready_seconds: float, timings: dict):
+    """Logs time to readiness and the per-module import cost, most expensive first."""
+    breakdown = ", ".join(f"{name} {ms:.0f}ms" for name, ms in sorted(timings.items(), key=lambda item: -item[1]))
+    logger.info(f"Ready for events {ready_seconds:.2f}s after start. Warm-up imports ({sum(timings.values()):.0f}ms): {breakdown}")
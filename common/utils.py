@@ -4,15 +4,36 @@
 # ================================================
 import requests
 import json
-from .config import logger, MARKET_CURRENCY_CONFIG
+import threading
+import time
+from .config import (logger, MARKET_CURRENCY_CONFIG, API_CACHE_ENABLED, API_CACHE_MAX_BYTES, API_CACHE_DEFAULT_TTL, API_CACHE_TTLS,
+                     API_QUERY_DEADLINE, API_RETRY_ATTEMPTS, API_RETRY_BASE_DELAY, API_RETRY_MAX_DELAY, API_RETRY_POLICIES,
+                     API_BREAKER_FAILURES, API_BREAKER_RESET)
+from .http import get_session, get_timeout
+from .cache import canonical_key
+from .shared_state import create_cache
+from .metrics import span, LatencyWindow
+from .resilience import (RETRYABLE_STATUSES, error_status, Deadline, DeadlineExceeded, RetryPolicy, CircuitBreaker,
+                         CircuitOpenError, call_with_retries)
+
+response_cache = create_cache(API_CACHE_MAX_BYTES, name="lyra")
 
 def split_message_for_slack(message: str, max_length: int = 2800) -> list:
-    """Splits a long message into chunks suitable for Slack, respecting newlines."""
+    """Splits a long message into chunks suitable for Slack, respecting newlines.
+
+    Lines longer than max_length are cut at max_length.
+    """
     if not message: return []
     if len(message) <= max_length: return [message]
     
     chunks, current_chunk = [], ""
     for line in message.split('\n'):
+        if len(line) >= max_length:
+            if current_chunk.strip(): chunks.append(current_chunk)
+            current_chunk = ""
+            while len(line) >= max_length:
+                chunks.append(line[:max_length])
+                line = line[max_length:]
         if len(current_chunk) + len(line) + 1 > max_length:
             if current_chunk.strip(): chunks.append(current_chunk)
             current_chunk = line + "\n"
@@ -21,13 +42,126 @@ def split_message_for_slack(message: str, max_length: int = 2800) -> list:
     if current_chunk.strip(): chunks.append(current_chunk)
     return chunks
 
+def cache_ttl_for(payload: dict) -> int:
+    """Looks up the cache TTL for a payload by "source/view", falling back to "source" and then the default."""
+    source, view = payload.get("source"), payload.get("view")
+    return API_CACHE_TTLS.get(f"{source}/{view}", API_CACHE_TTLS.get(source, API_CACHE_DEFAULT_TTL))
+
+def _post(url: str, payload: dict, time_left: float = None) -> str:
+    response = get_session().post(url, json=payload, timeout=get_timeout(time_left))
+    response.raise_for_status()
+    return response.text
+
+# --- Lyra endpoint policies and health ---
+def endpoint_of(payload: dict) -> str:
+    source, view = payload.get("source"), payload.get("view")
+    return f"{source}/{view}" if view else str(source)
+
+def retry_policy_for(endpoint: str) -> tuple:
+    """Returns (RetryPolicy, deadline seconds) for "source/view", falling back to "source"; unlisted endpoints get one attempt."""
+    settings = API_RETRY_POLICIES.get(endpoint, API_RETRY_POLICIES.get(endpoint.split("/")[0], {"attempts": 1}))
+    policy = RetryPolicy(settings.get("attempts", API_RETRY_ATTEMPTS), settings.get("base_delay", API_RETRY_BASE_DELAY), settings.get("max_delay", API_RETRY_MAX_DELAY))
+    return policy, settings.get("deadline", API_QUERY_DEADLINE)
+
+def is_retryable_api_error(error) -> bool:
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)) or error_status(error) in RETRYABLE_STATUSES
+
+class EndpointHealth:
+    """Outcomes and recent latencies of the queries sent to one Lyra source/view."""
+    def __init__(self, window: int = 256):
+        self._lock = threading.Lock()
+        self.failures = self.retries = self.short_circuits = 0
+        self.last_error = None
+        self.latency = LatencyWindow(window)
+
+    def record(self, seconds: float, attempts: int, error=None):
+        with self._lock:
+            if attempts == 0:
+                self.short_circuits += 1
+            else:
+                self.latency.add(seconds)
+                self.retries += attempts - 1
+            if error is not None:
+                self.failures += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+
+    def summary(self) -> dict:
+        with self._lock:
+            latency = self.latency.summary()
+            return {"queries": latency["count"] + self.short_circuits, "failures": self.failures, "retries": self.retries,
+                    "short_circuits": self.short_circuits, "p50_ms": latency["p50"] * 1000, "p95_ms": latency["p95"] * 1000,
+                    "p99_ms": latency["p99"] * 1000, "last_error": self.last_error}
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+def _endpoint(endpoint: str) -> tuple:
+    """The (CircuitBreaker, EndpointHealth) pair for an endpoint, created on first use."""
+    with _endpoints_lock:
+        if endpoint not in _endpoints:
+            _endpoints[endpoint] = (CircuitBreaker(f"lyra:{endpoint}", API_BREAKER_FAILURES, API_BREAKER_RESET), EndpointHealth())
+        return _endpoints[endpoint]
+
+def endpoint_health() -> dict:
+    """Circuit state, outcome counts and latency percentiles for every Lyra endpoint queried so far."""
+    with _endpoints_lock:
+        endpoints = dict(_endpoints)
+    return {name: {"state": breaker.state, **health.summary()} for name, (breaker, health) in sorted(endpoints.items())}
+
+def _fetch(url: str, payload: dict, endpoint: str) -> str:
+    """POSTs the query under the endpoint's retry policy, shared deadline and circuit breaker."""
+    policy, deadline_seconds = retry_policy_for(endpoint)
+    breaker, health = _endpoint(endpoint)
+    attempts, start = 0, time.perf_counter()
+    def attempt(time_left):
+        nonlocal attempts
+        attempts += 1
+        return _post(url, payload, time_left)
+    try:
+        body = call_with_retries(attempt, policy, Deadline(deadline_seconds), is_retryable_api_error, breaker, name=f"lyra {endpoint}")
+    except Exception as e:
+        health.record(time.perf_counter() - start, attempts, e)
+        raise
+    health.record(time.perf_counter() - start, attempts)
+    return body
+
+def is_cacheable_response(data) -> bool:
+    """Error payloads and empty bodies that Lyra returns with a 200 are not cached."""
+    return bool(data) and not (isinstance(data, dict) and "error" in data)
+
 def query_api(url: str, payload: dict, endpoint_name: str) -> dict:
-    """Sends a POST request to the specified API endpoint and handles errors."""
+    """Sends a POST request to the specified API endpoint and handles errors.
+
+    Successful responses are cached by canonical payload; errors are never cached. Failed attempts
+    are retried per the endpoint's policy within one deadline, and a per-endpoint circuit breaker
+    answers at once while Lyra keeps failing.
+    """
     logger.info(f"Querying {endpoint_name} API at {url} with payload: {json.dumps(payload)}")
+    ttl = cache_ttl_for(payload) if API_CACHE_ENABLED else 0
+    key = f"{url}|{canonical_key(payload)}"
+    endpoint = endpoint_of(payload)
+    loaded = {}
+    def load():
+        body = _fetch(url, payload, endpoint)
+        loaded["data"] = json.loads(body)  # parsed before caching, so error payloads are never stored
+        return body
     try:
-        response = requests.post(url, json=payload, timeout=60)
-        response.raise_for_status()
-        return response.json()
+        with span("lyra.query", view=payload.get("view") or payload.get("source")):
+            if ttl > 0:
+                body = response_cache.get_or_load(key, load, ttl, cacheable=lambda _: is_cacheable_response(loaded.get("data")))
+            else:
+                body = load()
+        return loaded["data"] if "data" in loaded else json.loads(body)
+    except ValueError as e:
+        response_cache.invalidate(key)
+        logger.error(f"{endpoint_name} API returned invalid JSON: {e}")
+        return {"error": f"Could not connect to the {endpoint_name} API."}
+    except CircuitOpenError:
+        logger.warning(f"{endpoint_name} API is failing; skipped the query while its circuit is open.")
+        return {"error": f"The {endpoint_name} API is unavailable right now. Please try again in a minute."}
+    except (DeadlineExceeded, requests.exceptions.Timeout) as e:
+        logger.error(f"{endpoint_name} API timed out: {e}")
+        return {"error": f"The {endpoint_name} API did not respond in time. Please try again shortly."}
     except requests.exceptions.RequestException as e:
         logger.error(f"{endpoint_name} API Connection Error: {e}")
         return {"error": f"Could not connect to the {endpoint_name} API."}
@@ -2,9 +2,10 @@
 # FILE: influencer.py
 # ======================================================
 import json
-import pandas as pd
-from common.config import gemini_model, logger, UNIFIED_API_URL, MARKET_CURRENCY_CONFIG
-from common.utils import query_api, split_message_for_slack
+from common.config import logger, UNIFIED_API_URL, MARKET_CURRENCY_CONFIG
+from common.utils import query_api
+from common.llm import generate_and_post
+from common.data_context import build_data_context, compact_json, build_digest, follow_up_context
 
 RATES = {info['name']: info['rate'] for _, info in MARKET_CURRENCY_CONFIG.items()}
 RATES['EUR'] = 1.0
@@ -14,8 +15,8 @@ def create_prompt(user_query, influencer_name, summary_stats, campaigns, is_deep
     You are Nova, a graceful and helpful marketing analyst assistant.
     {"Generate a comprehensive deep-dive performance report for the influencer." if is_deep_dive else "Provide a concise, direct answer to the user's question about the influencer."}
     **Data Context for Influencer '{influencer_name}':**
-    - Summary Stats: {json.dumps(summary_stats)}
-    - Full Campaign Data: {json.dumps(campaigns)}
+    - Summary Stats: {compact_json(summary_stats)}
+    - Campaign Data: {build_data_context({"campaigns": campaigns})}
     **User's Request:** "{user_query if user_query else "A full analysis."}"
     **Instructions:** Frame your response as a helpful analyst. If data is sparse or missing, note it gracefully. Use bold formatting for key metrics.Present insights naturally without mentioning "based on the data provided".
     """
@@ -34,6 +35,7 @@ def run_influencer_analysis(say, thread_ts, params, thread_context_store, user_q
     if "error" in api_data or not api_data.get("campaigns"):
         say(f"No campaigns found for '{influencer_name}' with the specified filters.", thread_ts=thread_ts); return
 
+    import pandas as pd  # imported on first use to keep bot start-up fast
     campaigns = api_data["campaigns"]; df = pd.DataFrame(campaigns)
     total_spend_eur = sum(float(c.get('total_budget_clean', 0)) / RATES.get(str(c.get('currency', 'EUR')).upper(), 1.0) for c in campaigns)
     total_conversions = df['actual_conversions_clean'].sum()
@@ -48,15 +50,12 @@ def run_influencer_analysis(say, thread_ts, params, thread_context_store, user_q
         is_deep_dive = not user_query or any(kw in user_query.lower() for kw in ["deep dive", "details", "analyse"])
         prompt = create_prompt(user_query, influencer_name, summary_stats, campaigns, is_deep_dive)
         
-        response = gemini_model.generate_content(prompt)
-        ai_answer = response.text
+        ai_answer = generate_and_post(say, thread_ts, prompt)
 
         thread_context_store[thread_ts] = {
             'type': 'influencer_analysis', 'params': params,
-            'raw_api_data': api_data, 'bot_response': ai_answer
+            'raw_api_data': api_data, 'bot_response': ai_answer, **build_digest(api_data)
         }
-
-        for chunk in split_message_for_slack(ai_answer): say(text=chunk, thread_ts=thread_ts)
     except Exception as e:
         logger.error(f"Error calling Gemini API for influencer analysis: {e}"); say(f"AI analysis failed: `{str(e)}`", thread_ts=thread_ts)
 
@@ -68,7 +67,7 @@ def handle_thread_messages(event, say, client, context):
         context_prompt = f"""
         You are a helpful marketing analyst assistant.
         **Current Context:** An analysis of influencer **{context['params'].get('influencer_name')}** with filters: {json.dumps(context.get('params', {}))}.
-        **Available Data:** You have the full JSON data for this specific influencer analysis: {json.dumps(context.get('raw_api_data', {}))}
+        **Available Data:** You have the data for this specific influencer analysis: {follow_up_context(context, context.get('raw_api_data', {}), user_message)}
         
         **User's Follow-up:** "{user_message}"
         
@@ -77,8 +76,6 @@ def handle_thread_messages(event, say, client, context):
         2. If the user asks about a different influencer or a comparison that requires new data, you MUST state that you don't have that data in your current context. Example: "I can't answer that, as my current context is only for {context['params'].get('influencer_name')}. To analyze another influencer, please start a new request like '@nova analyse influencer [name]'."
         3. Present your answer naturally, without phrases like "based on the provided data".
         """
-        response = gemini_model.generate_content(context_prompt)
-        ai_response = response.text
-        for chunk in split_message_for_slack(ai_response): say(text=chunk, thread_ts=thread_ts)
+        generate_and_post(say, thread_ts, context_prompt, site="follow_up")
     except Exception as e: 
         logger.error(f"Error handling thread message in influencer.py: {e}"); say(text="Sorry, I had trouble with your follow-up.", thread_ts=thread_ts)
@@ -2,47 +2,124 @@
 # FILE: main.py
 # PURPOSE: Main application entry point for the Slack bot
 # ================================================
+import time
+STARTED_AT = time.perf_counter()  # measured before the remaining imports, for the start-up report
 import os
 import sys
 import json
 import re
+import inspect
+import functools
+import threading
 import collections
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-# Import the refactored CORE LOGIC functions from the modules
-from month import run_monthly_review, handle_thread_messages as month_thread_handler
-from influencer import run_influencer_analysis, handle_thread_messages as influencer_thread_handler
-from trend import run_influencer_trend, handle_thread_messages as trend_thread_handler
-from plan import run_strategic_plan, handle_thread_replies as plan_thread_handler
-from weekly import run_weekly_review_by_range, run_weekly_review_by_number, handle_thread_messages as weekly_thread_handler
-
 # Import shared configuration from the common package
-from common.config import logger, gemini_model
+from common.config import logger, get_gemini_model, GOOGLE_API_KEY, STARTUP_WARMUP, METRICS_PORT, METRICS_DUMP_INTERVAL, DEFAULT_YEAR, ROUTING_CACHE_MAX_BYTES, ROUTING_CACHE_TTL, JOB_WORKERS, JOB_PER_CHANNEL_LIMIT, JOB_MAX_QUEUE, THREAD_LOCK_RETRY_INTERVAL
+from common.jobs import JobRunner, RetryLater
+from common.context_store import create_context_store
+from common.shared_state import create_cache, create_thread_locks
+from common.parsing import normalize_market_name, parse_slash_command, classify_thread_intent
+from common.startup import lazy_function, timed_imports, log_startup_report
+from common.llm import generate_text, set_llm_user, LLMError, gateway as llm_gateway
+from common.utils import endpoint_health
+from common.metrics import span, timed, observe, increment, set_labels, InstrumentedSay, InstrumentedClient, start_metrics_server, start_periodic_dump
+
+# --- FEATURE MODULES ---
+# Loaded on first use (or by the warm-up after connecting) so the bot connects without paying for
+# pandas, openpyxl and the Gemini SDK up front.
+run_monthly_review = lazy_function("month", "run_monthly_review")
+month_thread_handler = lazy_function("month", "handle_thread_messages")
+run_influencer_analysis = lazy_function("influencer", "run_influencer_analysis")
+influencer_thread_handler = lazy_function("influencer", "handle_thread_messages")
+run_influencer_trend = lazy_function("trend", "run_influencer_trend")
+trend_thread_handler = lazy_function("trend", "handle_thread_messages")
+run_strategic_plan = lazy_function("plan", "run_strategic_plan")
+plan_thread_handler = lazy_function("plan", "handle_thread_replies")
+run_weekly_review_by_range = lazy_function("weekly", "run_weekly_review_by_range")
+run_weekly_review_by_number = lazy_function("weekly", "run_weekly_review_by_number")
+weekly_thread_handler = lazy_function("weekly", "handle_thread_messages")
+WARM_UP_MODULES = ("google.generativeai", "pandas", "openpyxl", "month", "weekly", "influencer", "trend", "plan")
 
 # --- Environment & App Initialization ---
 load_dotenv()
 try:
     SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
     SLACK_APP_TOKEN = os.environ["SLACK_APP_TOKEN"]
-    app = App(token=SLACK_BOT_TOKEN)
+    # The token is verified on the first event rather than with a blocking auth.test at import.
+    app = App(token=SLACK_BOT_TOKEN, token_verification_enabled=False)
     logger.success("Slack App initialized.")
 except KeyError as e:
     logger.critical(f"FATAL: Missing Slack environment variable: {e}.")
     sys.exit(1)
 
 # --- THREAD CONTEXT STORE ---
-MAX_CONTEXTS = 20
-thread_context_store = collections.OrderedDict()
+# Bounded by estimated bytes rather than thread count; raw API payloads are stored compressed.
+thread_context_store = create_context_store()
+thread_locks = create_thread_locks()
 
-# --- NATURAL LANGUAGE ROUTERS ---
-def route_natural_language_query(query: str):
-    prompt = f"""
-    You are an expert routing assistant. Map a user query to a tool and extract parameters.
+# --- JOB EXECUTION ---
+# Listeners hand the slow pipeline (LLM routing, Lyra queries, generation) to a bounded worker
+# pool so the Bolt listener threads stay free to accept events.
+job_runner = JobRunner(max_workers=JOB_WORKERS, per_channel_limit=JOB_PER_CHANNEL_LIMIT, max_queue=JOB_MAX_QUEUE, name="nova-job")
+
+def run_as_job(accept=None):
+    """Decorates a Bolt listener so its body runs on the job runner.
+
+    Slash commands are acked before queueing (the listener's own ack() becomes a no-op). Replies in
+    one Slack thread run one at a time, in order. When the job has to wait for a worker, a "queued"
+    status is posted; when the backlog is full, the user is asked to retry.
+    `accept(args)` can filter out events cheaply before anything is queued.
+    """
+    def decorator(listener):
+        signature = inspect.signature(listener)
+
+        @functools.wraps(listener)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs).arguments
+            if accept and not accept(bound):
+                return
+            if ack := bound.get('ack'):
+                ack()
+            say, event, command = bound.get('say'), bound.get('event') or {}, bound.get('command') or {}
+            channel = event.get('channel') or command.get('channel_id')
+            thread_ts = event.get('thread_ts') or event.get('ts')
+            queued_notice = lambda position: say(f"⏳ I'm working on other requests right now; yours is queued (position {position}) and will start shortly.", thread_ts=thread_ts)
+            if 'say' in bound: bound['say'] = InstrumentedSay(say)
+            if 'client' in bound: bound['client'] = InstrumentedClient(bound['client'])
+            submitted = time.perf_counter()
 
+            def job():
+                observe("job.queue_wait", time.perf_counter() - submitted)
+                set_labels(listener=listener.__name__)
+                set_llm_user(event.get('user') or command.get('user_id'))
+                with span("request"):
+                    listener(**bound)
+
+            if not job_runner.submit(channel, job, on_queued=queued_notice, serial_key=event.get('thread_ts')):
+                say("I'm at capacity right now. Please try again in a minute.", thread_ts=thread_ts)
+        return wrapper
+    return decorator
+
+def is_tracked_thread_message(args: dict) -> bool:
+    event = args.get('event') or {}
+    return bool(event.get("thread_ts")) and not event.get("bot_id") and event["thread_ts"] in thread_context_store
+
+# --- ROUTING CACHE ---
+# Successful routing decisions are cached as JSON text so every hit returns a fresh, mutable copy.
+routing_cache = create_cache(ROUTING_CACHE_MAX_BYTES, name="router")
+
+def routing_cache_key(query: str) -> str:
+    """Normalizes whitespace and trailing punctuation only; case is kept because routing copies names verbatim."""
+    return f"{DEFAULT_YEAR}|{' '.join(query.split()).rstrip('?!.,;: ')}"
+
+# --- NATURAL LANGUAGE ROUTERS ---
+# Shared by the router and the combined thread classify-and-route prompt.
+ROUTING_RULES = f"""
     **RULES:**
-    1.  Default `year` to `2025` if not specified.
+    1.  Default `year` to `{DEFAULT_YEAR}` if not specified.
     2.  Normalize market names: "UK" should be "UK" (uppercase). All other countries (e.g., "france", "sweden") should be Sentence Case (e.g., "France", "Sweden").
     3.  If a query contains "week" or "wk" followed by a number (e.g., "week 36", "wk 5 performance"), you MUST prioritize the `weekly-review-by-number` tool.
     4.  If a query contains a specific date range (e.g., "from June 1 to June 15", "on Sep 15th"), you MUST prioritize the `weekly-review-by-range` tool.
@@ -56,71 +133,93 @@ def route_natural_language_query(query: str):
     - `weekly-review-by-number`: For a specific week number. Needs `market`, `week_number`, `year`.
     - `analyse-influencer`: For a specific influencer. Needs `influencer_name`.
     - `influencer-trend`: For general leaderboards.
-    - `plan`: For future budget allocation. Needs `market`, `month_abbr`, `month_full`, `year`.
+    - `plan`: For future budget allocation. Needs `market`, `month_abbr`, `month_full`, `year`. Optional `strategy`: set it to "optimal" only when the user asks to maximize conversions or optimize the allocation.
     - `clarify-market`: Use if a market is required but missing. Needs `original_query`.
+"""
+
+@timed("router")
+def route_natural_language_query(query: str):
+    cache_key = routing_cache_key(query)
+    if (cached := routing_cache.get(cache_key)) is not None:
+        increment("router.cache_hits")
+        logger.info(f"Router cache hit for query '{query}' (hit rate {routing_cache.stats()['hit_rate']:.0%})")
+        return json.loads(cached)
 
+    prompt = f"""
+    You are an expert routing assistant. Map a user query to a tool and extract parameters.
+    {ROUTING_RULES}
     **RESPONSE FORMAT:** JSON ONLY: `{{"tool_name": "...", "parameters": {{...}}}}`
     **USER QUERY:** "{query}"
     """
     try:
-        response = gemini_model.generate_content(prompt)
-        cleaned_text = response.text.strip().replace("```json", "").replace("```", "").strip()
+        cleaned_text = generate_text(prompt, site="router").strip().replace("```json", "").replace("```", "").strip()
         logger.info(f"LLM Router Response for query '{query}': {cleaned_text}")
-        return json.loads(cleaned_text)
+        routing_decision = json.loads(cleaned_text)
+        set_labels(tool=routing_decision.get("tool_name"))
+        if routing_decision.get("tool_name") not in (None, "error"):
+            routing_cache.set(cache_key, json.dumps(routing_decision), ROUTING_CACHE_TTL)
+        return routing_decision
+    except LLMError as e:
+        return {"tool_name": "error", "parameters": {"message": str(e)}}
     except Exception as e:
         logger.error(f"Error parsing LLM response for routing: {e}")
         return {"tool_name": "error", "parameters": {"reason": "Could not understand the request."}}
 
-def determine_thread_intent(user_message: str, context: dict):
+# Counts how thread intents were decided ('local' rules vs. the 'llm').
+intent_stats = collections.Counter()
+
+@timed("intent")
+def determine_thread_intent(user_message: str, context: dict) -> dict:
+    """Classifies a thread message and, for new commands, routes it in the same step.
+
+    Returns `{"intent": "follow-up"}` or `{"intent": "new_command", "tool_name": ..., "parameters": ...}`.
+    Unambiguous messages are classified locally; otherwise a single LLM call returns both the
+    intent and the routing decision.
+    """
+    if (local_intent := classify_thread_intent(user_message, context)) is not None:
+        intent_stats['local'] += 1
+        increment("intent.decisions", method="local")
+        logger.info(f"Thread Intent Detection (local): {local_intent} ({intent_stats['local'] / sum(intent_stats.values()):.0%} resolved locally)")
+        if local_intent == "new_command":
+            return {"intent": local_intent, **route_natural_language_query(user_message)}
+        return {"intent": local_intent}
+
+    intent_stats['llm'] += 1
+    increment("intent.decisions", method="llm")
     context_type = context.get('type', 'general discussion')
     prompt = f"""
-    You are an intent detection expert for a Slack bot.
+    You are an intent detection and routing expert for a Slack bot.
     The current context is `{context_type}`. The user's message is: "{user_message}"
-    Your task is to determine if this is a `follow_up` or a `new_command`.
+    Your task is to determine if this is a `follow_up` or a `new_command`, and to route it if it is a `new_command`.
 
-    **RULES:**
+    **INTENT RULES:**
     1.  A `follow_up` asks a question answerable with the current context's data.
     2.  It is a `new_command` if the user asks for a different tool or introduces a new set of core parameters like a different month, a new market, a specific date range, or a specific week number.
         - Example `new_command`: Context is November, user asks "now show me June".
         - Example `new_command`: User asks "how about week 36?" during a monthly review.
     3.  If in doubt, default to `new_command`.
 
-    Respond with JSON ONLY: `{{"intent": "follow-up"}}` or `{{"intent": "new_command"}}`
+    **ROUTING (only for a `new_command`):** Map the message to a tool and extract parameters.
+    {ROUTING_RULES}
+    **RESPONSE FORMAT:** JSON ONLY. Either `{{"intent": "follow-up"}}` or `{{"intent": "new_command", "tool_name": "...", "parameters": {{...}}}}`
     """
     try:
-        response = gemini_model.generate_content(prompt)
-        cleaned_text = response.text.strip().replace("```json", "").replace("```", "").strip()
+        cleaned_text = generate_text(prompt, site="intent").strip().replace("```json", "").replace("```", "").strip()
         logger.info(f"Thread Intent Detection: {cleaned_text}")
-        return json.loads(cleaned_text).get("intent", "follow-up")
+        decision = json.loads(cleaned_text)
     except Exception as e:
         logger.error(f"Error determining thread intent: {e}")
-        return "follow-up"
+        return {"intent": "follow-up"}
 
-# --- PARAMETER PROCESSING & NORMALIZATION ---
-def normalize_market_name(market_name: str) -> str:
-    if not market_name or not isinstance(market_name, str):
-        return market_name
-    
-    market_lower = market_name.strip().lower()
-    
-    market_map = {
-        "uk": "UK",
-        "united kingdom": "UK",
-        "gb": "UK",
-        "great britain": "UK",
-        "france": "France",
-        "fr": "France",
-        "sweden": "Sweden",
-        "se": "Sweden",
-        "norway": "Norway",
-        "no": "Norway",
-        "denmark": "Denmark",
-        "dk": "Denmark",
-        "nordics": "Nordics",
-    }
-    
-    return market_map.get(market_lower, market_name.strip().capitalize())
+    if decision.get("intent") != "new_command":
+        return {"intent": "follow-up"}
+    if not decision.get("tool_name"):
+        return {"intent": "new_command", **route_natural_language_query(user_message)}
+    if decision["tool_name"] != "error":
+        routing_cache.set(routing_cache_key(user_message), json.dumps({"tool_name": decision["tool_name"], "parameters": decision.get("parameters", {})}), ROUTING_CACHE_TTL)
+    return decision
 
+# --- PARAMETER PROCESSING & NORMALIZATION ---
 def process_routing_params(params: dict) -> dict:
     if not isinstance(params, dict):
         params = {}
@@ -128,15 +227,25 @@ def process_routing_params(params: dict) -> dict:
     if 'market' in params and params.get('market'):
         params['market'] = normalize_market_name(params['market'])
         logger.info(f"Normalized market name to: {params['market']}")
+        set_labels(market=params['market'])
         
     if 'year' not in params or not params.get('year'):
-        params['year'] = 2025
-        logger.info("Applied default year: 2025")
+        params['year'] = DEFAULT_YEAR
+        logger.info(f"Applied default year: {DEFAULT_YEAR}")
         
     return params
 
+def route_slash_command(command_name: str, text: str, llm_query: str):
+    """Parses documented slash-command formats locally, falling back to the LLM router only when that fails."""
+    if (routing_decision := parse_slash_command(command_name, text)) is not None:
+        logger.info(f"Parsed `/{command_name} {text}` locally: {routing_decision}")
+        set_labels(tool=routing_decision["tool_name"])
+        return routing_decision
+    return route_natural_language_query(llm_query)
+
 # --- PRIMARY ENTRY POINT: @mention ---
 @app.event("app_mention")
+@run_as_job()
 def handle_app_mention(event, say, client):
     user_query = re.sub(r'<@.*?>', '', event['text']).strip()
     thread_ts = event.get('ts')
@@ -161,7 +270,7 @@ def handle_app_mention(event, say, client):
         client.chat_update(channel=event['channel'], ts=thinking_message['ts'], text=f"Understood! Preparing a `*{tool_name}*` analysis for you...")
     else:
         reason = params.get('reason', "I couldn't understand that.")
-        client.chat_update(channel=event['channel'], ts=thinking_message['ts'], text=f"My apologies, {reason} Could you please rephrase?")
+        client.chat_update(channel=event['channel'], ts=thinking_message['ts'], text=params.get('message') or f"My apologies, {reason} Could you please rephrase?")
         return
     
     main_handler_map = {
@@ -178,25 +287,32 @@ def handle_app_mention(event, say, client):
         else:
             handler(say, thread_ts, params, thread_context_store, user_query=user_query)
 
-    while len(thread_context_store) > MAX_CONTEXTS:
-        thread_context_store.popitem(last=False)
-
 # --- THREAD MESSAGE ROUTING ---
 @app.event("message")
+@run_as_job(accept=is_tracked_thread_message)
 def route_thread_messages(event, say, client):
     thread_ts = event.get("thread_ts")
     if not thread_ts or event.get("bot_id"): return
-    
+
+    # The job runner already runs one message per thread at a time in this process; in shared-state
+    # mode another process may be answering the thread, so the job steps aside and retries later.
+    with thread_locks.hold(thread_ts) as acquired:
+        if acquired:
+            handle_thread_message(event, say, client, thread_ts)
+            return
+    raise RetryLater(THREAD_LOCK_RETRY_INTERVAL)
+
+def handle_thread_message(event, say, client, thread_ts):
     if thread_ts in thread_context_store:
         thread_context_store.move_to_end(thread_ts)
         context = thread_context_store[thread_ts]
+        set_labels(tool=context.get("type"), market=(context.get("params") or {}).get("market"))
         user_message = event.get("text", "").strip()
         
-        intent = determine_thread_intent(user_message, context)
+        routing_decision = determine_thread_intent(user_message, context)
 
-        if intent == "new_command":
+        if routing_decision["intent"] == "new_command":
             logger.info(f"Thread message '{user_message}' identified as a new command. Pivoting...")
-            routing_decision = route_natural_language_query(user_message)
             new_tool = routing_decision.get("tool_name")
             params = process_routing_params(routing_decision.get("parameters", {}))
             
@@ -223,7 +339,7 @@ def route_thread_messages(event, say, client):
                     else:
                         handler(say, thread_ts, params, thread_context_store, user_query=user_message)
             else:
-                say(f"Sorry, I couldn't understand that as a new command.", thread_ts=thread_ts)
+                say(params.get('message') or "Sorry, I couldn't understand that as a new command.", thread_ts=thread_ts)
             return
 
         logger.info(f"Thread message '{user_message}' identified as a follow-up.")
@@ -240,24 +356,26 @@ def route_thread_messages(event, say, client):
 
 # --- SLASH COMMANDS ---
 @app.command("/monthly-review")
+@run_as_job()
 def route_monthly_review(ack, say, command):
     ack()
     text = command.get('text', '').strip()
     initial_response = say(f"Running command `/monthly-review {text}`...")
-    routing_decision = route_natural_language_query(f"monthly review for {text.replace('-', ' ')}")
+    routing_decision = route_slash_command("monthly-review", text, f"monthly review for {text.replace('-', ' ')}")
     tool_name = routing_decision.get("tool_name")
     params = process_routing_params(routing_decision.get("parameters", {}))
     if tool_name == "monthly-review":
         run_monthly_review(say, initial_response['ts'], params, thread_context_store)
     else:
-        say("Invalid format. Use `/monthly-review Market-Month-Year`", thread_ts=initial_response['ts'])
+        say(params.get('message') or "Invalid format. Use `/monthly-review Market-Month-Year`", thread_ts=initial_response['ts'])
 
 @app.command("/weekly-review")
+@run_as_job()
 def route_weekly_review(ack, say, command):
     ack()
     text = command.get('text', '').strip()
     initial_response = say(f"Running command `/weekly-review {text}`...")
-    routing_decision = route_natural_language_query(f"weekly review for {text}")
+    routing_decision = route_slash_command("weekly-review", text, f"weekly review for {text}")
     tool_name = routing_decision.get("tool_name")
     params = process_routing_params(routing_decision.get("parameters", {}))
     
@@ -266,61 +384,94 @@ def route_weekly_review(ack, say, command):
     elif tool_name == "weekly-review-by-number" and params.get("market"):
         run_weekly_review_by_number(say, initial_response['ts'], params, thread_context_store)
     else:
-        say("Invalid format. Use `/weekly-review UK from 2025-06-01 to 2025-06-07` or `/weekly-review UK week 36`", thread_ts=initial_response['ts'])
+        say(params.get('message') or "Invalid format. Use `/weekly-review UK from 2025-06-01 to 2025-06-07` or `/weekly-review UK week 36`", thread_ts=initial_response['ts'])
 
 @app.command("/analyse-influencer")
+@run_as_job()
 def route_analyse_influencer(ack, say, command):
     ack()
     text = command.get('text', '').strip()
     initial_response = say(f"Running command `/analyse-influencer {text}`...")
-    routing_decision = route_natural_language_query(f"analyse influencer {text.replace('-', ' ')}")
+    routing_decision = route_slash_command("analyse-influencer", text, f"analyse influencer {text.replace('-', ' ')}")
     tool_name = routing_decision.get("tool_name")
     params = process_routing_params(routing_decision.get("parameters", {}))
     if tool_name == "analyse-influencer":
         run_influencer_analysis(say, initial_response['ts'], params, thread_context_store)
     else:
-        say("Invalid format. Use `/analyse-influencer InfluencerName`", thread_ts=initial_response['ts'])
+        say(params.get('message') or "Invalid format. Use `/analyse-influencer InfluencerName`", thread_ts=initial_response['ts'])
 
 @app.command("/influencer-trend")
+@run_as_job()
 def route_influencer_trend(ack, say, command):
     ack()
     text = command.get('text', '').strip()
     initial_response = say(f"Running command `/influencer-trend {text}`...")
-    routing_decision = route_natural_language_query(f"influencer trends for {text.replace('-', ' ')}")
+    routing_decision = route_slash_command("influencer-trend", text, f"influencer trends for {text.replace('-', ' ')}")
     tool_name = routing_decision.get("tool_name")
     params = process_routing_params(routing_decision.get("parameters", {}))
     if tool_name == "influencer-trend":
         run_influencer_trend(say, initial_response['ts'], params, thread_context_store)
     else:
-        say("Invalid format. Use `/influencer-trend Market`", thread_ts=initial_response['ts'])
+        say(params.get('message') or "Invalid format. Use `/influencer-trend Market`", thread_ts=initial_response['ts'])
 
 @app.command("/plan")
+@run_as_job()
 def route_plan(ack, say, command, client):
     ack()
     text = command.get('text', '').strip()
     initial_response = say(f"Running command `/plan {text}`...")
-    routing_decision = route_natural_language_query(f"plan for {text.replace('-', ' ')}")
+    routing_decision = route_slash_command("plan", text, f"plan for {text.replace('-', ' ')}")
     tool_name = routing_decision.get("tool_name")
     params = process_routing_params(routing_decision.get("parameters", {}))
     if tool_name == "plan":
          mock_event = {'channel': command.get('channel_id')}
          run_strategic_plan(client, say, mock_event, initial_response['ts'], params, thread_context_store)
     else:
-        say("Invalid format. Use `/plan Market-Month-Year`", thread_ts=initial_response['ts'])
+        say(params.get('message') or "Invalid format. Use `/plan Market-Month-Year`", thread_ts=initial_response['ts'])
+
+def format_bot_status() -> str:
+    """Summarizes the circuit state and recent latency of Gemini and of each Lyra endpoint queried so far."""
+    lines = [f"• Gemini: {llm_gateway.breaker.state}"]
+    endpoints = endpoint_health()
+    for name, health in endpoints.items():
+        lines.append(f"• Lyra `{name}`: {health['state']}, {health['queries']} queries, {health['failures']} failed, {health['retries']} retries, p95 {health['p95_ms']:.0f}ms")
+    healthy = llm_gateway.breaker.state == "closed" and all(h["state"] == "closed" for h in endpoints.values())
+    header = "Bot Status: All systems operational!" if healthy else "Bot Status: Degraded. Some services are failing, so I'm answering those requests with an error until they recover."
+    return "\n".join([header, *lines])
 
 @app.command("/bot-status")
 def handle_bot_status(ack, say):
     ack()
-    say("Bot Status: All systems operational!")
+    say(format_bot_status())
 
 
 # --- MAIN APPLICATION STARTUP ---
+def warm_up(ready_seconds: float):
+    """Imports the feature modules and creates the Gemini client in the background after connecting."""
+    timings = timed_imports(WARM_UP_MODULES)
+    start = time.perf_counter()
+    get_gemini_model()
+    timings["gemini client"] = (time.perf_counter() - start) * 1000
+    log_startup_report(ready_seconds, timings)
+
 if __name__ == "__main__":
     logger.info("Starting Unified Slack Bot...")
+    if not GOOGLE_API_KEY:
+        logger.critical(f"FATAL: Missing GOOGLE_API_KEY. Please check .env file.")
+        sys.exit(1)
     try:
         handler = SocketModeHandler(app, SLACK_APP_TOKEN)
+        handler.connect()
         logger.success("Bot is running!")
-        handler.start()
+        if METRICS_PORT:
+            start_metrics_server(METRICS_PORT)
+        if METRICS_DUMP_INTERVAL:
+            start_periodic_dump(METRICS_DUMP_INTERVAL)
+        if STARTUP_WARMUP:
+            threading.Thread(target=warm_up, args=(time.perf_counter() - STARTED_AT,), name="warm-up", daemon=True).start()
+        else:
+            log_startup_report(time.perf_counter() - STARTED_AT, {})
+        threading.Event().wait()
     except Exception as e:
         logger.critical(f"Failed to start the bot: {e}")
         sys.exit(1)
@@ -1,20 +1,24 @@
 # ================================================
 # FILE: month.py
 # ================================================
-import json
-from common.config import gemini_model, logger, UNIFIED_API_URL
-from common.utils import query_api, split_message_for_slack, format_currency
+from common.config import logger, UNIFIED_API_URL
+from common.utils import query_api, format_currency
+from common.llm import generate_and_post
+from common.data_context import build_data_context, build_digest, follow_up_context
 
 def create_prompt(user_query, market, month, year, target_budget_local, actual_data, is_full_review):
     return f"""
     You are Nova, a marketing analyst.
     {"Generate a comprehensive monthly performance review." if is_full_review else "Provide a concise, direct answer to the user's question."}
     **Data Context for {market.upper()} - {month.upper()} {year}:**
-    {json.dumps({"Target Budget": format_currency(target_budget_local, market), "Actuals": actual_data}, indent=2)}
+    {build_data_context({"Target Budget": format_currency(target_budget_local, market), "Actuals": actual_data})}
     **User's Request:** "{user_query if user_query else "A full monthly review."}"
     **Instructions:** Analyze the request and data. Formulate a clear, well-structured response using bold for key metrics. If data is missing, state it clearly.Present insights naturally without mentioning "based on the data provided".
     """
 
+def context_data(context):
+    return {'targets': context.get('raw_target_data', {}), 'actuals': context.get('raw_actual_data', {})}
+
 def run_monthly_review(say, thread_ts, params, thread_context_store, user_query=None):
     try:
         market, month_abbr, month_full, year = params['market'], params['month_abbr'], params['month_full'], params['year']
@@ -41,15 +45,13 @@ def run_monthly_review(say, thread_ts, params, thread_context_store, user_query=
         is_full_review = not user_query or any(kw in user_query.lower() for kw in ["review", "summary", "analysis"])
         prompt = create_prompt(user_query, market, month_full, year, target_budget_local, actual_data, is_full_review)
         
-        response = gemini_model.generate_content(prompt)
-        ai_answer = response.text
+        ai_answer = generate_and_post(say, thread_ts, prompt)
         
-        thread_context_store[thread_ts] = {
+        context = {
             'type': 'monthly_review', 'params': params,
             'raw_target_data': target_data, 'raw_actual_data': actual_data_response, 'bot_response': ai_answer
         }
-        
-        for chunk in split_message_for_slack(ai_answer): say(text=chunk, thread_ts=thread_ts)
+        thread_context_store[thread_ts] = {**context, **build_digest(context_data(context))}
     except Exception as e:
         logger.error(f"Error during AI review generation: {e}"); say(f"An error occurred generating the AI summary: {str(e)}", thread_ts=thread_ts)
     logger.success(f"Review completed for {market}-{month_full}-{year}")
@@ -62,7 +64,7 @@ def handle_thread_messages(event, say, client, context):
         context_prompt = f"""
         You are a helpful marketing analyst assistant.
         **Current Context:** A Monthly Review for **{context['params']['market']}** for **{context['params']['month_full']} {context['params']['year']}**.
-        **Available Data:** You have the full JSON data for this specific review: {json.dumps({'targets': context.get('raw_target_data', {}), 'actuals': context.get('raw_actual_data', {})})}
+        **Available Data:** You have the data for this specific review: {follow_up_context(context, context_data(context), user_message)}
         
         **User's Follow-up:** "{user_message}"
         
@@ -71,8 +73,6 @@ def handle_thread_messages(event, say, client, context):
         2. If the user asks about a different month, market, or requires a comparison to data not present, you MUST state that you don't have that data in your current context. Example: "I can't answer that, as my current context is only for the June UK review. To compare with November, you would need to ask me to run a new analysis for November."
         3. Present your answer naturally, without phrases like "based on the provided data".
         """
-        response = gemini_model.generate_content(context_prompt)
-        ai_response = response.text
-        for chunk in split_message_for_slack(ai_response): say(text=chunk, thread_ts=thread_ts)
+        generate_and_post(say, thread_ts, context_prompt, site="follow_up")
     except Exception as e:
         logger.error(f"Error handling thread message in month.py: {e}"); say(text="Sorry, I encountered an error.", thread_ts=thread_ts)
@@ -1,78 +1,332 @@
 # ======================================================
 # FILE: plan.py
 # ======================================================
-import json
-import pandas as pd
-from io import BytesIO
-from common.config import gemini_model, logger, UNIFIED_API_URL
-from common.utils import query_api, split_message_for_slack, format_currency, convert_eur_to_local
-
-def fetch_tier_influencers(market, year, tier, booked_influencer_names):
-    payload = {"source": "influencer_analytics", "view": "discovery_tiers", "filters": {"market": market, "year": year, 'tier': tier}}
-    data = query_api(UNIFIED_API_URL, payload, f"Discovery-{tier.capitalize()}")
+import collections
+import numpy as np
+import io
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from common.config import logger, UNIFIED_API_URL, PLAN_FETCH_WORKERS, PLAN_ALLOCATION_STRATEGY, PLAN_TIER_SHARES
+from common.utils import query_api, split_message_for_slack, format_currency, convert_eur_to_local, get_currency_info
+from common.llm import generate_and_post
+from common.data_context import build_digest, follow_up_context
+from common.parsing import parse_scenario_request, MAX_SCENARIOS
+from common.metrics import span, timed
+
+TIERS = ("gold", "silver", "bronze")
+TIER_LABELS = ("Gold", "Silver", "Bronze")
+
+def discovery_payload(market, year):
+    return {"source": "influencer_analytics", "view": "discovery_tiers", "filters": {"market": market, "year": year}}
+
+def split_tiers(data, booked_influencer_names):
+    """Splits a discovery_tiers response into per-tier lists, dropping booked influencers in the same pass."""
     if "error" in data:
-        logger.error(f"Error fetching {tier} tier: {data['error']}"); return []
-    
+        logger.error(f"Error fetching discovery tiers: {data['error']}"); return {tier: [] for tier in TIERS}
+
     # The discovery_tiers view returns data keyed by tier name ('gold', 'silver', etc.)
-    tier_data = data.get(tier.lower(), [])
-    unbooked = [inf for inf in tier_data if inf.get('influencer_name') not in booked_influencer_names]
-    logger.info(f"Found {len(unbooked)} unbooked {tier.capitalize()}-tier influencers")
-    return unbooked
+    tiers = {}
+    for tier in TIERS:
+        tiers[tier] = [inf for inf in data.get(tier, []) if inf.get('influencer_name') not in booked_influencer_names]
+        logger.info(f"Found {len(tiers[tier])} unbooked {tier.capitalize()}-tier influencers")
+    return tiers
+
+def fetch_discovery_tiers(market, year, booked_influencer_names):
+    """Fetches all tiers in one round trip and returns the unbooked influencers keyed by tier."""
+    data = query_api(UNIFIED_API_URL, discovery_payload(market, year), "Discovery Tiers")
+    return split_tiers(data, booked_influencer_names)
+
+def average_spend_per_campaign(influencers) -> np.ndarray:
+    """Average EUR spend per campaign for each influencer, as an array aligned with the input list."""
+    spend = np.fromiter((float(inf.get('total_spend_eur', 0.0) or 0.0) for inf in influencers), dtype=float, count=len(influencers))
+    counts = np.fromiter((inf.get('campaigns', 1) or 1 for inf in influencers), dtype=float, count=len(influencers)) # Use 'campaigns' key from discovery_tiers
+    return np.divide(spend, counts, out=np.zeros_like(spend), where=counts > 0)
+
+# --- Allocation strategies ---
+# A strategy takes (gold, silver, bronze, budget, cac, market, **options) and returns
+# (recs, allocated, tier_breakdown). "cascade" is the default.
+ALLOCATION_STRATEGIES = {}
 
+def allocation_strategy(name):
+    def register(fn):
+        ALLOCATION_STRATEGIES[name] = fn
+        return fn
+    return register
+
+@allocation_strategy("cascade")
 def allocate_budget_cascading_tiers(gold, silver, bronze, budget, cac=50, market='France'):
+    """Fills the budget tier by tier (Gold first), cheapest influencers first, stopping at 98% of the budget.
+
+    Each tier is handled with array operations: the picks are the cheapest prefix whose running total
+    stays within budget, cut at the first pick that reaches the 98% stop. The inputs are not modified.
+    """
     recs, allocated = [], 0.0
     tier_breakdown = {'Gold': [], 'Silver': [], 'Bronze': []}
-    
+    stop_at = budget * 0.98
+    rate = get_currency_info(market)['rate']
+
     for name, influencers in [('Gold', gold), ('Silver', silver), ('Bronze', bronze)]:
-        if allocated >= budget * 0.98: break
-        
-        for inf in influencers:
-            count = inf.get('campaigns', 1) or 1 # Use 'campaigns' key from discovery_tiers
-            spend = float(inf.get('total_spend_eur', 0.0) or 0.0)
-            inf['averageSpendPerCampaign'] = spend / count if count > 0 else 0.0
-            
-        for inf in sorted(influencers, key=lambda x: x.get('averageSpendPerCampaign', 0) or 0):
-            spend_eur = inf.get('averageSpendPerCampaign', 0) or 0
-            if spend_eur <= 0: continue
-            
-            spend_local = convert_eur_to_local(spend_eur, market)
-            if allocated + spend_local <= budget:
-                pred_conv = int(spend_local / cac) if cac > 0 else 0
-                rec = {
-                    'influencer_name': inf.get('influencer_name', 'Unknown'),
-                    'allocated_budget': spend_local,
-                    'predicted_conversions': pred_conv,
-                    'effective_cac': float(cac),
-                    'tier': name,
-                    'market': market
-                }
-                recs.append(rec)
-                tier_breakdown[name].append(rec)
-                allocated += spend_local
-                if allocated >= budget * 0.98: break
-                
+        if allocated >= stop_at: break
+
+        avg_eur = average_spend_per_campaign(influencers)
+        order = np.argsort(avg_eur, kind='stable')
+        order = order[avg_eur[order] > 0]
+        spend_local = avg_eur[order] * rate
+        # Running total seeded with what earlier tiers allocated (np.cumsum adds sequentially, like the old loop).
+        running = np.cumsum(np.concatenate(([allocated], spend_local)))[1:]
+        fits = running <= budget
+        count = len(order) if fits.all() else int(np.argmin(fits))
+        if (reached := np.flatnonzero(running[:count] >= stop_at)).size:
+            count = int(reached[0]) + 1
+        if not count: continue
+
+        predicted = np.trunc(spend_local[:count] / cac).astype(int) if cac > 0 else np.zeros(count, dtype=int)
+        for idx, spend, pred_conv in zip(order[:count].tolist(), spend_local[:count].tolist(), predicted.tolist()):
+            rec = {
+                'influencer_name': influencers[idx].get('influencer_name', 'Unknown'),
+                'allocated_budget': spend,
+                'predicted_conversions': pred_conv,
+                'effective_cac': float(cac),
+                'tier': name,
+                'market': market
+            }
+            recs.append(rec)
+            tier_breakdown[name].append(rec)
+        allocated = float(running[count - 1])
+
     return recs, allocated, tier_breakdown
 
+def influencer_cac_eur(influencers) -> np.ndarray:
+    """Per-influencer CAC in EUR: effective_cac_eur, else total spend / total conversions, else NaN."""
+    def column(key):
+        return np.fromiter((float(inf.get(key, 0.0) or 0.0) for inf in influencers), dtype=float, count=len(influencers))
+    spend, conversions, effective = column('total_spend_eur'), column('total_conversions'), column('effective_cac_eur')
+    derived = np.divide(spend, conversions, out=np.full_like(spend, np.nan), where=conversions > 0)
+    return np.where(effective > 0, effective, derived)
+
+def tier_share_bounds(tier_shares) -> dict:
+    """Validates per-tier [min_share, max_share] settings into {"Gold": (min, max), ...}.
+
+    Unknown tiers are dropped and malformed entries fall back to (0.0, 1.0), each with a warning.
+    """
+    bounds = {name: (0.0, 1.0) for name in TIER_LABELS}
+    for tier, share in (tier_shares or {}).items():
+        name = str(tier).capitalize()
+        if name not in bounds:
+            logger.warning(f"Ignoring tier share for unknown tier '{tier}'")
+            continue
+        numbers = isinstance(share, (list, tuple)) and len(share) == 2 and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in share)
+        if not numbers or not 0.0 <= share[0] <= share[1] <= 1.0:
+            logger.warning(f"Ignoring tier share {share!r} for {name}: expected [min_share, max_share] with 0 <= min <= max <= 1")
+            continue
+        bounds[name] = (float(share[0]), float(share[1]))
+    return bounds
+
+DEFAULT_TIER_SHARES = tier_share_bounds(PLAN_TIER_SHARES)
+
+# The optimal strategy solves its knapsack over the budget cut into at most this many steps.
+KNAPSACK_BUDGET_STEPS = 2000
+
+# Per tier: indices of usable influencers, per-influencer cost and CAC (local currency), candidate step weights and the DP keep table.
+_TierSolution = collections.namedtuple("_TierSolution", "candidates cost cac weights keep")
+
+def _tier_knapsack(weights, values, capacity):
+    """0/1 knapsack by dynamic programming over integer weights.
+
+    Returns (best, keep): best[c] is the highest total value spending exactly c (-inf if unreachable),
+    and keep[k, c] records whether item k is taken in the best solution for c among items 0..k.
+    """
+    best = np.full(capacity + 1, -np.inf)
+    best[0] = 0.0
+    keep = np.zeros((len(weights), capacity + 1), dtype=bool)
+    for k, (w, v) in enumerate(zip(weights, values)):
+        if w > capacity:
+            continue
+        candidate = np.full(capacity + 1, -np.inf)
+        candidate[w:] = best[:capacity + 1 - w] + v
+        keep[k] = candidate > best
+        best = np.where(keep[k], candidate, best)
+    return best, keep
+
+def _knapsack_items(keep, weights, spend):
+    """Walks the keep table back from `spend` to the indices of the items taken."""
+    taken = []
+    for k in range(len(weights) - 1, -1, -1):
+        if keep[k, spend]:
+            taken.append(k)
+            spend -= weights[k]
+    return taken
+
+@allocation_strategy("optimal")
+def allocate_budget_optimal(gold, silver, bronze, budget, cac=50, market='France', tier_shares=None):
+    """Maximizes predicted conversions within the budget.
+
+    Each influencer costs one campaign at their average spend and converts at their own CAC
+    (`cac` when they have no history; they are left out if `cac` is not positive). This is a 0/1
+    knapsack, solved by dynamic programming over rounded costs per tier; the tiers are then combined under
+    the budget and tier_shares, which optionally maps a tier to [min_share, max_share] of the budget.
+    Costs are rounded up to steps of budget / KNAPSACK_BUDGET_STEPS (at least one currency unit),
+    so the budget and tier caps are never exceeded, and the budget this leaves unused is filled with
+    the lowest-CAC candidates that still fit. A tier minimum no candidate mix can reach is lowered
+    to what the tier can spend.
+    """
+    bounds = DEFAULT_TIER_SHARES if tier_shares is None else tier_share_bounds(tier_shares)
+    rate = get_currency_info(market)['rate']
+    tiers = [('Gold', gold), ('Silver', silver), ('Bronze', bronze)]
+    recs, tier_breakdown = [], {name: [] for name, _ in tiers}
+    if budget <= 0:
+        return recs, 0.0, tier_breakdown
+
+    step = max(1.0, budget / KNAPSACK_BUDGET_STEPS)
+    capacity = int(budget // step)
+    # combined[c]: best value over the tiers so far spending c steps; spends[t][c]: tier t's share of that.
+    combined, spends, solutions = None, [], []
+    for name, influencers in tiers:
+        cost = average_spend_per_campaign(influencers) * rate
+        cac_local = influencer_cac_eur(influencers) * rate
+        cac_local = np.where(np.isfinite(cac_local) & (cac_local > 0), cac_local, float(cac))
+        # With a what-if CAC of 0 or less, influencers without their own CAC have no usable prediction and are skipped.
+        candidates = np.flatnonzero((cost > 0) & (cac_local > 0))
+        weights = np.ceil(cost[candidates] / step - 1e-9).astype(int).tolist()
+        best, keep = _tier_knapsack(weights, (cost[candidates] / cac_local[candidates]).tolist(), capacity)
+        solutions.append(_TierSolution(candidates, cost, cac_local, weights, keep))
+
+        low, high = bounds[name]
+        cap = min(capacity, int(budget * high // step))
+        best[cap + 1:] = -np.inf
+        reachable = np.flatnonzero(np.isfinite(best))
+        floor = min(int(np.ceil(budget * low / step - 1e-9)), int(reachable.max()))
+        best[:floor] = -np.inf
+
+        if combined is None:
+            combined, spends = best, [np.arange(capacity + 1)]
+            continue
+        # Max-plus convolution: the best split of each total spend between the earlier tiers and this one.
+        merged, choice = np.full(capacity + 1, -np.inf), np.zeros(capacity + 1, dtype=int)
+        for spend in np.flatnonzero(np.isfinite(best)).tolist():
+            shifted = np.full(capacity + 1, -np.inf)
+            shifted[spend:] = combined[:capacity + 1 - spend] + best[spend]
+            better = shifted > merged
+            merged[better], choice[better] = shifted[better], spend
+        spends = [previous[np.arange(capacity + 1) - choice] for previous in spends] + [choice]
+        combined = merged
+
+    total = int(np.argmax(combined))
+    if not np.isfinite(combined[total]):
+        return recs, 0.0, tier_breakdown
+    chosen = {t: {int(solution.candidates[k]) for k in _knapsack_items(solution.keep, solution.weights, int(tier_spend[total]))}
+              for t, (solution, tier_spend) in enumerate(zip(solutions, spends))}
+    spent = [float(sum(solutions[t].cost[i] for i in chosen[t])) for t in range(len(tiers))]
+    # Rounding costs up leaves some budget unused; fill it with the best remaining candidates that still fit.
+    remaining = sorted(((t, int(i)) for t, solution in enumerate(solutions) for i in solution.candidates if int(i) not in chosen[t]),
+                       key=lambda item: (solutions[item[0]].cac[item[1]], solutions[item[0]].cost[item[1]]))
+    for t, i in remaining:
+        item_cost = float(solutions[t].cost[i])
+        if sum(spent) + item_cost <= budget and spent[t] + item_cost <= budget * bounds[tiers[t][0]][1]:
+            chosen[t].add(i)
+            spent[t] += item_cost
+
+    for t, (name, influencers) in enumerate(tiers):
+        cost, cac_local = solutions[t].cost, solutions[t].cac
+        for i in chosen[t]:
+            rec = {
+                'influencer_name': influencers[i].get('influencer_name', 'Unknown'),
+                'allocated_budget': float(cost[i]),
+                'predicted_conversions': int(cost[i] / cac_local[i]),
+                'effective_cac': float(cac_local[i]),
+                'tier': name,
+                'market': market
+            }
+            recs.append(rec)
+            tier_breakdown[name].append(rec)
+    recs.sort(key=lambda rec: (rec['effective_cac'], rec['allocated_budget']))
+    for tier_recs in tier_breakdown.values():
+        tier_recs.sort(key=lambda rec: (rec['effective_cac'], rec['allocated_budget']))
+    return recs, float(sum(spent)), tier_breakdown
+
+def allocate_budget(strategy, gold, silver, bronze, budget, cac=50, market='France', **options):
+    """Runs the named allocation strategy, falling back to the cascade for unknown names."""
+    if strategy not in ALLOCATION_STRATEGIES:
+        logger.warning(f"Unknown allocation strategy '{strategy}'; using cascade")
+        strategy = "cascade"
+    logger.info(f"Allocating {budget:.2f} ({market}) with the {strategy} strategy")
+    with span("plan.allocate", strategy=strategy):
+        return ALLOCATION_STRATEGIES[strategy](gold, silver, bronze, budget, cac, market, **options)
+
+# --- What-if scenarios ---
+def scenario_variants(context, request) -> list:
+    """Expands a parsed scenario request into (budget, cac) pairs relative to the stored plan."""
+    def values(base, changes):
+        return [base * (1 + change / 100) if kind == "pct" else change for kind, change in changes] or [base]
+    budgets = values(context['remaining_budget'], request['budget'])
+    cacs = values(context.get('cac', 50), request['cac'])
+    return [(budget, cac) for budget in budgets for cac in cacs][:MAX_SCENARIOS]
+
+def evaluate_scenarios(context, request) -> list:
+    """Re-runs the allocation for the current plan and each variant, using the candidates stored with the plan."""
+    tiers, market, strategy = context['tier_candidates'], context['params']['market'], context.get('strategy', 'cascade')
+    results = []
+    for budget, cac in [(context['remaining_budget'], context.get('cac', 50))] + scenario_variants(context, request):
+        recs, allocated, _ = allocate_budget(strategy, *(tiers.get(tier, []) for tier in TIERS), budget, cac, market)
+        conversions = sum(r['predicted_conversions'] for r in recs)
+        results.append({'budget': budget, 'cac': cac, 'influencers': len(recs), 'allocated': allocated, 'conversions': conversions, 'avg_cac': allocated / conversions if conversions else 0.0})
+    return results
+
+def format_scenarios(results, market) -> str:
+    lines = ["*What-if Scenarios* (recomputed from this plan's data)", "Scenario | Budget | CAC | Influencers | Allocated | Est. Conversions | Avg CAC"]
+    for i, r in enumerate(results):
+        label = "Current plan" if i == 0 else f"Scenario {i}"
+        lines.append(f"{label} | {format_currency(r['budget'], market)} | {format_currency(r['cac'], market)} | {r['influencers']} | {format_currency(r['allocated'], market)} | {r['conversions']} | {format_currency(r['avg_cac'], market)}")
+    return "\n".join(lines)
+
+CURRENCY_COLUMNS = ('allocated_budget', 'effective_cac')
+
+def currency_number_format(market) -> str:
+    """Excel number format matching format_currency: "12,345 SEK" or "€12,345.67"."""
+    currency_info = get_currency_info(market)
+    if currency_info['name'] in ['SEK', 'NOK', 'DKK']:
+        return f'#,##0 "{currency_info["symbol"]}"'
+    return f'"{currency_info["symbol"]}"#,##0.00'
+
+@timed("excel.render")
 def create_excel_report(recs, market, month, year, target_budget, actual_spend, remaining_budget, total_allocated, booked_influencers):
-    buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        budget_data = {
-            'Metric': ['Target Budget', 'Actual Spend', 'Remaining Budget', 'Recommended Allocation'],
-            'Amount': [
-                format_currency(target_budget, market),
-                format_currency(actual_spend, market),
-                format_currency(remaining_budget, market),
-                format_currency(total_allocated, market)
-            ]
-        }
-        pd.DataFrame(budget_data).to_excel(writer, sheet_name='Budget Summary', index=False)
-        if recs:
-            pd.DataFrame(recs).to_excel(writer, sheet_name='All Recommendations', index=False)
-        if booked_influencers:
-            booked_data = [{'Influencer Name': inf.get('influencer_name', 'Unknown'), 'Spent Budget (Local)': format_currency(convert_eur_to_local(inf.get('total_spend_eur', 0), market), market)} for inf in booked_influencers]
-            pd.DataFrame(booked_data).to_excel(writer, sheet_name='Booked Influencers', index=False)
-    buffer.seek(0)
-    return buffer
+    """Writes the plan workbook row by row (openpyxl write-only mode) into an in-memory file positioned at 0.
+
+    Amounts are numeric cells with the market's currency format, so they stay sortable and summable.
+    """
+    from openpyxl import Workbook  # imported on first use to keep bot start-up fast
+    from openpyxl.cell import WriteOnlyCell
+
+    money_format = currency_number_format(market)
+    workbook = Workbook(write_only=True)
+
+    def money(sheet, value):
+        cell = WriteOnlyCell(sheet, value=float(value or 0.0))
+        cell.number_format = money_format
+        return cell
+
+    sheet = workbook.create_sheet('Budget Summary')
+    sheet.append(['Metric', 'Amount'])
+    for metric, amount in [('Target Budget', target_budget), ('Actual Spend', actual_spend), ('Remaining Budget', remaining_budget), ('Recommended Allocation', total_allocated)]:
+        sheet.append([metric, money(sheet, amount)])
+
+    if recs:
+        sheet = workbook.create_sheet('All Recommendations')
+        columns = list(dict.fromkeys(key for rec in recs for key in rec))
+        sheet.append(columns)
+        for rec in recs:
+            sheet.append([money(sheet, rec.get(col)) if col in CURRENCY_COLUMNS else rec.get(col) for col in columns])
+
+    if booked_influencers:
+        sheet = workbook.create_sheet('Booked Influencers')
+        sheet.append(['Influencer Name', 'Spent Budget (Local)'])
+        for inf in booked_influencers:
+            sheet.append([inf.get('influencer_name', 'Unknown'), money(sheet, convert_eur_to_local(inf.get('total_spend_eur', 0), market))])
+
+    report = io.BytesIO()
+    workbook.save(report)
+    report.seek(0)
+    return report
 
 def create_llm_prompt(market, month, year, target_budget, actual_spend, remaining_budget, recommendations, total_allocated, tier_breakdown):
     safe_total_allocated = float(total_allocated or 0.0)
@@ -114,6 +368,9 @@ Influencer Name | Tier | Budget | Conv. | Est. CAC
 """
     return prompt, pre_formatted_report
 
+def context_data(context):
+    return {'targets': context.get('raw_target_data', {}), 'actuals': context.get('raw_actual_data', {}), 'recommendations': context.get('plan_recommendations', [])}
+
 def run_strategic_plan(client, say, event, thread_ts, params, thread_context_store):
     try:
         market, month_abbr, month_full, year = params['market'], params['month_abbr'], params['month_full'], params['year']
@@ -123,46 +380,78 @@ def run_strategic_plan(client, say, event, thread_ts, params, thread_context_sto
     say(f"📊 Creating a strategic plan for *{market.upper()}* for *{month_full} {year}*...", thread_ts=thread_ts)
 
     target_payload = {"source": "dashboard", "filters": {"market": market, "year": year}}
-    target_data = query_api(UNIFIED_API_URL, target_payload, "Dashboard (Targets)")
-    if "error" in target_data: say(f"API Error: `{target_data['error']}`", thread_ts=thread_ts); return
-        
     actuals_payload = {"source": "influencer_analytics", "view": "monthly_breakdown", "filters": {"market": market, "month": month_full, "year": year}}
-    actual_data_response = query_api(UNIFIED_API_URL, actuals_payload, "Influencer Analytics (Monthly)")
-    if "error" in actual_data_response: say(f"API Error: `{actual_data_response['error']}`", thread_ts=thread_ts); return
 
-    target_budget = next((float(m.get("target_budget_clean", 0.0)) for m in target_data.get("monthly_detail", []) if str(m.get("month", "")).lower() == str(month_abbr).lower()), 0.0)
+    # Targets, actuals and discovery tiers are independent queries, so they are fetched concurrently.
+    # The tier fetch is speculative: it is cancelled if the budget turns out to be exhausted.
+    pool = ThreadPoolExecutor(max_workers=PLAN_FETCH_WORKERS, thread_name_prefix="plan-fetch")
+    try:
+        # Each query runs in a copy of this context so its metrics keep the request's labels.
+        target_future = pool.submit(contextvars.copy_context().run, query_api, UNIFIED_API_URL, target_payload, "Dashboard (Targets)")
+        actuals_future = pool.submit(contextvars.copy_context().run, query_api, UNIFIED_API_URL, actuals_payload, "Influencer Analytics (Monthly)")
+        tiers_future = pool.submit(contextvars.copy_context().run, query_api, UNIFIED_API_URL, discovery_payload(market, year), "Discovery Tiers")
+
+        target_data = target_future.result()
+        if "error" in target_data: say(f"API Error: `{target_data['error']}`", thread_ts=thread_ts); return
+
+        actual_data_response = actuals_future.result()
+        if "error" in actual_data_response: say(f"API Error: `{actual_data_response['error']}`", thread_ts=thread_ts); return
+
+        target_budget = next((float(m.get("target_budget_clean", 0.0)) for m in target_data.get("monthly_detail", []) if str(m.get("month", "")).lower() == str(month_abbr).lower()), 0.0)
+
+        summary = (actual_data_response.get("monthly_data") or [{}])[0].get("summary", {})
+        actual_spend_eur = float(summary.get("total_spend_eur", 0.0))
+        actual_spend = convert_eur_to_local(actual_spend_eur, market)
+        
+        booked_influencers = (actual_data_response.get("monthly_data") or [{}])[0].get("details", [])
+        booked_names = {inf.get('influencer_name') for inf in booked_influencers if inf.get('influencer_name')}
+        remaining_budget = target_budget - actual_spend
+        
+        if remaining_budget <= 0:
+            tiers_future.cancel()
+            say(f"The budget for this period has already been fully utilized or overspent.", thread_ts=thread_ts); return
+        
+        tiers = split_tiers(tiers_future.result(), booked_names)
+        gold, silver, bronze = (tiers[tier] for tier in TIERS)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-    summary = (actual_data_response.get("monthly_data") or [{}])[0].get("summary", {})
-    actual_spend_eur = float(summary.get("total_spend_eur", 0.0))
-    actual_spend = convert_eur_to_local(actual_spend_eur, market)
-    
-    booked_influencers = (actual_data_response.get("monthly_data") or [{}])[0].get("details", [])
-    booked_names = {inf.get('influencer_name') for inf in booked_influencers if inf.get('influencer_name')}
-    remaining_budget = target_budget - actual_spend
-    
-    if remaining_budget <= 0:
-        say(f"The budget for this period has already been fully utilized or overspent.", thread_ts=thread_ts); return
-    
-    gold, silver, bronze = fetch_tier_influencers(market, year, "gold", booked_names), fetch_tier_influencers(market, year, "silver", booked_names), fetch_tier_influencers(market, year, "bronze", booked_names)
     if not any([gold, silver, bronze]):
         say(f"Excellent! All available high-performing influencers seem to be booked for this period.", thread_ts=thread_ts); return
 
-    recs, total_allocated, tier_breakdown = allocate_budget_cascading_tiers(gold, silver, bronze, remaining_budget, 50, market)
+    strategy = params.get('strategy') or PLAN_ALLOCATION_STRATEGY
+    recs, total_allocated, tier_breakdown = allocate_budget(strategy, gold, silver, bronze, remaining_budget, 50, market)
     if not recs:
         say(f"No available influencers could be booked with the remaining budget of {format_currency(remaining_budget, market)}.", thread_ts=thread_ts); return
 
     try:
         channel_id = event.get('channel') or event.get('channel_id')
-        excel_buffer = create_excel_report(recs, market, month_full, year, target_budget, actual_spend, remaining_budget, total_allocated, booked_influencers)
-        client.files_upload_v2(channel=channel_id, file=excel_buffer.getvalue(), filename=f"Strategic_Plan_{market}_{month_full}_{year}.xlsx", title=f"Strategic Plan Details", initial_comment="For your convenience, here is the detailed plan in an Excel file:", thread_ts=thread_ts)
-        
         prompt, report_text = create_llm_prompt(market, month_full, year, target_budget, actual_spend, remaining_budget, recs, total_allocated, tier_breakdown)
-        response = gemini_model.generate_content(prompt)
-        
-        for chunk in split_message_for_slack(report_text): say(text=chunk, thread_ts=thread_ts)
-        say(text=response.text, thread_ts=thread_ts)
 
-        thread_context_store[thread_ts] = {'type': 'strategic_plan', 'params': params, 'raw_target_data': target_data, 'raw_actual_data': actual_data_response, 'plan_recommendations': recs, 'bot_response': report_text + "\n" + response.text}
+        def upload_excel_report():
+            with create_excel_report(recs, market, month_full, year, target_budget, actual_spend, remaining_budget, total_allocated, booked_influencers) as excel_file:
+                # Passed as bytes, which every slack_sdk version accepts; it reads file objects fully anyway.
+                client.files_upload_v2(channel=channel_id, file=excel_file.read(), filename=f"Strategic_Plan_{market}_{month_full}_{year}.xlsx", title=f"Strategic Plan Details", initial_comment="For your convenience, here is the detailed plan in an Excel file:", thread_ts=thread_ts)
+
+        # The Excel file and the LLM insights are independent, so the file is rendered and uploaded
+        # while the insights are generated; both branches are joined before the context is stored.
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-report") as report_pool:
+            upload_future = report_pool.submit(contextvars.copy_context().run, upload_excel_report)
+            try:
+                for chunk in split_message_for_slack(report_text): say(text=chunk, thread_ts=thread_ts)
+                insights = generate_and_post(say, thread_ts, prompt)
+            except Exception as e:
+                logger.error(f"Error generating plan insights: {e}", exc_info=True); say(f"I couldn't generate the strategic insights: `{str(e)}`", thread_ts=thread_ts)
+                insights = ""
+            try:
+                upload_future.result()
+            except Exception as e:
+                logger.error(f"Error uploading plan Excel report: {e}", exc_info=True); say(f"I couldn't attach the Excel file: `{str(e)}`", thread_ts=thread_ts)
+
+        context = {'type': 'strategic_plan', 'params': params, 'raw_target_data': target_data, 'raw_actual_data': actual_data_response, 'plan_recommendations': recs, 'bot_response': report_text + "\n" + insights,
+                   # Inputs for local what-if scenarios in follow-ups, so they need no new API calls
+                   'tier_candidates': tiers, 'target_budget': target_budget, 'actual_spend': actual_spend, 'remaining_budget': remaining_budget, 'strategy': strategy, 'cac': 50}
+        thread_context_store[thread_ts] = {**context, **build_digest(context_data(context))}
         say(text="💬 This plan is ready for review. Feel free to ask any follow-up questions right here in this thread!", thread_ts=thread_ts)
     except Exception as e:
         logger.error(f"Error during report generation for plan: {e}", exc_info=True); say(f"I'm sorry, an error occurred: `{str(e)}`", thread_ts=thread_ts)
@@ -172,10 +461,15 @@ def handle_thread_replies(event, say, client, context):
     thread_ts, user_id = event["thread_ts"], event.get('user')
     logger.info(f"Handling follow-up for strategic_plan in thread {thread_ts}")
     try:
+        if 'tier_candidates' in context and (request := parse_scenario_request(user_message)):
+            logger.info(f"Evaluating what-if scenarios locally for thread {thread_ts}: {request}")
+            for chunk in split_message_for_slack(format_scenarios(evaluate_scenarios(context, request), context['params']['market'])):
+                say(text=f"<@{user_id}> {chunk}", thread_ts=thread_ts)
+            return
         context_prompt = f"""
         You are a helpful marketing analyst assistant.
         **Current Context:** A Strategic Plan for **{context['params']['market']}** for **{context['params']['month_full']} {context['params']['year']}**.
-        **Available Data:** You have the full JSON data used to create this plan: {json.dumps({'targets': context.get('raw_target_data', {}), 'actuals': context.get('raw_actual_data', {}), 'recommendations': context.get('plan_recommendations', [])})}
+        **Available Data:** You have the data used to create this plan: {follow_up_context(context, context_data(context), user_message)}
         
         **User's Follow-up:** "{user_message}"
         
@@ -185,8 +479,6 @@ def handle_thread_replies(event, say, client, context):
             - Correct response example: "That's a great question. I can't directly compare, as my current context is only the November plan. I don't have the June data loaded right now. To answer, I'd need to run a new review for June."
         3. Present your answer naturally, without phrases like "based on the provided data".
         """
-        response = gemini_model.generate_content(context_prompt)
-        for chunk in split_message_for_slack(response.text):
-            say(text=f"<@{user_id}> {chunk}", thread_ts=thread_ts)
+        generate_and_post(say, thread_ts, context_prompt, prefix=f"<@{user_id}> ", site="follow_up")
     except Exception as e:
         logger.error(f"Error handling thread question in plan.py: {e}"); say(text=f"<@{user_id}> I encountered an error: `{str(e)}`.", thread_ts=thread_ts)
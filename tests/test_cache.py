@@ -0,0 +1,70 @@
+import threading
+import time
+import pytest
+from common.cache import TTLCache, canonical_key
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_canonical_key_ignores_key_order():
+    assert canonical_key({"a": 1, "b": {"c": 2, "d": 3}}) == canonical_key({"b": {"d": 3, "c": 2}, "a": 1})
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_bytes=1000, clock=clock)
+    cache.set("k", "value", ttl=10)
+
+    clock.now = 9
+    assert cache.get("k") == "value"
+    clock.now = 11
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_respects_byte_budget():
+    cache = TTLCache(max_bytes=20)
+    cache.set("a", "x" * 9, ttl=60)
+    cache.set("b", "x" * 9, ttl=60)
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", "x" * 9, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 20
+
+def test_get_or_load_is_single_flight():
+    cache = TTLCache(max_bytes=1000)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "loaded"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader, ttl=60))) for _ in range(5)]
+    for t in threads: t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads: t.join()
+
+    assert results == ["loaded"] * 5
+    assert len(calls) == 1
+
+def test_get_or_load_does_not_cache_failures():
+    cache = TTLCache(max_bytes=1000)
+    def failing():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("k", failing, ttl=60)
+    assert cache.get_or_load("k", lambda: "ok", ttl=60) == "ok"
+
+def test_get_or_load_skips_values_that_are_not_cacheable():
+    cache = TTLCache(max_bytes=1000)
+    assert cache.get_or_load("k", lambda: "error", ttl=60, cacheable=lambda v: v != "error") == "error"
+    assert cache.get_or_load("k", lambda: "ok", ttl=60, cacheable=lambda v: v != "error") == "ok"
+    assert cache.get("k") == "ok"
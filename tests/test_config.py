@@ -0,0 +1,16 @@
+from common.config import _json_env, _valid_retry_policies
+
+def test_json_env_parses_valid_values(monkeypatch):
+    monkeypatch.setenv("NOVA_TEST_JSON", '{"dashboard": 60}')
+    assert _json_env("NOVA_TEST_JSON", {}) == {"dashboard": 60}
+
+def test_json_env_falls_back_on_malformed_or_mistyped_values(monkeypatch):
+    monkeypatch.setenv("NOVA_TEST_JSON", "{dashboard: 60")
+    assert _json_env("NOVA_TEST_JSON", {"a": 1}) == {"a": 1}
+    monkeypatch.setenv("NOVA_TEST_JSON", "[1, 2]")
+    assert _json_env("NOVA_TEST_JSON", {}) == {}
+
+def test_malformed_retry_policies_are_dropped():
+    overrides = {"dashboard": 5, "a": {"attempts": 0}, "b": {"attempts": "3"}, "c": {"deadline": 0}, "d": {"retries": 2},
+                 "e": {"attempts": 2.0, "deadline": 10}, "f": {}}
+    assert _valid_retry_policies(overrides) == {"e": {"attempts": 2, "deadline": 10}, "f": {}}
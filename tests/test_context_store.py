@@ -0,0 +1,56 @@
+import pytest
+from common.context_store import ContextStore, MemoryContextStore, SQLiteContextStore, encode_context
+
+def make_context(rows=200):
+    return {"type": "monthly_review", "params": {"market": "UK"}, "raw_api_data": [{"influencer_name": f"inf{i}", "spend_eur": i} for i in range(rows)]}
+
+def test_large_fields_are_compressed_and_loaded_lazily():
+    store = MemoryContextStore(max_bytes=1_000_000, large_field_bytes=512)
+    store["t1"] = make_context()
+
+    small, blobs, _ = encode_context(make_context(), 512)
+    assert list(blobs) == ["raw_api_data"] and "params" in small
+
+    context = store["t1"]
+    assert context["type"] == "monthly_review"
+    assert "raw_api_data" not in context._loaded
+    assert context["raw_api_data"][5] == {"influencer_name": "inf5", "spend_eur": 5}
+    assert {**context}.keys() == make_context().keys()
+
+def test_memory_store_evicts_least_recently_used_by_bytes():
+    _, _, size = encode_context(make_context(), 512)
+    store = MemoryContextStore(max_bytes=int(size * 2.5), large_field_bytes=512)
+    store["a"] = make_context()
+    store["b"] = make_context()
+    store.move_to_end("a")  # "b" is now least recently used
+    store["c"] = make_context()
+
+    assert "a" in store and "c" in store and "b" not in store
+    assert store.stats()["evictions"] == 1
+
+def test_sqlite_store_persists_across_instances(tmp_path):
+    path = str(tmp_path / "contexts.db")
+    SQLiteContextStore(path, large_field_bytes=512)["t1"] = make_context()
+
+    reopened = SQLiteContextStore(path, large_field_bytes=512)
+    assert "t1" in reopened and len(reopened) == 1
+    assert reopened["t1"]["raw_api_data"][-1]["influencer_name"] == "inf199"
+
+    del reopened["t1"]
+    assert "t1" not in reopened
+
+def test_sqlite_store_evicts_oldest_threads(tmp_path):
+    _, _, size = encode_context(make_context(), 512)
+    store = SQLiteContextStore(str(tmp_path / "contexts.db"), max_bytes=int(size * 1.5), large_field_bytes=512)
+    store["a"] = make_context()
+    store["b"] = make_context()
+
+    assert list(store) == ["b"]
+    assert store.stats()["evictions"] == 1
+
+def test_context_store_backends_must_implement_move_to_end_and_stats():
+    class PartialStore(ContextStore):
+        __getitem__ = __setitem__ = __delitem__ = __iter__ = __len__ = lambda self, *args: None
+
+    with pytest.raises(TypeError):
+        PartialStore()
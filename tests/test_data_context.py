@@ -0,0 +1,46 @@
+from common.data_context import build_data_context, compact_json, estimate_tokens, build_digest, follow_up_context
+
+def test_compact_json_rounds_and_strips_whitespace():
+    assert compact_json({"spend": 1234.56789, "rows": [1, 2]}) == '{"spend":1234.57,"rows":[1,2]}'
+
+def test_record_lists_become_csv_tables():
+    data = {"summary": {"total_spend_eur": 300.0}, "details": [{"influencer_name": "a", "total_spend_eur": 100.0}, {"influencer_name": "b", "total_spend_eur": 200.0}]}
+
+    text = build_data_context(data)
+
+    assert '"details":"<table details>"' in text
+    assert "influencer_name,total_spend_eur\nb,200.0\na,100.0" in text
+
+def test_token_budget_keeps_top_rows_and_summarizes_the_rest():
+    rows = [{"influencer_name": f"inf{i}", "total_spend_eur": float(i), "conversions": 1} for i in range(500)]
+
+    text = build_data_context({"details": rows}, token_budget=400)
+
+    assert estimate_tokens(text) <= 450
+    assert "inf499," in text and "inf0," not in text
+    assert "more rows summarized] totals:" in text
+    assert '"conversions":' in text.splitlines()[-1]
+
+DATA = {"summary": {"total_spend_eur": 300.0}, "details": [{"influencer_name": f"inf{i}", "total_spend_eur": float(i), "notes": "x" * 40} for i in range(200)]}
+
+def test_follow_up_uses_precomputed_digest():
+    context = {"digest": "DIGEST"}
+    assert follow_up_context(context, DATA, "what was the total spend?") == "DIGEST"
+
+def test_follow_up_expands_rows_named_in_the_question():
+    digest = build_digest(DATA)
+    assert "inf3," not in digest["digest"]
+
+    text = follow_up_context(digest, DATA, "how did inf3 do?")
+
+    assert text.startswith(digest["digest"])
+    assert "inf3," in text
+
+def test_follow_up_sends_full_data_when_asked_for_everything():
+    text = follow_up_context({"digest": "DIGEST"}, DATA, "list all influencers")
+    assert "DIGEST" not in text and "[table details" in text
+
+def test_follow_up_keeps_the_digest_for_ordinary_all_and_each():
+    for message in ("which influencer did best of all?", "CAC for each tier", "is that all?"):
+        assert follow_up_context({"digest": "DIGEST"}, DATA, message) == "DIGEST"
+    assert "[table details" in follow_up_context({"digest": "DIGEST"}, DATA, "show me the full list")
@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from common.http import get_session, get_pool_stats, reset_session
+from common.utils import query_api, endpoint_health
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    reset_session()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/influencer/query"
+    server.shutdown()
+    reset_session()
+
+def test_get_session_is_shared():
+    assert get_session() is get_session()
+
+def test_query_api_reuses_pooled_connection(api_url):
+    for i in range(3):
+        assert query_api(api_url, {"source": "dashboard", "filters": {"year": 2020 + i}}, "Test") == {"ok": True}
+
+    stats = get_pool_stats()
+    assert stats["requests"] == 3
+    assert stats["pool_misses"] == 1
+    assert stats["pool_hits"] == 2
+
+def test_query_api_serves_repeat_payloads_from_cache(api_url):
+    payload = {"source": "dashboard", "filters": {"market": "UK", "year": 1999}}
+    reordered = {"filters": {"year": 1999, "market": "UK"}, "source": "dashboard"}
+
+    assert query_api(api_url, payload, "Test") == {"ok": True}
+    assert query_api(api_url, reordered, "Test") == {"ok": True}
+
+    assert get_pool_stats()["requests"] == 1
+
+class ScriptedHandler(KeepAliveHandler):
+    """Answers with the queued statuses in order (200 once they run out), after `delay` seconds."""
+    statuses, delay, hits = [], 0.0, 0
+    def do_POST(self):
+        type(self).hits += 1
+        time.sleep(self.delay)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 200:
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+@pytest.fixture
+def scripted_url(mocker):
+    mocker.patch.object(ScriptedHandler, "statuses", [])
+    mocker.patch.object(ScriptedHandler, "delay", 0.0)
+    mocker.patch.object(ScriptedHandler, "hits", 0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/influencer/query"
+    server.shutdown()
+
+def test_query_api_retries_server_errors_and_reports_health(scripted_url, mocker):
+    mocker.patch.dict("common.utils.API_RETRY_POLICIES", {"retry_test": {"attempts": 3, "base_delay": 0.01}})
+    ScriptedHandler.statuses.extend([503, 429])
+
+    assert query_api(scripted_url, {"source": "retry_test", "view": "v"}, "Test") == {"ok": True}
+    health = endpoint_health()["retry_test/v"]
+    assert (ScriptedHandler.hits, health["retries"], health["failures"], health["state"]) == (3, 2, 0, "closed")
+
+def test_query_api_opens_circuit_per_endpoint(scripted_url, mocker):
+    mocker.patch("common.utils.API_BREAKER_FAILURES", 2)
+    ScriptedHandler.statuses.extend([500] * 10)
+
+    for year in (1, 2):  # unlisted endpoints are not retried
+        assert "error" in query_api(scripted_url, {"source": "breaker_test", "filters": {"year": year}}, "Test")
+    result = query_api(scripted_url, {"source": "breaker_test", "filters": {"year": 3}}, "Test")
+
+    assert result == {"error": "The Test API is unavailable right now. Please try again in a minute."}
+    assert ScriptedHandler.hits == 2
+    assert endpoint_health()["breaker_test"]["short_circuits"] == 1
+
+def test_query_api_deadline_bounds_all_attempts(scripted_url, mocker):
+    mocker.patch.dict("common.utils.API_RETRY_POLICIES", {"slow_test": {"attempts": 5, "deadline": 0.3, "base_delay": 0.01}})
+    ScriptedHandler.delay = 1.0
+
+    start = time.perf_counter()
+    result = query_api(scripted_url, {"source": "slow_test"}, "Test")
+
+    assert result == {"error": "The Test API did not respond in time. Please try again shortly."}
+    assert time.perf_counter() - start < 0.9
+
+def test_query_api_does_not_cache_error_bodies(mocker):
+    fetch = mocker.patch("common.utils._fetch", side_effect=['{"error": "view not ready"}', '{}', '{"ok": true}', '{"ok": false}'])
+    payload = {"source": "dashboard", "filters": {"market": "UK", "year": 1998}}
+
+    assert query_api("http://lyra.invalid", payload, "Test") == {"error": "view not ready"}
+    assert query_api("http://lyra.invalid", payload, "Test") == {}
+    assert query_api("http://lyra.invalid", payload, "Test") == {"ok": True}
+    assert query_api("http://lyra.invalid", payload, "Test") == {"ok": True}
+    assert fetch.call_count == 3
@@ -0,0 +1,98 @@
+import threading
+import time
+from common.jobs import JobRunner, RetryLater
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_per_channel_limit_queues_and_notifies():
+    runner = JobRunner(max_workers=4, per_channel_limit=1, max_queue=10)
+    release = threading.Event()
+    started, positions = [], []
+
+    def job(name):
+        started.append(name)
+        release.wait(5)
+
+    assert runner.submit("C1", job, "first")
+    assert runner.submit("C1", job, "second", on_queued=positions.append)
+    assert runner.submit("C2", job, "other-channel")
+    assert wait_for(lambda: len(started) == 2)
+
+    assert sorted(started) == ["first", "other-channel"]
+    assert positions == [1]
+    assert runner.queue_depth() == 1
+
+    release.set()
+    assert wait_for(lambda: len(started) == 3 and runner.stats()["running"] == 0)
+    assert runner.stats()["completed"] == 3
+    runner.shutdown()
+
+def test_full_backlog_rejects_jobs():
+    runner = JobRunner(max_workers=1, per_channel_limit=1, max_queue=1)
+    release = threading.Event()
+
+    assert runner.submit("C1", release.wait, 5)
+    assert runner.submit("C2", release.wait, 5)
+    assert not runner.submit("C3", release.wait, 5)
+    assert runner.stats()["rejected"] == 1
+
+    release.set()
+    runner.shutdown()
+
+def test_failing_job_frees_its_slot():
+    runner = JobRunner(max_workers=1, per_channel_limit=1, max_queue=5)
+    done = threading.Event()
+
+    def boom():
+        raise RuntimeError("boom")
+
+    runner.submit("C1", boom)
+    runner.submit("C1", done.set)
+    assert done.wait(5)
+    assert wait_for(lambda: runner.stats().get("failed") == 1)
+    runner.shutdown()
+
+def test_jobs_with_the_same_serial_key_run_in_order_without_holding_workers():
+    runner = JobRunner(max_workers=2, per_channel_limit=2, max_queue=10)
+    release = threading.Event()
+    order = []
+
+    def job(name, block=False):
+        order.append(name)
+        if block:
+            release.wait(5)
+
+    runner.submit("C1", job, "t1-first", block=True, serial_key="t1")
+    runner.submit("C1", job, "t1-second", serial_key="t1")
+    runner.submit("C1", job, "t1-third", serial_key="t1")
+    runner.submit("C1", job, "t2", serial_key="t2")
+    # The second worker is free for another thread while t1's later messages wait.
+    assert wait_for(lambda: order == ["t1-first", "t2"])
+    assert runner.queue_depth() == 2
+
+    release.set()
+    assert wait_for(lambda: len(order) == 4 and runner.stats()["running"] == 0)
+    assert order[2:] == ["t1-second", "t1-third"]
+    assert runner._serial == {}
+    runner.shutdown()
+
+def test_retry_later_reruns_the_job_before_later_jobs_on_its_key():
+    runner = JobRunner(max_workers=1, per_channel_limit=1, max_queue=10)
+    attempts, order = [], []
+
+    def busy_once():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RetryLater(0.05)
+        order.append("retried")
+
+    runner.submit("C1", busy_once, serial_key="t1")
+    runner.submit("C1", order.append, "next", serial_key="t1")
+    assert wait_for(lambda: len(order) == 2)
+    assert order == ["retried", "next"]
+    assert runner.stats()["retried"] == 1
+    runner.shutdown()
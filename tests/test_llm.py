@@ -0,0 +1,198 @@
+import pytest
+from common.config import LLM_CALL_DEADLINE
+from common.llm import SlackStreamWriter, generate_and_post, STREAM_FAILED_MESSAGE, LLMGateway, LLMBudgetExceeded, set_llm_user, _llm_user, DEGRADED_MESSAGE
+from common.resilience import RetryPolicy, CircuitBreaker
+
+@pytest.fixture(autouse=True)
+def no_llm_user():
+    token = _llm_user.set("")
+    yield
+    _llm_user.reset(token)
+
+class RecordingClient:
+    def __init__(self):
+        self.updates = []
+    def chat_update(self, channel, ts, text):
+        self.updates.append((ts, text))
+
+class StreamingSay:
+    """Stands in for Bolt's Say, which exposes the WebClient it posts with."""
+    def __init__(self):
+        self.client = RecordingClient()
+        self.posted = []
+    def __call__(self, text, thread_ts):
+        self.posted.append(text)
+        return {"channel": "C123", "ts": f"ts{len(self.posted)}"}
+
+class PlainSay:
+    def __init__(self):
+        self.said_text = []
+    def __call__(self, text, thread_ts):
+        self.said_text.append(text)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def chunk(text):
+    class Chunk:
+        pass
+    c = Chunk()
+    c.text = text
+    return c
+
+def test_generate_and_post_streams_into_placeholder(mocker):
+    mocker.patch("common.llm.STREAM_LLM_RESPONSES", True)
+    generate = mocker.patch("common.config.gemini_model.generate_content", return_value=iter([chunk("Hello "), chunk("world")]))
+    say = StreamingSay()
+
+    text = generate_and_post(say, "ts0", "prompt")
+
+    assert text == "Hello world"
+    generate.assert_called_once_with("prompt", stream=True, request_options={"timeout": pytest.approx(LLM_CALL_DEADLINE, abs=5)})
+    assert len(say.posted) == 1  # only the placeholder
+    assert say.client.updates[-1] == ("ts1", "Hello world")
+
+def test_generate_and_post_without_client_posts_chunks(mocker):
+    mock_llm_response = mocker.Mock()
+    mock_llm_response.text = "Full answer"
+    mocker.patch("common.config.gemini_model.generate_content", return_value=mock_llm_response)
+    say = PlainSay()
+
+    assert generate_and_post(say, "ts0", "prompt", prefix="<@U1> ") == "Full answer"
+    assert say.said_text == ["<@U1> Full answer"]
+
+def test_stream_writer_batches_updates():
+    clock, say = FakeClock(), StreamingSay()
+    writer = SlackStreamWriter(say, "ts0", min_interval=1.0, clock=clock)
+
+    writer.write("a")
+    writer.write("b")
+    clock.now = 1.5
+    writer.write("c")
+    writer.close()
+
+    assert say.client.updates == [("ts1", "abc")]
+
+def test_stream_writer_rolls_over_long_text():
+    say = StreamingSay()
+    writer = SlackStreamWriter(say, "ts0", max_length=20, min_interval=0)
+
+    for line in ["line one\n", "line two\n", "line three\n", "line four\n"]:
+        writer.write(line)
+    writer.close()
+
+    # Each message ends up with its last update, or its posted text if it was never updated.
+    final_texts = {f"ts{i}": text for i, text in enumerate(say.posted, 1)}
+    final_texts.update(dict(say.client.updates))
+    assert len(final_texts) == 3
+    assert all(len(t) <= 20 for t in final_texts.values())
+    assert " ".join(final_texts[ts] for ts in sorted(final_texts)).split() == "line one line two line three line four".split()
+
+def test_gateway_truncates_or_rejects_oversize_prompts(mocker):
+    generate = mocker.patch("common.config.gemini_model.generate_content", return_value=chunk("ok"))
+    prompt = "Instructions up top. " + "x" * 4000 + " User's request at the end."
+
+    LLMGateway(max_prompt_tokens=100).generate(prompt, site="report")
+    sent = generate.call_args.args[0]
+    assert len(sent) < 500 and sent.startswith("Instructions up top.") and sent.endswith("User's request at the end.")
+
+    with pytest.raises(LLMBudgetExceeded, match="narrow it down"):
+        LLMGateway(max_prompt_tokens=100, oversize="reject").generate(prompt, site="report")
+    assert generate.call_count == 1
+
+def test_gateway_enforces_per_user_budgets_within_the_window(mocker):
+    mocker.patch("common.config.gemini_model.generate_content", return_value=chunk("answer"))
+    clock = FakeClock()
+    gateway = LLMGateway(user_limits=(2, 0), global_limits=(0, 0), clock=clock)
+
+    set_llm_user("U1")
+    gateway.generate("one", site="router")
+    gateway.generate("two", site="router")
+    with pytest.raises(LLMBudgetExceeded, match="Your AI request limit"):
+        gateway.generate("three", site="router")
+    set_llm_user("U2")
+    gateway.generate("other user", site="router")
+    set_llm_user("U1")
+    clock.now = 61
+    gateway.generate("after a minute", site="router")
+
+def test_gateway_accounts_streamed_usage_per_site_tool_and_user(mocker):
+    mocker.patch("common.config.gemini_model.generate_content", return_value=iter([chunk("a" * 40), chunk("b" * 40)]))
+    gateway = LLMGateway(costs_per_mtok=(1_000_000, 2_000_000))
+
+    set_llm_user("U1")
+    chunks = gateway.generate("p" * 400, site="follow_up", stream=True)
+    assert gateway.usage() == []  # charged once the stream finishes
+    assert "".join(c.text for c in chunks) == "a" * 40 + "b" * 40
+
+    [row] = gateway.usage(by=("site", "user"))
+    assert row == {"site": "follow_up", "user": "U1", "calls": 1, "input_tokens": 101, "output_tokens": 21, "cost_usd": 101 + 42}
+
+class QuotaExceeded(Exception):
+    code = 429  # what google.api_core's ResourceExhausted carries
+
+def test_gateway_retries_throttling_then_degrades_and_fails_fast(mocker):
+    generate = mocker.patch("common.config.gemini_model.generate_content", side_effect=QuotaExceeded("429 quota"))
+    breaker = CircuitBreaker("gemini", failure_threshold=3, reset_timeout=60)
+    sleeps = []
+    gateway = LLMGateway(retry_policy=RetryPolicy(attempts=3, base_delay=0.1, rng=lambda: 1.0), breaker=breaker, sleep=sleeps.append)
+    say = PlainSay()
+
+    mocker.patch("common.llm.gateway", gateway)
+    assert generate_and_post(say, "ts0", "prompt") == DEGRADED_MESSAGE
+    assert say.said_text == [DEGRADED_MESSAGE]
+    assert generate.call_count == 3 and sleeps == [0.1, 0.2]
+    assert breaker.state == "open"
+
+    generate_and_post(say, "ts0", "prompt")
+    assert generate.call_count == 3  # failed fast without calling Gemini
+
+def test_stream_writer_splits_lines_longer_than_a_message():
+    say = StreamingSay()
+    writer = SlackStreamWriter(say, "ts0", max_length=10, min_interval=0)
+
+    for _ in range(5):
+        writer.write("abcdefgh")
+    writer.close()
+
+    final_texts = {f"ts{i}": text for i, text in enumerate(say.posted, 1)}
+    final_texts.update(dict(say.client.updates))
+    assert all(len(t) <= 10 for t in final_texts.values())
+    assert "".join(final_texts[ts] for ts in sorted(final_texts, key=lambda ts: int(ts[2:]))) == "abcdefgh" * 5
+
+def test_generate_and_post_replaces_placeholder_when_the_stream_breaks(mocker):
+    mocker.patch("common.llm.STREAM_LLM_RESPONSES", True)
+    def broken_stream():
+        yield "Partial"
+        raise KeyError("candidates")
+    mocker.patch("common.llm._stream_chunks", return_value=broken_stream())
+    say = StreamingSay()
+
+    with pytest.raises(KeyError):
+        generate_and_post(say, "ts0", "prompt")
+
+    assert say.client.updates[-1][0] == "ts1"
+    assert "Something went wrong" in say.client.updates[-1][1]
+
+def test_split_message_for_slack_cuts_long_lines():
+    from common.utils import split_message_for_slack
+    chunks = split_message_for_slack("intro\n" + "x" * 25 + "\nend", max_length=10)
+    assert all(len(c) <= 10 for c in chunks)
+    assert "".join(chunks).replace("\n", "") == "intro" + "x" * 25 + "end"
+
+def test_gateway_reports_broken_streams_without_tripping_the_breaker(mocker):
+    mocker.patch("common.llm.STREAM_LLM_RESPONSES", True)
+    def blocked_stream():
+        yield chunk("Partial ")
+        raise ValueError("response was blocked")
+    mocker.patch("common.config.gemini_model.generate_content", return_value=blocked_stream())
+    breaker = CircuitBreaker("gemini", failure_threshold=1, reset_timeout=60)
+    mocker.patch("common.llm.gateway", LLMGateway(breaker=breaker))
+    say = StreamingSay()
+
+    assert generate_and_post(say, "ts0", "prompt") == f"Partial \n\n{STREAM_FAILED_MESSAGE}"
+    assert say.client.updates[-1] == ("ts1", f"Partial \n\n{STREAM_FAILED_MESSAGE}")
+    assert breaker.state == "closed"
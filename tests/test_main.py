@@ -1,5 +1,5 @@
 import pytest
-from main import normalize_market_name, process_routing_params
+from main import normalize_market_name, process_routing_params, route_natural_language_query, routing_cache, determine_thread_intent, format_bot_status, route_monthly_review
 
 @pytest.mark.parametrize("input_name, expected_name", [
     ("uk", "UK"),
@@ -28,3 +28,76 @@ def test_process_routing_params_preserves_existing_year():
     processed = process_routing_params(params)
     assert processed["market"] == "France"
     assert processed["year"] == 2024
+
+def test_route_natural_language_query_caches_by_normalized_text(mocker):
+    routing_cache.clear()
+    mock_llm_response = mocker.Mock()
+    mock_llm_response.text = '{"tool_name": "monthly-review", "parameters": {"market": "uk", "month_abbr": "Jun"}}'
+    generate = mocker.patch("common.config.gemini_model.generate_content", return_value=mock_llm_response)
+
+    first = route_natural_language_query("Monthly review for UK June")
+    first["parameters"]["market"] = "mutated"
+    second = route_natural_language_query("  Monthly review   for UK June? ")
+
+    assert generate.call_count == 1
+    assert second["parameters"]["market"] == "uk"
+    assert routing_cache.stats()["hits"] == 1
+
+def test_routing_cache_keeps_names_that_differ_in_case_apart(mocker):
+    routing_cache.clear()
+    responses = [mocker.Mock(text='{"tool_name": "analyse-influencer", "parameters": {"influencer_name": "Anna Berg"}}'),
+                 mocker.Mock(text='{"tool_name": "analyse-influencer", "parameters": {"influencer_name": "ANNA BERG"}}')]
+    generate = mocker.patch("common.config.gemini_model.generate_content", side_effect=responses)
+
+    assert route_natural_language_query("analyse Anna Berg")["parameters"]["influencer_name"] == "Anna Berg"
+    assert route_natural_language_query("analyse ANNA BERG")["parameters"]["influencer_name"] == "ANNA BERG"
+    assert generate.call_count == 2
+
+def test_route_natural_language_query_does_not_cache_errors(mocker):
+    routing_cache.clear()
+    mock_llm_response = mocker.Mock()
+    mock_llm_response.text = "not json"
+    generate = mocker.patch("common.config.gemini_model.generate_content", return_value=mock_llm_response)
+
+    assert route_natural_language_query("gibberish")["tool_name"] == "error"
+    assert route_natural_language_query("gibberish")["tool_name"] == "error"
+    assert generate.call_count == 2
+
+def test_determine_thread_intent_skips_llm_when_unambiguous(mocker):
+    generate = mocker.patch("common.config.gemini_model.generate_content")
+    november = {"tool_name": "monthly-review", "parameters": {"market": "UK", "month_abbr": "Nov", "month_full": "November", "year": 2025}}
+    router = mocker.patch("main.route_natural_language_query", return_value=november)
+    context = {"type": "monthly_review", "params": {"market": "UK", "month_full": "June", "year": 2025}}
+
+    assert determine_thread_intent("now show me November", context) == {"intent": "new_command", **november}
+    router.assert_called_once_with("now show me November")
+    assert determine_thread_intent("what was the total spend?", context) == {"intent": "follow-up"}
+    generate.assert_not_called()
+
+def test_determine_thread_intent_routes_in_the_same_llm_call(mocker):
+    routing_cache.clear()
+    mock_llm_response = mocker.Mock()
+    mock_llm_response.text = '```json{"intent": "new_command", "tool_name": "influencer-trend", "parameters": {"market": "UK"}}```'
+    generate = mocker.patch("common.config.gemini_model.generate_content", return_value=mock_llm_response)
+    context = {"type": "monthly_review", "params": {"market": "UK", "month_full": "June", "year": 2025}}
+
+    decision = determine_thread_intent("can you show the leaderboard", context)
+
+    assert decision == {"intent": "new_command", "tool_name": "influencer-trend", "parameters": {"market": "UK"}}
+    assert generate.call_count == 1
+
+def test_bot_status_reports_open_circuits(mocker):
+    mocker.patch("main.endpoint_health", return_value={"dashboard": {"state": "open", "queries": 6, "failures": 5, "retries": 8, "p95_ms": 20000.0}})
+
+    status = format_bot_status()
+
+    assert status.startswith("Bot Status: Degraded")
+    assert "• Lyra `dashboard`: open, 6 queries, 5 failed, 8 retries, p95 20000ms" in status
+
+def test_slash_command_shows_the_routers_degraded_message(mocker):
+    mocker.patch("main.route_natural_language_query", return_value={"tool_name": "error", "parameters": {"message": "The AI service is busy."}})
+    say = mocker.Mock(return_value={"ts": "1.0"})
+
+    route_monthly_review.__wrapped__(ack=lambda: None, say=say, command={"text": "next quarter please"})
+
+    say.assert_called_with("The AI service is busy.", thread_ts="1.0")
@@ -0,0 +1,71 @@
+import contextvars
+import json
+import urllib.request
+import pytest
+from common.metrics import LatencyWindow, MetricsRegistry, InstrumentedSay, registry, set_labels, start_metrics_server, _request_labels
+
+@pytest.fixture(autouse=True)
+def no_request_labels():
+    # Other tests call routing code outside a job, which sets labels on the main thread's context.
+    token = _request_labels.set({})
+    yield
+    _request_labels.reset(token)
+
+def test_span_records_percentiles_and_errors():
+    metrics = MetricsRegistry(window=100)
+    for ms in range(1, 101):
+        metrics.observe("lyra.query", ms / 1000, view="dashboard")
+    with pytest.raises(ValueError):
+        with metrics.span("lyra.query", view="dashboard"):
+            raise ValueError("boom")
+
+    histograms = {tuple(sorted(h["labels"].items())): h for h in metrics.snapshot()["histograms"]}
+    ok = histograms[(("view", "dashboard"),)]
+    assert ok["count"] == 100 and ok["p50"] == 0.05 and ok["p95"] == 0.095 and ok["p99"] == 0.099
+    assert histograms[(("status", "error"), ("view", "dashboard"))]["count"] == 1
+
+def test_request_labels_stay_inside_their_context():
+    metrics = MetricsRegistry()
+
+    def request(tool):
+        set_labels(tool=tool, market="UK")
+        metrics.observe("router", 0.1)
+
+    contextvars.copy_context().run(request, "plan")
+    metrics.observe("router", 0.2)
+    labels = sorted(tuple(sorted(h["labels"].items())) for h in metrics.snapshot()["histograms"])
+    assert labels == [(), (("market", "UK"), ("tool", "plan"))]
+
+def test_instrumented_say_times_posts_and_client_calls(mocker):
+    registry.reset()
+    say = mocker.Mock(return_value={"ts": "1"})
+    say.client.chat_update.return_value = {"ok": True}
+    wrapped = InstrumentedSay(say)
+
+    assert wrapped("hi", thread_ts="t")["ts"] == "1"
+    wrapped.client.chat_update(channel="C", ts="1", text="x")
+    assert wrapped.channel is say.channel
+    assert {h["name"] for h in registry.snapshot()["histograms"]} == {"slack.say", "slack.chat_update"}
+
+def test_metrics_endpoint_serves_prometheus_and_json():
+    registry.reset()
+    registry.observe("intent", 0.25)
+    registry.increment("router.cache_hits")
+    server = start_metrics_server(0)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        text = urllib.request.urlopen(f"{base}/metrics").read().decode()
+        assert 'nova_intent_seconds{quantile="0.50"} 0.250000' in text
+        assert "nova_router_cache_hits_total 1" in text
+        assert json.loads(urllib.request.urlopen(f"{base}/metrics.json").read())["histograms"][0]["name"] == "intent"
+    finally:
+        server.shutdown()
+
+def test_latency_window_keeps_totals_beyond_its_window():
+    window = LatencyWindow(window=3)
+    for value in (5.0, 1.0, 2.0, 3.0):
+        window.add(value)
+
+    summary = window.summary()
+    assert summary["count"] == 4 and summary["sum"] == 11.0 and summary["max"] == 5.0
+    assert summary["p99"] == 3.0  # the first sample has left the window
@@ -0,0 +1,97 @@
+import pytest
+from common.parsing import parse_slash_command, parse_market_month_year, classify_thread_intent, parse_scenario_request, FOLLOW_UP, NEW_COMMAND
+
+@pytest.mark.parametrize("text, expected", [
+    ("UK-June-2025", {"market": "UK", "month_abbr": "Jun", "month_full": "June", "year": 2025}),
+    ("france sep", {"market": "France", "month_abbr": "Sep", "month_full": "September"}),
+    ("United Kingdom-Nov-2024", {"market": "UK", "month_abbr": "Nov", "month_full": "November", "year": 2024}),
+    ("June-2025", None),
+    ("UK-June-next-year", None),
+    ("UK for June", None),
+    ("Germany-June-2025", None),
+])
+def test_parse_market_month_year(text, expected):
+    assert parse_market_month_year(text) == expected
+
+@pytest.mark.parametrize("text, tool, params", [
+    ("UK week 36", "weekly-review-by-number", {"market": "UK", "week_number": 36}),
+    ("sweden wk 5 2024", "weekly-review-by-number", {"market": "Sweden", "week_number": 5, "year": 2024}),
+    ("UK from 2025-06-01 to 2025-06-07", "weekly-review-by-range", {"market": "UK", "start_date": "2025-06-01", "end_date": "2025-06-07", "year": 2025}),
+    ("France 2025-09-15", "weekly-review-by-range", {"market": "France", "start_date": "2025-09-15", "end_date": "2025-09-15", "year": 2025}),
+])
+def test_parse_weekly_review_formats(text, tool, params):
+    assert parse_slash_command("weekly-review", text) == {"tool_name": tool, "parameters": params}
+
+@pytest.mark.parametrize("text", ["UK week 60", "UK from 2025-06-07 to 2025-06-01", "UK from 2025-02-30 to 2025-03-01", "last week in the UK", "the UK week 3"])
+def test_parse_weekly_review_rejects_invalid_input(text):
+    assert parse_slash_command("weekly-review", text) is None
+
+def test_parse_trend_filters():
+    assert parse_slash_command("influencer-trend", "") == {"tool_name": "influencer-trend", "parameters": {}}
+    assert parse_slash_command("influencer-trend", "UK-June-2025 gold")["parameters"] == {"market": "UK", "month_abbr": "Jun", "month_full": "June", "year": 2025, "tier": "gold"}
+    assert parse_slash_command("influencer-trend", "top 10 in UK?") is None
+    assert parse_slash_command("influencer-trend", "top influencers") is None
+    assert parse_slash_command("influencer-trend", "great britain silver")["parameters"] == {"market": "UK", "tier": "silver"}
+
+def test_parse_plan_and_influencer():
+    assert parse_slash_command("plan", "FR-Dec-2025")["parameters"]["market"] == "France"
+    assert parse_slash_command("analyse-influencer", "Jane Doe") == {"tool_name": "analyse-influencer", "parameters": {"influencer_name": "Jane Doe"}}
+    assert parse_slash_command("analyse-influencer", "") is None
+
+MONTHLY_CONTEXT = {"type": "monthly_review", "params": {"market": "UK", "month_abbr": "Jun", "month_full": "June", "year": 2025}}
+
+@pytest.mark.parametrize("message, expected", [
+    ("now show me November", NEW_COMMAND),
+    ("how about week 36?", NEW_COMMAND),
+    ("what about France?", NEW_COMMAND),
+    ("same thing for 2024?", NEW_COMMAND),
+    ("from June 3 to June 10", NEW_COMMAND),
+    ("what was the total spend?", FOLLOW_UP),
+    ("which influencer did best in June?", FOLLOW_UP),
+    ("no, I mean the top influencer?", FOLLOW_UP),
+    ("can you make a plan?", None),
+    ("how did Jan perform?", None),
+    ("NO, what was total spend?", None),
+    ("thanks", None),
+])
+def test_classify_thread_intent(message, expected):
+    assert classify_thread_intent(message, MONTHLY_CONTEXT) == expected
+
+def test_classify_thread_intent_same_week_is_follow_up():
+    context = {"type": "weekly_review_by_number", "params": {"market": "UK", "week_number": 36, "year": 2025}}
+    assert classify_thread_intent("what happened in week 36?", context) == FOLLOW_UP
+    assert classify_thread_intent("what about wk 37?", context) == NEW_COMMAND
+
+INFLUENCER_CONTEXT = {"type": "influencer_analysis", "params": {"influencer_name": "Jane Doe"}}
+RANGE_CONTEXT = {"type": "weekly_review_by_range", "params": {"market": "UK", "start_date": "2025-06-01", "end_date": "2025-06-07", "year": 2025}}
+
+@pytest.mark.parametrize("message, context, expected", [
+    ("how did she do in June?", INFLUENCER_CONTEXT, None),
+    ("UK numbers", INFLUENCER_CONTEXT, None),
+    ("how did week 24 go?", MONTHLY_CONTEXT, None),
+    ("what happened on June 3?", RANGE_CONTEXT, FOLLOW_UP),
+    ("and on 2025-06-07?", RANGE_CONTEXT, FOLLOW_UP),
+    ("what happened on June 12?", RANGE_CONTEXT, NEW_COMMAND),
+    ("how about July?", RANGE_CONTEXT, NEW_COMMAND),
+])
+def test_classify_thread_intent_only_compares_what_the_context_has(message, context, expected):
+    assert classify_thread_intent(message, context) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("what if budget was 20% higher", {"budget": [("pct", 20.0)], "cac": []}),
+    ("cut the budget by 10% and 25%", {"budget": [("pct", -10.0), ("pct", -25.0)], "cac": []}),
+    ("what if we had a budget of 50k and a CAC of 40 or 60", {"budget": [("abs", 50000.0)], "cac": [("abs", 40.0), ("abs", 60.0)]}),
+    ("what is the budget of the top 5?", None),
+    ("which gold influencers are included?", None),
+    ("what if the June 2025 budget was 10% higher", {"budget": [("pct", 10.0)], "cac": []}),
+    ("what if the budget was €2,000,000", {"budget": [("abs", 2000000.0)], "cac": []}),
+    ("what if we drop the top 3 influencers and keep the budget", None),
+    ("what if the budget covered 4 more creators?", None),
+])
+def test_parse_scenario_request(text, expected):
+    assert parse_scenario_request(text) == expected
+
+def test_scenario_messages_are_plan_follow_ups():
+    context = {"type": "strategic_plan", "params": {"market": "UK", "month_full": "June", "year": 2025}}
+    assert classify_thread_intent("budget 15% lower", context) == FOLLOW_UP
+    assert classify_thread_intent("drop the top 3 influencers and keep the budget", context) is None
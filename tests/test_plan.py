@@ -1,6 +1,10 @@
+import copy
+import random
 import pytest
-from plan import run_strategic_plan
+import time
+from plan import run_strategic_plan, handle_thread_replies, create_excel_report, split_tiers, allocate_budget_cascading_tiers, allocate_budget, allocate_budget_optimal, tier_share_bounds
 from io import BytesIO
+from openpyxl import load_workbook
 
 class MockSay:
     def __init__(self):
@@ -16,6 +20,7 @@ class MockClient:
         self.upload_called = True
         self.filename = filename
         assert isinstance(file, bytes)
+        self.file_bytes = file
 
 @pytest.fixture
 def mock_say():
@@ -69,3 +74,166 @@ def test_run_strategic_plan_budget_overspent(mocker, mock_say, mock_client):
 
     # Assert
     assert "budget for this period has already been fully utilized" in mock_say.said_text[1]
+
+def patch_plan_apis(mocker):
+    """Answers plan queries by payload, since they no longer run in a fixed order."""
+    mock_tier_data = {"gold": [{"influencer_name": "gold_inf", "total_spend_eur": 500, "campaigns": 2}, {"influencer_name": "booked_inf", "total_spend_eur": 100, "campaigns": 1}], "silver": [], "bronze": []}
+    responses = {
+        "dashboard": {"monthly_detail": [{"month": "dec", "target_budget_clean": 100000}]},
+        "monthly_breakdown": {"monthly_data": [{"summary": {"total_spend_eur": 17000}, "details": [{"influencer_name": "booked_inf"}]}]},
+        "discovery_tiers": mock_tier_data,
+    }
+    fake_query = mocker.patch("plan.query_api", side_effect=lambda url, payload, name: responses[payload.get("view", payload["source"])])
+    mock_llm_response = mocker.Mock()
+    mock_llm_response.text = "Strategic Insights here."
+    mocker.patch("common.config.gemini_model.generate_content", return_value=mock_llm_response)
+    return fake_query
+
+def test_run_strategic_plan_fetches_concurrently(mocker, mock_say, mock_client):
+    # Arrange
+    fake_query = patch_plan_apis(mocker)
+    mocker.patch("plan.create_excel_report", return_value=BytesIO(b"excel data"))
+    params = {'market': 'France', 'month_abbr': 'Dec', 'month_full': 'December', 'year': 2025}
+    thread_context = {}
+
+    # Act
+    run_strategic_plan(mock_client, mock_say, {'channel': 'C123'}, "ts123", params, thread_context)
+
+    # Assert
+    assert fake_query.call_count == 3
+    names = [rec['influencer_name'] for rec in thread_context["ts123"]["plan_recommendations"]]
+    assert names == ["gold_inf"]
+
+def test_failed_upload_does_not_block_insights(mocker, mock_say):
+    patch_plan_apis(mocker)
+    client = mocker.Mock()
+    client.files_upload_v2.side_effect = RuntimeError("upload failed")
+    params = {'market': 'France', 'month_abbr': 'Dec', 'month_full': 'December', 'year': 2025}
+    thread_context = {}
+
+    run_strategic_plan(client, mock_say, {'channel': 'C123'}, "ts123", params, thread_context)
+
+    assert any("Strategic Insights here." in s for s in mock_say.said_text)
+    assert any("couldn't attach the Excel file" in s for s in mock_say.said_text)
+    assert "Strategic Insights here." in thread_context["ts123"]["bot_response"]
+
+def test_split_tiers_filters_booked_in_one_pass():
+    data = {"gold": [{"influencer_name": "a"}, {"influencer_name": "b"}], "silver": [{"influencer_name": "c"}]}
+    tiers = split_tiers(data, {"b", "c"})
+    assert tiers == {"gold": [{"influencer_name": "a"}], "silver": [], "bronze": []}
+
+def reference_cascade(gold, silver, bronze, budget, cac, rate):
+    """The original per-influencer loop, kept here as the parity reference."""
+    recs, allocated = [], 0.0
+    for name, influencers in [('Gold', gold), ('Silver', silver), ('Bronze', bronze)]:
+        if allocated >= budget * 0.98: break
+        for inf in influencers:
+            count = inf.get('campaigns', 1) or 1
+            inf['averageSpendPerCampaign'] = float(inf.get('total_spend_eur', 0.0) or 0.0) / count if count > 0 else 0.0
+        for inf in sorted(influencers, key=lambda x: x['averageSpendPerCampaign']):
+            spend_local = inf['averageSpendPerCampaign'] * rate
+            if spend_local <= 0: continue
+            if allocated + spend_local <= budget:
+                recs.append((name, inf['influencer_name'], spend_local, int(spend_local / cac)))
+                allocated += spend_local
+                if allocated >= budget * 0.98: break
+    return recs, allocated
+
+def test_allocator_matches_reference_and_leaves_inputs_untouched():
+    rng = random.Random(7)
+    tiers = [[{"influencer_name": f"{tier}{i}", "total_spend_eur": rng.choice([0, None, rng.uniform(100, 5000)]), "campaigns": rng.choice([None, 0, 1, 2, 3])} for i in range(300)] for tier in "gsb"]
+    originals = copy.deepcopy(tiers)
+
+    for budget in (500, 20000, 150000, 10**7):
+        recs, allocated, breakdown = allocate_budget_cascading_tiers(*tiers, budget, 50, "Sweden")
+        expected_recs, expected_allocated = reference_cascade(*copy.deepcopy(tiers), budget, 50, 11.30)
+        assert [(r['tier'], r['influencer_name'], r['allocated_budget'], r['predicted_conversions']) for r in recs] == expected_recs
+        assert allocated == expected_allocated
+        assert sum(len(v) for v in breakdown.values()) == len(recs)
+        assert all(type(r['allocated_budget']) is float and type(r['predicted_conversions']) is int for r in recs)
+    assert tiers == originals
+
+def test_optimal_strategy_prefers_low_cac_influencers():
+    gold = [{"influencer_name": "pricey", "total_spend_eur": 1000, "campaigns": 1, "effective_cac_eur": 100}]
+    bronze = [{"influencer_name": "efficient", "total_spend_eur": 1000, "campaigns": 1, "effective_cac_eur": 10},
+              {"influencer_name": "history_only", "total_spend_eur": 2000, "campaigns": 2, "total_conversions": 50}]
+
+    cascade = allocate_budget("cascade", gold, [], bronze, 2000, 50, "France")
+    optimal = allocate_budget("optimal", gold, [], bronze, 2000, 50, "France")
+
+    assert [r["influencer_name"] for r in cascade[0]] == ["pricey", "efficient"]
+    assert [r["influencer_name"] for r in optimal[0]] == ["efficient", "history_only"]
+    assert sum(r["predicted_conversions"] for r in optimal[0]) == 100 + 25
+    assert optimal[1] == 2000 and optimal[2]["Gold"] == []
+
+def test_optimal_strategy_solves_the_knapsack_rather_than_ranking_by_cac():
+    # A has the best CAC, but B and C together use the whole budget for more conversions.
+    gold = [{"influencer_name": "A", "total_spend_eur": 60, "effective_cac_eur": 10},
+            {"influencer_name": "B", "total_spend_eur": 50, "effective_cac_eur": 11},
+            {"influencer_name": "C", "total_spend_eur": 50, "effective_cac_eur": 11}]
+
+    recs, allocated, _ = allocate_budget_optimal(gold, [], [], 100, market="France")
+
+    assert sorted(r["influencer_name"] for r in recs) == ["B", "C"] and allocated == 100
+
+def test_optimal_strategy_respects_tier_shares():
+    gold = [{"influencer_name": f"g{i}", "total_spend_eur": 100, "effective_cac_eur": 50} for i in range(10)]
+    silver = [{"influencer_name": f"s{i}", "total_spend_eur": 100, "effective_cac_eur": 5} for i in range(10)]
+
+    recs, allocated, breakdown = allocate_budget_optimal(gold, silver, [], 1000, market="France", tier_shares={"Gold": [0.3, 1.0], "Silver": [0.0, 0.5]})
+    assert len(breakdown["Gold"]) == 5 and len(breakdown["Silver"]) == 5
+    assert allocated == 1000
+
+@pytest.mark.parametrize("share", [0.3, [0.3], "x", [0.3, "0.7"], [0.8, 0.2], [-0.1, 0.5], [0.2, 1.5], None])
+def test_malformed_tier_shares_fall_back_to_the_full_range(share):
+    assert tier_share_bounds({"Gold": share, "silver": [0.1, 0.4], "Platinum": [0.5, 1]}) == {"Gold": (0.0, 1.0), "Silver": (0.1, 0.4), "Bronze": (0.0, 1.0)}
+    gold = [{"influencer_name": "g", "total_spend_eur": 100, "effective_cac_eur": 10}]
+    assert allocate_budget_optimal(gold, [], [], 1000, market="France", tier_shares={"Gold": share})[1] == 100
+
+@pytest.mark.parametrize("cac", [0, -10])
+def test_optimal_strategy_skips_influencers_without_history_when_cac_is_not_positive(cac):
+    bronze = [{"influencer_name": "no_history", "total_spend_eur": 100},
+              {"influencer_name": "known", "total_spend_eur": 100, "effective_cac_eur": 20}]
+    recs, allocated, _ = allocate_budget("optimal", [], [], bronze, 1000, cac, "France")
+    assert [r["influencer_name"] for r in recs] == ["known"] and recs[0]["predicted_conversions"] == 5
+
+def test_optimal_strategy_scales_to_thousands_of_candidates():
+    rng = random.Random(3)
+    tiers = [[{"influencer_name": f"{t}{i}", "total_spend_eur": rng.uniform(100, 5000), "campaigns": rng.randint(1, 5), "effective_cac_eur": rng.uniform(5, 200)} for i in range(2000)] for t in "gsb"]
+    start = time.perf_counter()
+    recs, allocated, _ = allocate_budget("optimal", *tiers, 500000, 50, "UK")
+    assert time.perf_counter() - start < 1.0
+    assert recs and allocated <= 500000
+
+def test_unknown_strategy_falls_back_to_cascade():
+    gold = [{"influencer_name": "a", "total_spend_eur": 100}]
+    assert allocate_budget("nope", gold, [], [], 1000) == allocate_budget_cascading_tiers(gold, [], [], 1000)
+
+def test_what_if_follow_up_reallocates_from_stored_candidates(mocker, mock_say):
+    query = mocker.patch("plan.query_api")
+    generate = mocker.patch("common.config.gemini_model.generate_content")
+    gold = [{"influencer_name": f"g{i}", "total_spend_eur": 100} for i in range(20)]
+    context = {"type": "strategic_plan", "params": {"market": "France", "month_full": "June", "year": 2025},
+               "tier_candidates": {"gold": gold, "silver": [], "bronze": []}, "remaining_budget": 500, "strategy": "cascade", "cac": 50}
+    event = {"text": "what if the budget was 20% and 100% higher?", "thread_ts": "ts1", "user": "U1"}
+
+    handle_thread_replies(event, mock_say, None, context)
+
+    query.assert_not_called()
+    generate.assert_not_called()
+    rows = mock_say.said_text[0].splitlines()[2:]
+    assert [row.split(" | ")[3] for row in rows] == ["5", "6", "10"]
+
+def test_excel_report_keeps_amounts_numeric_with_currency_format():
+    recs = [{"influencer_name": "a", "allocated_budget": 1234.5, "predicted_conversions": 24, "effective_cac": 50.0, "tier": "Gold", "market": "Sweden"}]
+    booked = [{"influencer_name": "b", "total_spend_eur": 100}]
+
+    with create_excel_report(recs, "Sweden", "June", 2025, 100000, 20000, 80000, 1234.5, booked) as report:
+        workbook = load_workbook(report)
+
+    assert workbook.sheetnames == ["Budget Summary", "All Recommendations", "Booked Influencers"]
+    target = workbook["Budget Summary"]["B2"]
+    assert target.value == 100000 and target.number_format == '#,##0 "SEK"'
+    rows = list(workbook["All Recommendations"].values)
+    assert rows[0][:3] == ("influencer_name", "allocated_budget", "predicted_conversions") and rows[1][1:3] == (1234.5, 24)
+    assert workbook["Booked Influencers"]["B2"].value == 1130.0
@@ -0,0 +1,78 @@
+import pytest
+from common.resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, RetryPolicy, call_with_retries, error_status
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+class ServerError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+def retryable(error):
+    return error_status(error) in (429, 503)
+
+def test_breaker_opens_then_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker("lyra", failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow() and not breaker.allow()  # a single half-open trial
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "times_opened": 2}
+
+def test_retries_retryable_errors_with_backoff_and_passes_remaining_time():
+    clock = FakeClock()
+    outcomes = [ServerError(503), ServerError(429), "ok"]
+    timeouts = []
+    def fn(timeout):
+        timeouts.append(timeout)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    result = call_with_retries(fn, RetryPolicy(attempts=3, base_delay=1, rng=lambda: 0.5), Deadline(30, clock), retryable, sleep=clock.sleep)
+    assert result == "ok"
+    assert timeouts == [30, 29.5, 28.5]
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    breaker = CircuitBreaker("lyra", failure_threshold=1)
+    calls = []
+    def fn(timeout):
+        calls.append(timeout)
+        raise ServerError(400)
+
+    with pytest.raises(ServerError):
+        call_with_retries(fn, RetryPolicy(attempts=3), Deadline(30), retryable, breaker=breaker)
+    assert len(calls) == 1 and breaker.state == "closed"
+
+def test_deadline_and_open_circuit_stop_retries():
+    clock = FakeClock()
+    def slow_failure(timeout):
+        clock.now += 8
+        raise ServerError(503)
+
+    with pytest.raises(ServerError):  # the next backoff would overrun the 10s deadline
+        call_with_retries(slow_failure, RetryPolicy(attempts=5, base_delay=4, rng=lambda: 1.0), Deadline(10, clock), retryable, sleep=clock.sleep)
+    assert clock.now == 8
+    with pytest.raises(DeadlineExceeded):
+        call_with_retries(slow_failure, RetryPolicy(), Deadline(0, clock), retryable)
+
+    breaker = CircuitBreaker("lyra", failure_threshold=1, clock=clock)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(slow_failure, RetryPolicy(), Deadline(10, clock), retryable, breaker=breaker)
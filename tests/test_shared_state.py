@@ -0,0 +1,61 @@
+import threading
+import time
+from common.shared_state import SQLiteTTLCache, SQLiteThreadLocks, LocalThreadLocks
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "state.db")
+    first = SQLiteTTLCache(path, max_bytes=10_000, name="lyra")
+    second = SQLiteTTLCache(path, max_bytes=10_000, name="lyra")
+
+    assert first.get_or_load("k", lambda: '{"rows": 1}', ttl=60) == '{"rows": 1}'
+    assert second.get_or_load("k", lambda: "reloaded", ttl=60) == '{"rows": 1}'
+    assert second.stats()["hits"] == 1 and second.stats()["entries"] == 1
+
+def test_sqlite_cache_expires_and_evicts(tmp_path):
+    now = [1000.0]
+    cache = SQLiteTTLCache(str(tmp_path / "state.db"), max_bytes=15, name="lyra", clock=lambda: now[0])
+    cache.set("a", "x" * 9, ttl=10)
+    now[0] += 1
+    cache.set("b", "x" * 9, ttl=10)  # over budget: "a" is least recently used
+    assert cache.get("a") is None and cache.get("b") == "x" * 9
+
+    now[0] += 20
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["expirations"] == 1
+
+def test_sqlite_thread_locks_exclude_other_holders_until_released(tmp_path):
+    path = str(tmp_path / "state.db")
+    worker_a, worker_b = SQLiteThreadLocks(path), SQLiteThreadLocks(path)
+
+    with worker_a.hold("t1") as acquired:
+        assert acquired
+        with worker_b.hold("t1", timeout=0.2) as other:
+            assert not other
+        with worker_b.hold("t2", timeout=0.2) as other_thread:
+            assert other_thread
+    with worker_b.hold("t1", timeout=0.2) as acquired_after_release:
+        assert acquired_after_release
+
+def test_expired_lease_can_be_taken_over(tmp_path):
+    path = str(tmp_path / "state.db")
+    crashed = SQLiteThreadLocks(path, lease=0.05)
+    assert crashed._try_acquire("t1", "dead-worker")
+
+    time.sleep(0.1)
+    with SQLiteThreadLocks(path).hold("t1", timeout=0.5) as acquired:
+        assert acquired
+
+def test_local_thread_locks_serialize_same_thread():
+    locks, order = LocalThreadLocks(), []
+
+    def worker(name):
+        with locks.hold("t1", timeout=5):
+            order.append(f"{name}-start")
+            time.sleep(0.05)
+            order.append(f"{name}-end")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in ("a", "b")]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert order[0][0] == order[1][0] and order[2][0] == order[3][0]
+    assert locks._locks == {}
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+from common.startup import lazy_function, timed_imports
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_importing_main_defers_heavy_dependencies():
+    code = "import sys, main; print(sorted(m for m in ('pandas', 'openpyxl', 'google.generativeai', 'month', 'plan') if m in sys.modules))"
+    env = {**os.environ, "SLACK_BOT_TOKEN": "xoxb-test", "SLACK_APP_TOKEN": "xapp-test"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+def test_lazy_function_imports_on_first_call():
+    dumps = lazy_function("json", "dumps")
+    assert dumps.__name__ == "dumps"
+    assert dumps({"a": 1}) == '{"a": 1}'
+
+def test_timed_imports_reports_cached_and_missing_modules():
+    timings = timed_imports(["json", "module_that_does_not_exist"])
+    assert timings == {"json": 0.0}
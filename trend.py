@@ -2,8 +2,10 @@
 # FILE: trend.py
 # ================================================
 import json
-from common.config import gemini_model, logger, UNIFIED_API_URL
-from common.utils import query_api, split_message_for_slack
+from common.config import logger, UNIFIED_API_URL
+from common.utils import query_api
+from common.llm import generate_and_post
+from common.data_context import build_digest, follow_up_context
 
 def create_leaderboard_reports(all_influencers, filters):
     reports = {}
@@ -60,7 +62,7 @@ def run_influencer_trend(say, thread_ts, params, thread_context_store, user_quer
         for report_text in leaderboards.values():
             say(text=report_text, thread_ts=thread_ts)
         
-        thread_context_store[thread_ts] = {'type': 'influencer_trend', 'params': params, 'raw_api_data': data, 'bot_response': "Leaderboard reports were generated."}
+        thread_context_store[thread_ts] = {'type': 'influencer_trend', 'params': params, 'raw_api_data': data, 'bot_response': "Leaderboard reports were generated.", **build_digest(data)}
         logger.success(f"Trend analysis completed for filters: {filters}")
     except Exception as e:
         logger.error(f"An unexpected error occurred in trend.py: {e}", exc_info=True)
@@ -74,7 +76,7 @@ def handle_thread_messages(event, say, client, context):
         context_prompt = f"""
         You are a helpful marketing analyst assistant.
         **Current Context:** An Influencer Trend report for the filters: **{json.dumps(context.get('params', {}))}**.
-        **Available Data:** You have the full JSON data for this specific trend report: {json.dumps(context.get('raw_api_data', {}))}
+        **Available Data:** You have the data for this specific trend report: {follow_up_context(context, context.get('raw_api_data', {}), user_message)}
         
         **User's Follow-up Message:** "{user_message}"
         
@@ -83,10 +85,6 @@ def handle_thread_messages(event, say, client, context):
         2.  **State Missing Data:** If the question asks for something not in the data, or requires comparing to data outside of the current filters, you MUST state that you don't have that data in your current context.
         3. **Natural Language:** Frame your response naturally. Avoid phrases like "Based on the data,".
         """
-        response = gemini_model.generate_content(context_prompt)
-        ai_response = response.text.strip()
-        
-        for chunk in split_message_for_slack(ai_response): 
-            say(text=chunk, thread_ts=thread_ts)
+        generate_and_post(say, thread_ts, context_prompt, site="follow_up")
     except Exception as e:
         logger.error(f"Error handling thread message in trend.py: {e}"); say(text="My apologies, I had trouble processing that follow-up.", thread_ts=thread_ts)
@@ -1,15 +1,16 @@
 # ================================================
 # FILE: weekly.py
 # ================================================
-import json
-from common.config import gemini_model, logger, UNIFIED_API_URL
-from common.utils import query_api, split_message_for_slack
+from common.config import logger, UNIFIED_API_URL
+from common.utils import query_api
+from common.llm import generate_and_post
+from common.data_context import build_data_context, build_digest, follow_up_context
 
 def create_range_prompt(user_query, market, start_date, end_date, api_data):
     return f"""
     You are Nova, a marketing analyst. Generate a concise performance review for the specified date range.
     **Data Context for {market.upper()} from {start_date} to {end_date}:**
-    {json.dumps(api_data, indent=2)}
+    {build_data_context(api_data)}
     **User's Request:** "{user_query}"
     **Instructions:** Analyze the data. Provide a clear performance summary using bold for key metrics. Identify the top-performing influencer. If data is empty, state that clearly. Present insights naturally.
     """
@@ -18,7 +19,7 @@ def create_week_number_prompt(user_query, market, week_number, year, api_data):
     return f"""
     You are Nova, a marketing analyst. Generate a concise performance review for the specified week number.
     **Data Context for {market.upper()} for Week {week_number}, {year}:**
-    {json.dumps(api_data, indent=2)}
+    {build_data_context(api_data)}
     **User's Request:** "{user_query}"
     **Instructions:** Analyze the data. Provide a clear performance summary using bold for key metrics. Identify the top-performing influencer for that week. If data is empty, state that clearly. Present insights naturally.
     """
@@ -40,12 +41,9 @@ def run_weekly_review_by_range(say, thread_ts, params, thread_context_store, use
 
     try:
         prompt = create_range_prompt(user_query, market, start_date, end_date, api_data)
-        response = gemini_model.generate_content(prompt)
-        ai_answer = response.text
+        ai_answer = generate_and_post(say, thread_ts, prompt)
         
-        thread_context_store[thread_ts] = {'type': 'weekly_review_by_range', 'params': params, 'raw_api_data': api_data, 'bot_response': ai_answer}
-        
-        for chunk in split_message_for_slack(ai_answer): say(text=chunk, thread_ts=thread_ts)
+        thread_context_store[thread_ts] = {'type': 'weekly_review_by_range', 'params': params, 'raw_api_data': api_data, 'bot_response': ai_answer, **build_digest(api_data)}
     except Exception as e:
         logger.error(f"Error during AI date range review generation: {e}"); say(f"An error occurred generating the AI summary: {str(e)}", thread_ts=thread_ts)
     logger.success(f"Date range review completed for {market} from {start_date} to {end_date}")
@@ -67,12 +65,9 @@ def run_weekly_review_by_number(say, thread_ts, params, thread_context_store, us
 
     try:
         prompt = create_week_number_prompt(user_query, market, week_number, year, api_data)
-        response = gemini_model.generate_content(prompt)
-        ai_answer = response.text
-
-        thread_context_store[thread_ts] = {'type': 'weekly_review_by_number', 'params': params, 'raw_api_data': api_data, 'bot_response': ai_answer}
+        ai_answer = generate_and_post(say, thread_ts, prompt)
 
-        for chunk in split_message_for_slack(ai_answer): say(text=chunk, thread_ts=thread_ts)
+        thread_context_store[thread_ts] = {'type': 'weekly_review_by_number', 'params': params, 'raw_api_data': api_data, 'bot_response': ai_answer, **build_digest(api_data)}
     except Exception as e:
         logger.error(f"Error during AI week number review generation: {e}"); say(f"An error occurred generating the AI summary: {str(e)}", thread_ts=thread_ts)
     logger.success(f"Week number review completed for {market}, week {week_number} of {year}")
@@ -97,7 +92,7 @@ def handle_thread_messages(event, say, client, context):
         context_prompt = f"""
         You are a helpful marketing analyst assistant.
         **Current Context:** {context_description}
-        **Available Data:** You have the full JSON data for this specific review: {json.dumps(context.get('raw_api_data', {}))}
+        **Available Data:** You have the data for this specific review: {follow_up_context(context, context.get('raw_api_data', {}), user_message)}
         
         **User's Follow-up:** "{user_message}"
         
@@ -106,7 +101,6 @@ def handle_thread_messages(event, say, client, context):
         2. If the user asks about a different time period, market, or requires a comparison to data not present, you MUST state that you don't have that data in your current context.
         3. Present your answer naturally.
         """
-        response = gemini_model.generate_content(context_prompt)
-        for chunk in split_message_for_slack(response.text): say(text=chunk, thread_ts=thread_ts)
+        generate_and_post(say, thread_ts, context_prompt, site="follow_up")
     except Exception as e:
         logger.error(f"Error handling thread message in weekly.py: {e}"); say(text="Sorry, I encountered an error.", thread_ts=thread_ts)